@@ -9,6 +9,8 @@ from PyQt6.QtWidgets import (QVBoxLayout, QGroupBox, QFormLayout, QComboBox,
 
 from pos_tool_new.license_backup.license_service import LicenseService
 from pos_tool_new.main import BaseTabWidget
+from pos_tool_new.scan_pos.device_inventory import DeviceInventory
+from pos_tool_new.scan_pos.pos_scanner import LICENSE_DB_PORT
 
 
 class DatabaseConnectThread(QThread):
@@ -212,6 +214,9 @@ class LicenseToolTabWidget(BaseTabWidget):
             QMessageBox.warning(self, "警告", "请输入主机地址")
             return
 
+        if self._db_closed_by_scan(host):
+            return
+
         self.log_message(f"正在连接数据库: {host}", "info")
         self.connect_btn.setEnabled(False)
         self.connect_btn.setText("连接中...")
@@ -222,6 +227,47 @@ class LicenseToolTabWidget(BaseTabWidget):
         self.db_thread.finished.connect(self.on_connect_finished)
         self.db_thread.start()
 
+    def showEvent(self, event):
+        """显示时把扫描到的License数据库主机加入主机下拉框"""
+        super().showEvent(event)
+        self._load_scanned_hosts()
+
+    def _load_scanned_hosts(self):
+        try:
+            devices = DeviceInventory.shared().hosts_with_port(LICENSE_DB_PORT)
+        except Exception:
+            return
+        for device in devices:
+            if self.host_combo.findText(device["ip"]) == -1:
+                self.host_combo.addItem(device["ip"])
+                self.host_combo.setItemData(self.host_combo.count() - 1, device["name"] or "扫描发现",
+                                            Qt.ItemDataRole.ToolTipRole)
+
+    def _db_closed_by_scan(self, host):
+        """
+        最近一次扫描显示数据库端口未开放时先提示，用户取消则返回True，不再等待数据库连接超时；
+        扫描可能因设备响应慢而误判，用户可选择继续连接
+        """
+        try:
+            state = DeviceInventory.shared().port_state(host, LICENSE_DB_PORT)
+        except Exception:
+            return False
+        if state is not False:
+            return False
+        message = f"最近一次扫描显示 {host} 的数据库端口({LICENSE_DB_PORT})未开放"
+        box = QMessageBox(QMessageBox.Icon.Warning, "数据库端口未开放",
+                          f"{message}，POS可能不在线（也可能是扫描时响应过慢）。\n是否仍然继续连接？", parent=self)
+        continue_btn = box.addButton("继续", QMessageBox.ButtonRole.AcceptRole)
+        box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        box.exec()
+        if box.clickedButton() is continue_btn:
+            self.log_message(f"{message}，仍继续连接", "warning")
+            return False
+        self.status_label.setText("未连接")
+        self.status_label.setStyleSheet("color: red; font-weight: normal;")
+        self.log_message(message, "warning")
+        return True
+
     def on_connect_success(self, success, message):
         if success:
             self.status_label.setText("已连接")
@@ -0,0 +1,277 @@
+"""
+本机SSH/SFTP服务替身（基于paramiko服务端），供SFTP传输基准测试使用。
+
+密码认证；exec请求交给本机shell执行，SFTP直接读写本机文件系统，只监听回环地址。
+可注入往返延迟（服务端发出的数据延后发送）和上行带宽限制（服务端按速率接收），模拟门店Wi-Fi。
+"""
+import collections
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_OK
+
+
+def _sftp_errno(func):
+    def wrapper(*args, **kwargs):
+        try:
+            result = func(*args, **kwargs)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK if result is None else result
+    return wrapper
+
+
+class _FileHandle(SFTPHandle):
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        if attr.st_mode is not None:
+            os.chmod(self.filename, attr.st_mode)
+        return SFTP_OK
+
+
+class _LocalSftp(SFTPServerInterface):
+    """把SFTP请求直接映射到本机文件系统，相对路径相对于root"""
+
+    def __init__(self, server, root=None):
+        super().__init__(server)
+        self.root = root or os.getcwd()
+
+    def _path(self, path):
+        return os.path.join(self.root, path)
+
+    @_sftp_errno
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        fd = os.open(path, flags, attr.st_mode if attr and attr.st_mode is not None else 0o644)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _FileHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    @_sftp_errno
+    def stat(self, path):
+        return SFTPAttributes.from_stat(os.stat(self._path(path)))
+
+    @_sftp_errno
+    def lstat(self, path):
+        return SFTPAttributes.from_stat(os.lstat(self._path(path)))
+
+    @_sftp_errno
+    def list_folder(self, path):
+        path = self._path(path)
+        return [SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name) for name in os.listdir(path)]
+
+    @_sftp_errno
+    def remove(self, path):
+        os.remove(self._path(path))
+
+    @_sftp_errno
+    def rename(self, oldpath, newpath):
+        oldpath, newpath = self._path(oldpath), self._path(newpath)
+        if os.path.exists(newpath):
+            raise OSError(17, "File exists")
+        os.rename(oldpath, newpath)
+
+    @_sftp_errno
+    def posix_rename(self, oldpath, newpath):
+        os.rename(self._path(oldpath), self._path(newpath))
+
+    @_sftp_errno
+    def mkdir(self, path, attr):
+        os.mkdir(self._path(path))
+
+    @_sftp_errno
+    def rmdir(self, path):
+        os.rmdir(self._path(path))
+
+    @_sftp_errno
+    def chattr(self, path, attr):
+        if attr.st_mode is not None:
+            os.chmod(self._path(path), attr.st_mode)
+        if attr.st_uid is not None and attr.st_gid is not None:
+            os.chown(self._path(path), attr.st_uid, attr.st_gid)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if password == self.server.password:
+            self.server.stats["auths"] += 1
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        self.server.stats["execs"] += 1
+        threading.Thread(target=self._run, args=(channel, command.decode(), self.server.root), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _run(channel, command, cwd):
+        process = subprocess.Popen(command, shell=True, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+
+        def feed_stdin():
+            try:
+                while data := channel.recv(65536):
+                    process.stdin.write(data)
+                    process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        def pump(stream, send):
+            while data := stream.read1(65536):
+                send(data)
+
+        threading.Thread(target=feed_stdin, daemon=True).start()
+        stderr_thread = threading.Thread(target=pump, args=(process.stderr, channel.sendall_stderr), daemon=True)
+        stderr_thread.start()
+        pump(process.stdout, channel.sendall)
+        stderr_thread.join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+
+class _ShapedSocket:
+    """服务端socket包装：发出的数据延后rtt秒发送，接收按bandwidth字节/秒限速"""
+
+    def __init__(self, sock, rtt=0.0, bandwidth=None):
+        self._sock = sock
+        self._rtt = rtt
+        self._bandwidth = bandwidth
+        self._recv_budget_at = time.monotonic()
+        if rtt:
+            self._queue = collections.deque()
+            self._cond = threading.Condition()
+            threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def send(self, data):
+        if not self._rtt:
+            return self._sock.send(data)
+        with self._cond:
+            self._queue.append((time.monotonic() + self._rtt, bytes(data)))
+            self._cond.notify()
+        return len(data)
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                due, data = self._queue.popleft()
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self._sock.sendall(data)
+            except OSError:
+                return
+
+    def recv(self, size):
+        if self._bandwidth:
+            # 令牌桶：按已接收字节推算下一次允许接收的时间，TCP背压会让客户端相应降速
+            delay = self._recv_budget_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            size = min(size, max(4096, int(self._bandwidth / 50)))
+        data = self._sock.recv(size)
+        if self._bandwidth:
+            self._recv_budget_at = max(self._recv_budget_at, time.monotonic()) + len(data) / self._bandwidth
+        return data
+
+
+class FakeSshServer:
+    """本机SSH服务替身，用法: with FakeSshServer(password="pw", rtt=0.02) as server: server.port"""
+
+    def __init__(self, password="password", host="127.0.0.1", port=0, rtt=0.0, bandwidth=None, root=None):
+        """
+        Args:
+            rtt: 注入的往返延迟（秒）
+            bandwidth: 上行（客户端到服务端）带宽上限，字节/秒，为空时不限速
+            root: 相对路径的起点（SFTP路径和命令的工作目录），多个替身模拟多台主机时各用一个目录
+        """
+        self.password = password
+        self.root = root
+        self.host = host
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.stats = {"connections": 0, "auths": 0, "execs": 0}
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self.port = self._sock.getsockname()[1]
+        self._transports = []
+        self._thread = None
+
+    def start(self):
+        self._sock.listen(16)
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-ssh-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.stats["connections"] += 1
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(_ShapedSocket(conn, self.rtt, self.bandwidth))
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _LocalSftp, self.root)
+            try:
+                transport.start_server(server=_ServerInterface(self))
+            except (paramiko.SSHException, EOFError):
+                continue
+            self._transports.append(transport)
+
+    def drop_connections(self):
+        """断开所有已建立的连接（模拟网络中断），继续接受新连接"""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def stop(self):
+        self._sock.close()
+        self.drop_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
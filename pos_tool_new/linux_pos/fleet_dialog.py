@@ -0,0 +1,222 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPlainTextEdit, QSpinBox, QPushButton, QTableView,
+    QHeaderView, QMessageBox, QLineEdit
+)
+
+from pos_tool_new.linux_pos.fleet_runner import FINAL_STATUSES, FLEET_ACTIONS, STATUS_CANCELLED, STATUS_FAILED, \
+    STATUS_PENDING, STATUS_RETRYING, STATUS_RUNNING, STATUS_SUCCESS, STATUS_TIMEOUT, FleetRunner, parse_hosts
+from pos_tool_new.work_threads import FleetRunnerThread
+
+STATUS_COLORS = {
+    STATUS_SUCCESS: QColor("#28a745"),
+    STATUS_FAILED: QColor("#dc3545"),
+    STATUS_TIMEOUT: QColor("#dc3545"),
+    STATUS_RUNNING: QColor("#007bff"),
+    STATUS_RETRYING: QColor("#ffc107"),
+    STATUS_CANCELLED: QColor("#6c757d"),
+}
+
+
+class FleetResultModel(QAbstractTableModel):
+    """批量操作结果表格，每台主机一行，按主机合并状态更新"""
+    HEADERS = ["IP", "状态", "尝试次数", "用时(秒)", "结果"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._host_rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        result = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return result["host"]
+            if column == 1:
+                return result["status"]
+            if column == 2:
+                return str(result["attempts"]) if result["attempts"] else ""
+            if column == 3:
+                return f"{result['seconds']:.1f}" if result["status"] in FINAL_STATUSES else ""
+            return result["error"] or result["message"]
+        if role == Qt.ItemDataRole.ForegroundRole and column == 1:
+            return STATUS_COLORS.get(result["status"])
+        if role == Qt.ItemDataRole.ToolTipRole and column == 4:
+            return result["error"] or result["message"] or None
+        return None
+
+    def set_hosts(self, hosts):
+        self.beginResetModel()
+        self._rows = [{"host": host, "status": STATUS_PENDING, "attempts": 0, "seconds": 0.0,
+                       "message": "", "error": ""} for host in hosts]
+        self._host_rows = {host: row for row, host in enumerate(hosts)}
+        self.endResetModel()
+
+    def update_result(self, host, result):
+        row = self._host_rows.get(host)
+        if row is None:
+            return
+        self._rows[row] = result
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def results(self):
+        return list(self._rows)
+
+
+class FleetDialog(QDialog):
+    """批量操作对话框：选择操作和主机列表，并行执行并实时显示每台主机的结果"""
+
+    def __init__(self, service, hosts, username, password, env="QA", parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.username = username
+        self.password = password
+        self.thread = None
+        self.setWindowTitle("批量操作")
+        self.resize(820, 560)
+
+        layout = QVBoxLayout(self)
+        option_layout = QHBoxLayout()
+        option_layout.addWidget(QLabel("操作:"))
+        self.action_combo = QComboBox()
+        for action, name in FLEET_ACTIONS.items():
+            self.action_combo.addItem(name, action)
+        option_layout.addWidget(self.action_combo)
+        option_layout.addWidget(QLabel("环境:"))
+        self.env_combo = QComboBox()
+        self.env_combo.addItems(["PROD", "QA", "DEV"])
+        self.env_combo.setCurrentText(env)
+        option_layout.addWidget(self.env_combo)
+        self.md5_edit = QLineEdit()
+        self.md5_edit.setPlaceholderText("期望MD5（可选）")
+        option_layout.addWidget(self.md5_edit)
+        option_layout.addWidget(QLabel("并行数:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 64)
+        self.concurrency_spin.setValue(FleetRunner.MAX_WORKERS)
+        option_layout.addWidget(self.concurrency_spin)
+        option_layout.addWidget(QLabel("超时(秒):"))
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(5, 3600)
+        self.timeout_spin.setValue(FleetRunner.TIMEOUT)
+        option_layout.addWidget(self.timeout_spin)
+        option_layout.addWidget(QLabel("重试:"))
+        self.retries_spin = QSpinBox()
+        self.retries_spin.setRange(0, 5)
+        self.retries_spin.setValue(FleetRunner.RETRIES)
+        option_layout.addWidget(self.retries_spin)
+        option_layout.addStretch()
+        layout.addLayout(option_layout)
+
+        layout.addWidget(QLabel("目标POS IP（逗号或换行分隔，支持 10.1.10.21-60 形式的范围）:"))
+        self.hosts_edit = QPlainTextEdit("\n".join(hosts))
+        self.hosts_edit.setMaximumHeight(90)
+        layout.addWidget(self.hosts_edit)
+
+        self.model = FleetResultModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        bottom_layout = QHBoxLayout()
+        self.summary_label = QLabel("")
+        bottom_layout.addWidget(self.summary_label)
+        bottom_layout.addStretch()
+        self.run_btn = QPushButton("开始执行")
+        self.run_btn.clicked.connect(self.on_run)
+        bottom_layout.addWidget(self.run_btn)
+        self.stop_btn = QPushButton("停止")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.on_stop)
+        bottom_layout.addWidget(self.stop_btn)
+        layout.addLayout(bottom_layout)
+
+        self.action_combo.currentIndexChanged.connect(self._update_option_visibility)
+        self._update_option_visibility()
+
+    def _update_option_visibility(self):
+        action = self.action_combo.currentData()
+        self.env_combo.setEnabled(action == "modify_env")
+        self.md5_edit.setVisible(action == "md5")
+
+    def on_run(self):
+        try:
+            hosts = parse_hosts(self.hosts_edit.toPlainText())
+        except ValueError as e:
+            QMessageBox.warning(self, "参数错误", f"主机列表无效: {e}")
+            return
+        if not hosts:
+            QMessageBox.warning(self, "参数错误", "请填写目标POS IP")
+            return
+        action = self.action_combo.currentData()
+        # 除只读的MD5查询外，批量操作都会改动POS，执行前确认
+        if action != "md5":
+            target = FLEET_ACTIONS[action]
+            if action == "modify_env":
+                target = f"{target}（改为{self.env_combo.currentText()}环境）"
+            reply = QMessageBox.warning(
+                self, "确认", f"确定对 {len(hosts)} 台POS执行【{target}】吗？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        kwargs = {}
+        if action == "modify_env":
+            kwargs["env"] = self.env_combo.currentText()
+        elif action == "md5":
+            kwargs["expected_md5"] = self.md5_edit.text().strip() or None
+
+        self.model.set_hosts(hosts)
+        runner = FleetRunner(self.service, max_workers=self.concurrency_spin.value(),
+                             timeout=self.timeout_spin.value(), retries=self.retries_spin.value())
+        self.thread = FleetRunnerThread(runner, action, hosts, self.username, self.password, kwargs)
+        self.thread.host_updated.connect(self.on_host_updated)
+        self.thread.finished.connect(self.on_finished)
+        self.run_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self._update_summary()
+        self.thread.start()
+
+    def on_host_updated(self, host, result):
+        self.model.update_result(host, result)
+        self._update_summary()
+
+    def _update_summary(self):
+        results = self.model.results()
+        done = sum(1 for result in results if result["status"] in FINAL_STATUSES)
+        succeeded = sum(1 for result in results if result["status"] == STATUS_SUCCESS)
+        self.summary_label.setText(f"完成 {done}/{len(results)}，成功 {succeeded}，失败 {done - succeeded}")
+
+    def on_stop(self):
+        if self.thread:
+            self.thread.stop()
+        self.stop_btn.setEnabled(False)
+
+    def on_finished(self, *_):
+        self.run_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self._update_summary()
+
+    def closeEvent(self, event):
+        if self.thread and self.thread.isRunning():
+            # 断开进行中主机的连接，不等到单台超时
+            self.thread.abort()
+            self.thread.wait(5000)
+        super().closeEvent(event)
@@ -0,0 +1,346 @@
+"""
+批量操作多台Linux POS：对主机列表（如扫描结果）并行执行同一个LinuxService操作。
+
+- 并行数有上限，每台主机单独计时，超时后强制断开该主机的SSH连接使操作立即结束；
+- 连接主机失败（操作尚未开始）时按重试策略重试；执行中的连接中断和超时只对可重复执行的操作（查询MD5、
+  修改配置）重试，重启、备份等操作可能已在POS上执行了一部分，不重试；配置写入失败等业务错误不重试；
+- 每台主机状态变化时回调on_update，界面据此实时刷新结果表格，命令行逐行输出。
+
+用法:
+    python -m pos_tool_new.linux_pos.fleet_runner modify_env --env PROD --hosts 10.1.10.21-60
+    python -m pos_tool_new.linux_pos.fleet_runner restart_tomcat --from-inventory --concurrency 20
+    python -m pos_tool_new.linux_pos.fleet_runner md5 --hosts-file hosts.txt --expected-md5 0f1e...
+
+密码通过--password或环境变量POS_SSH_PASSWORD传入。
+"""
+import argparse
+import concurrent.futures
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import paramiko
+
+# 操作名称 -> 显示名称
+FLEET_ACTIONS = {
+    "restart_pos": "重启pos",
+    "modify_env": "修改文件",
+    "restart_tomcat": "重启Tomcat",
+    "backup": "数据备份",
+    "md5": "查询远程包MD5",
+}
+
+# 主机状态
+STATUS_PENDING = "等待"
+STATUS_RUNNING = "执行中"
+STATUS_RETRYING = "等待重试"
+STATUS_SUCCESS = "成功"
+STATUS_FAILED = "失败"
+STATUS_TIMEOUT = "超时"
+STATUS_CANCELLED = "已取消"
+FINAL_STATUSES = {STATUS_SUCCESS, STATUS_FAILED, STATUS_TIMEOUT, STATUS_CANCELLED}
+
+# 重复执行结果相同的操作，执行中途失败后可以重试
+IDEMPOTENT_ACTIONS = {"md5", "modify_env"}
+
+
+class HostTimeout(Exception):
+    """单台主机的操作超过时限"""
+
+
+class HostUnreachable(Exception):
+    """连接主机失败，操作尚未开始"""
+
+
+class FleetRunner:
+    """
+    对多台POS并行执行LinuxService操作（不依赖界面）。
+
+    用法:
+        runner = FleetRunner(service, on_update=print)
+        results = runner.run("modify_env", hosts, "menu", password, env="PROD")
+    """
+
+    MAX_WORKERS = 16
+    TIMEOUT = 300
+    RETRIES = 1
+    RETRY_DELAY = 3
+    # 可重复执行的操作重试的错误类型：连接失败、连接中断、超时；其余（如配置写入失败）重试也无用
+    RETRY_ON = (HostUnreachable, OSError, EOFError, paramiko.SSHException, HostTimeout)
+    # 其余操作只在连接失败（尚未开始执行）时重试
+    RETRY_ON_UNSTARTED = (HostUnreachable,)
+
+    def __init__(self, service, max_workers: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, retry_delay: Optional[float] = None,
+                 on_update: Optional[Callable] = None):
+        """
+        Args:
+            service: LinuxService
+            max_workers: 同时操作的主机数上限
+            timeout: 单台主机单次尝试的时限（秒）
+            retries: 失败后的重试次数
+            on_update: 主机状态变化回调，参数为(主机, 结果字典)
+        """
+        self.service = service
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.timeout = self.TIMEOUT if timeout is None else timeout
+        self.retries = self.RETRIES if retries is None else retries
+        self.retry_delay = self.RETRY_DELAY if retry_delay is None else retry_delay
+        self.on_update = on_update
+        self._stop = threading.Event()
+        self._aborted = threading.Event()
+        self._lock = threading.Lock()
+        self._running = {}  # 正在执行的主机 -> 用户名
+
+    def stop(self) -> None:
+        """取消尚未开始的主机，正在执行的主机完成当前尝试后不再重试"""
+        self._stop.set()
+
+    def abort(self) -> None:
+        """取消尚未开始的主机，并断开正在执行的主机的连接，使其立即结束（关闭窗口时使用）"""
+        self._aborted.set()
+        self._stop.set()
+        with self._lock:
+            running = list(self._running.items())
+        for host, username in running:
+            self.service.ssh_pool.abort(host, username)
+
+    def run(self, action: str, hosts: List[str], username: str, password: str, **kwargs) -> Dict[str, dict]:
+        """
+        对hosts并行执行action，返回 {主机: 结果}
+
+        结果字典: {"host", "status", "attempts", "seconds", "message", "error"}
+        action为modify_env时需要env参数，为md5时可传expected_md5（不一致视为失败）。
+        """
+        if action not in FLEET_ACTIONS:
+            raise ValueError(f"不支持的操作: {action}")
+        operation = getattr(self, f"_do_{action}")
+        retry_on = self.RETRY_ON if action in IDEMPOTENT_ACTIONS else self.RETRY_ON_UNSTARTED
+        self._stop.clear()
+        self._aborted.clear()
+        results = {host: {"host": host, "status": STATUS_PENDING, "attempts": 0, "seconds": 0.0,
+                          "message": "", "error": ""} for host in hosts}
+        for host in hosts:
+            self._notify(results[host])
+
+        start = time.monotonic()
+        workers = max(1, min(len(hosts), self.max_workers))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet") as executor:
+            futures = [executor.submit(self._run_host, operation, retry_on, results[host], username, password,
+                                       kwargs)
+                       for host in hosts]
+            concurrent.futures.wait(futures)
+
+        counts = {}
+        for result in results.values():
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        summary = ", ".join(f"{status} {count} 台" for status, count in counts.items())
+        self.service.log(f"批量{FLEET_ACTIONS[action]}结束: {summary}, 总用时 {time.monotonic() - start:.1f} 秒",
+                         level="success" if counts.get(STATUS_SUCCESS, 0) == len(hosts) else "warning")
+        return results
+
+    def _notify(self, result):
+        if self.on_update:
+            self.on_update(result["host"], dict(result))
+
+    def _run_host(self, operation, retry_on, result, username, password, kwargs):
+        host = result["host"]
+        start = time.monotonic()
+        while True:
+            if self._stop.is_set():
+                result.update(status=STATUS_CANCELLED)
+                break
+            result["attempts"] += 1
+            result.update(status=STATUS_RUNNING, error="")
+            self._notify(result)
+            try:
+                result["message"] = self._attempt(operation, host, username, password, kwargs) or ""
+                result["status"] = STATUS_SUCCESS
+                break
+            except Exception as e:
+                if self._aborted.is_set():
+                    result.update(status=STATUS_CANCELLED, error="已中止")
+                    break
+                timed_out = isinstance(e, HostTimeout)
+                result.update(status=STATUS_TIMEOUT if timed_out else STATUS_FAILED,
+                              error=str(e) or type(e).__name__)
+                if (not isinstance(e, retry_on) or result["attempts"] > self.retries
+                        or self._stop.is_set()):
+                    break
+                result["status"] = STATUS_RETRYING
+                self._notify(result)
+                self._stop.wait(self.retry_delay)
+        result["seconds"] = round(time.monotonic() - start, 2)
+        self._notify(result)
+
+    def _attempt(self, operation, host, username, password, kwargs):
+        """执行一次操作，超时后断开该主机的连接，使阻塞在网络上的操作出错返回"""
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            self.service.ssh_pool.abort(host, username)
+
+        timer = threading.Timer(self.timeout, expire)
+        timer.daemon = True
+        with self._lock:
+            self._running[host] = username
+        timer.start()
+        try:
+            # 先建立连接（放入连接池供操作复用），连接失败说明操作尚未开始，可以安全重试
+            try:
+                with self.service._connect_ssh(host, username, password):
+                    pass
+            except paramiko.AuthenticationException:
+                raise
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                raise HostUnreachable(f"连接失败: {e}") from e
+            try:
+                message = operation(host, username, password, **kwargs)
+            except Exception:
+                if expired.is_set():
+                    raise HostTimeout(f"超过 {self.timeout:g} 秒未完成")
+                raise
+        finally:
+            timer.cancel()
+            with self._lock:
+                self._running.pop(host, None)
+        # 部分操作内部捕获了异常，连接被断开后仍正常返回
+        if expired.is_set():
+            raise HostTimeout(f"超过 {self.timeout:g} 秒未完成")
+        return message
+
+    # 各操作返回显示在结果表格中的信息，失败时抛出异常
+
+    def _do_restart_pos(self, host, username, password):
+        self.service.restart_pos_linux(host, username, password)
+        return "POS已重启"
+
+    def _do_modify_env(self, host, username, password, env):
+        self.service.modify_remote_files(host, username, password, env)
+        return f"已切换到{env}环境"
+
+    def _do_restart_tomcat(self, host, username, password):
+        self.service.restart_tomcat(host, username, password)
+        return "Tomcat已重启"
+
+    def _do_backup(self, host, username, password):
+        errors = []
+        self.service.backup_data(host, username, password, error_callback=errors.append,
+                                 log_callback=lambda msg, level="info": self.service.log(f"[{host}] {msg}", level))
+        if errors:
+            raise RuntimeError(errors[-1].strip())
+        return "备份完成"
+
+    def _do_md5(self, host, username, password, expected_md5=None):
+        remote_war = f"{self.service.WEBAPPS_DIR}/kpos.war"
+        with self.service._connect_ssh(host, username, password) as ssh:
+            md5 = self.service.get_file_md5(ssh, remote_war)
+        if md5 is None:
+            raise RuntimeError(f"无法获取 {remote_war} 的MD5")
+        if expected_md5 and md5 != expected_md5.lower():
+            raise ValueError(f"MD5不一致: {md5}")
+        return md5
+
+
+def parse_hosts(text: str) -> List[str]:
+    """解析主机列表：逗号、空白或换行分隔，支持 10.1.10.21-60 形式的末段范围，去重保序"""
+    hosts = []
+    for item in text.replace(",", " ").split():
+        prefix, _, last = item.rpartition(".")
+        if "-" in last:
+            first, end = (int(part) for part in last.split("-", 1))
+            candidates = [f"{prefix}.{i}" for i in range(first, end + 1)]
+        else:
+            candidates = [item]
+        for host in candidates:
+            ipaddress.IPv4Address(host)
+            if host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pos_tool_new.linux_pos.fleet_runner",
+                                     description="对多台Linux POS并行执行同一操作，每台完成时输出一行NDJSON")
+    parser.add_argument("action", choices=list(FLEET_ACTIONS), help="操作")
+    parser.add_argument("--hosts", default="", help="主机列表，逗号分隔，支持 10.1.10.21-60 形式的范围")
+    parser.add_argument("--hosts-file", help="主机列表文件，每行一个")
+    parser.add_argument("--from-inventory", action="store_true", help="使用扫描到的开放SSH端口的设备")
+    parser.add_argument("--username", default="menu")
+    parser.add_argument("--password", default=os.environ.get("POS_SSH_PASSWORD"),
+                        help="SSH密码，默认取环境变量POS_SSH_PASSWORD")
+    parser.add_argument("--env", choices=["QA", "PROD", "DEV"], help="modify_env的目标环境")
+    parser.add_argument("--expected-md5", help="md5操作时与之比较，不一致视为失败")
+    parser.add_argument("--concurrency", type=int, default=FleetRunner.MAX_WORKERS, help="同时操作的主机数")
+    parser.add_argument("--timeout", type=float, default=FleetRunner.TIMEOUT, help="单台主机单次尝试的时限（秒）")
+    parser.add_argument("--retries", type=int, default=FleetRunner.RETRIES,
+                        help="重试次数；重启、备份只在连接失败时重试，查询MD5、修改配置中途断开或超时后也重试")
+    args = parser.parse_args(argv)
+
+    try:
+        text = args.hosts
+        if args.hosts_file:
+            with open(args.hosts_file, encoding="utf-8") as f:
+                text += " " + f.read()
+        hosts = parse_hosts(text)
+    except (OSError, ValueError) as e:
+        parser.error(f"主机列表无效: {e}")
+    if args.from_inventory:
+        from pos_tool_new.scan_pos.device_inventory import DeviceInventory
+        from pos_tool_new.scan_pos.pos_scanner import SSH_PORT
+        hosts += [device["ip"] for device in DeviceInventory.shared().hosts_with_port(SSH_PORT)
+                  if device["ip"] not in hosts]
+    if not hosts:
+        parser.error("请通过--hosts、--hosts-file或--from-inventory指定主机")
+    if not args.password:
+        parser.error("请通过--password或环境变量POS_SSH_PASSWORD指定密码")
+    if args.action == "modify_env" and not args.env:
+        parser.error("modify_env需要--env")
+    if args.concurrency < 1:
+        parser.error("--concurrency 必须大于0")
+
+    from pos_tool_new.linux_pos.linux_service import LinuxService
+
+    output_lock = threading.Lock()
+
+    def on_update(host, result):
+        if result["status"] in FINAL_STATUSES:
+            with output_lock:
+                sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+                sys.stdout.flush()
+
+    runner = FleetRunner(LinuxService(), max_workers=args.concurrency, timeout=args.timeout,
+                         retries=args.retries, on_update=on_update)
+    kwargs = {"env": args.env} if args.action == "modify_env" else {}
+    if args.action == "md5":
+        kwargs["expected_md5"] = args.expected_md5
+    results = {}
+
+    def run():
+        results.update(runner.run(args.action, hosts, args.username, args.password, **kwargs))
+
+    # 放在后台线程执行，主线程等待Ctrl+C后取消尚未开始的主机
+    thread = threading.Thread(target=run, name="fleet-runner")
+    thread.start()
+    interrupted = False
+    try:
+        while thread.is_alive():
+            thread.join(0.2)
+    except KeyboardInterrupt:
+        interrupted = True
+        runner.stop()
+        thread.join()
+    succeeded = sum(1 for result in results.values() if result["status"] == STATUS_SUCCESS)
+    sys.stderr.write(f"{FLEET_ACTIONS[args.action]}: 成功 {succeeded} / {len(hosts)} 台\n")
+    if interrupted:
+        return 130
+    return 0 if succeeded == len(hosts) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
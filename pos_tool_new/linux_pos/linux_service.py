@@ -1,13 +1,20 @@
+import concurrent.futures
 import os
 import posixpath
 import re
+import shlex
 import tempfile
 import time
-from typing import List, Tuple, Optional, Callable
+import zipfile
+from typing import Dict, List, Tuple, Optional, Callable
 
 import paramiko
 
 from pos_tool_new.backend import Backend
+from pos_tool_new.linux_pos import staged_deploy, war_broadcast, war_delta, webapp_sync
+from pos_tool_new.linux_pos.pipeline_scheduler import PipelineScheduler, PipelineStage
+from pos_tool_new.linux_pos.sftp_transfer import remote_md5, upload_and_verify
+from pos_tool_new.linux_pos.ssh_session_pool import PooledSSHClient, SshSessionPool
 from pos_tool_new.utils import log_manager
 
 
@@ -17,6 +24,20 @@ class LinuxService(Backend):
     WEBAPPS_DIR = f"{TOMCAT_HOME}/webapps"
     BACKUP_DIR = "/opt/backup"
     MENU_HOME = "/home/menu"
+    # 解压目录的部署清单，记录上次部署的war包条目，用于按条目同步
+    WEBAPP_MANIFEST = f"{TOMCAT_HOME}/kpos_manifest.json"
+    # 一键升级在POS运行时预先上传的新war包，放在webapps之外以免触发tomcat自动部署，停止POS后再替换
+    STAGED_WAR = f"{TOMCAT_HOME}/kpos.war.staged"
+    # 蓝绿部署（见staged_deploy）：新版本先解压到暂存目录，切换后上一版本保留用于回滚，都在webapps之外
+    STAGING_KPOS = f"{TOMCAT_HOME}/kpos.staging"
+    PREV_KPOS = f"{TOMCAT_HOME}/kpos.prev"
+    PREV_WAR = f"{TOMCAT_HOME}/kpos.war.prev"
+    # 差量数据超过新包大小的该比例时直接整包上传
+    DELTA_MAX_RATIO = 0.8
+    # 升级脚本执行后等待远程unzip进程结束的最长秒数
+    UNZIP_WAIT = 30
+    # 多台POS同时换包时，连接和解压的最大并行数
+    MULTI_HOST_WORKERS = 16
 
     def __init__(self):
         super().__init__()
@@ -31,6 +52,8 @@ class LinuxService(Backend):
         # CloudDatahub application.properties path
         self.cloud_datahub_app_prop_path = f"{self.WEBAPPS_DIR}/cloudDatahub/WEB-INF/classes/application.properties"
         self.log_manager = log_manager
+        # 复用已认证的SSH连接，多步操作不再每步重新握手
+        self.ssh_pool = SshSessionPool.shared()
 
     @staticmethod
     def _validate_connection_params(host: str, username: str, password: str) -> None:
@@ -68,14 +91,10 @@ class LinuxService(Backend):
             self.log(f"连接失败: {str(e)}", level="error")
             return False
 
-    def _connect_ssh(self, host: str, username: str, password: str) -> paramiko.SSHClient:
-        """建立SSH连接"""
+    def _connect_ssh(self, host: str, username: str, password: str) -> PooledSSHClient:
+        """从连接池获取SSH连接，close()或退出with时归还连接池"""
         self._validate_connection_params(host, username, password)
-
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, username=username, password=password, timeout=10)
-        return ssh
+        return self.ssh_pool.acquire(host, username, password)
 
     @staticmethod
     def _execute_command(ssh: paramiko.SSHClient, command: str,
@@ -129,85 +148,163 @@ class LinuxService(Backend):
         content = content.replace("https://wms.balamxqa.com/expiration-management", target_url)
         return content
 
-    def _modify_remote_file(self, ssh: paramiko.SSHClient, remote_path: str, env: str) -> Tuple[bool, bool]:
-        """修改单个远程文件"""
-        if not self._check_file_exists(ssh, remote_path):
-            self.log(f"文件不存在: {remote_path}", level="error")
-            return False, False
-
-        content = self._read_remote_file(ssh, remote_path)
+    def _rewrite_cloud_url_config(self, remote_path: str, content: str, env: str) -> str:
+        """计算cloudUrlConfig.json/cloudUrl.json修改后的内容"""
         # 先做通用替换，再做 expiration-management 专属替换
         new_content = self.replace_domain(content, env)
         if "cloudUrlConfig.json" in remote_path:
             new_content = self.fix_expiration_management_url(new_content, env)
+        return new_content
 
-        if new_content == content:
-            self.log("文件已是目标值，无需修改", level="info")
-            return False, True
-
-        self._write_remote_file(ssh, remote_path, new_content)
-        self.log("文件已修改", level="info")
-        return True, False
+    def _rewrite_cloud_datahub_properties(self, content: str, env: str) -> Tuple[str, str]:
+        """计算cloudDatahub application.properties修改后的内容，返回 (新内容, 修改说明)"""
+        target_line = f"application.environmentType = {self.get_env_type_value(env)}"
+        if target_line in content.splitlines():
+            return content, "application.properties 本来就是目标值，无需修改"
+        if "application.environmentType" in content:
+            new_content = re.sub(r"^application\.environmentType\s*=.*$", target_line, content, flags=re.MULTILINE)
+            return new_content, "application.properties 已修改"
+        return f"{content}\n{target_line}\n", "application.properties 已添加目标配置"
 
-    def _modify_cloud_datahub_properties(self, ssh: paramiko.SSHClient, env: str) -> Tuple[bool, bool]:
-        """修改cloudDatahub的application.properties文件"""
-        app_prop_path = self.cloud_datahub_app_prop_path
-        self.log(f"正在处理远程文件: {app_prop_path}", level="info")
+    @staticmethod
+    def _read_remote_files(ssh: paramiko.SSHClient, remote_paths: List[str]) -> Dict[str, Tuple[str, int, tuple]]:
+        """一条远程命令读取多个文件，返回 {路径: (内容, 权限位, (uid, gid))}，不存在或不可读的文件不在结果中"""
+        # 每个文件输出一行"大小 权限 uid gid 路径"，紧跟文件原始内容，按大小切分
+        paths = " ".join(shlex.quote(path) for path in remote_paths)
+        command = (f"for f in {paths}; do [ -f \"$f\" ] && [ -r \"$f\" ] && "
+                   f"printf '%s %s\\n' \"$(stat -c '%s %a %u %g' \"$f\")\" \"$f\" && cat \"$f\"; done; true")
+        _, stdout, _ = ssh.exec_command(command, timeout=30)
+        data = stdout.read()
+        stdout.channel.recv_exit_status()
+        files, pos = {}, 0
+        while pos < len(data):
+            header_end = data.index(b"\n", pos)
+            size, mode, uid, gid, path = data[pos:header_end].decode().split(" ", 4)
+            pos = header_end + 1 + int(size)
+            files[path] = (data[header_end + 1:pos].decode(), int(mode, 8), (int(uid), int(gid)))
+        return files
 
-        if not self._check_file_exists(ssh, app_prop_path):
-            self.log(f"文件不存在: {app_prop_path}", level="error")
-            return False, False
+    @staticmethod
+    def _write_remote_files(ssh: paramiko.SSHClient, files: Dict[str, Tuple[str, int, tuple]]) -> Dict[str, str]:
+        """
+        在一个SFTP会话中写回多个文件，返回写入失败的 {路径: 错误信息}
 
-        content = self._read_remote_file(ssh, app_prop_path)
-        env_type = self.get_env_type_value(env)
-        target_line = f"application.environmentType = {env_type}"
+        files: {路径: (内容, 权限位, (uid, gid)或None)}
 
-        # 检查是否已经是目标值
-        if target_line in content.splitlines():
-            self.log("application.properties 本来就是目标值，无需修改", level="info")
-            return False, True
+        每个文件先写入同目录的临时文件，设置原权限和属主后posix_rename替换，POS读配置时不会读到写了一半的文件；
+        目录不可写（无法创建临时文件）或无法把临时文件改回原属主时，退回原地覆盖（保留原属主）。
+        写临时文件中途失败时删除临时文件并报错，不再覆盖原文件。
+        """
+        errors = {}
+        with ssh.open_sftp() as sftp:
+            for remote_path, (content, mode, owner) in files.items():
+                data = content.encode()
+                temp_path = f"{remote_path}.tmp"
+                try:
+                    try:
+                        temp_file = sftp.file(temp_path, 'wb')
+                    except IOError:
+                        temp_file = None
+                    if temp_file is not None and not LinuxService._replace_with_temp(
+                            sftp, temp_file, temp_path, remote_path, data, mode, owner):
+                        temp_file = None
+                    if temp_file is None:
+                        with sftp.file(remote_path, 'wb') as f:
+                            f.write(data)
+                except Exception as e:
+                    errors[remote_path] = str(e)
+        return errors
 
-        # 修改或追加配置
+    @staticmethod
+    def _replace_with_temp(sftp, temp_file, temp_path: str, remote_path: str, data: bytes, mode: int,
+                           owner: Optional[tuple]) -> bool:
+        """写临时文件并替换原文件；无法改回原属主时删除临时文件并返回False，由调用方原地覆盖"""
         try:
-            if "application.environmentType" in content:
-                new_content = re.sub(
-                    r"^application\.environmentType\s*=.*$",
-                    target_line,
-                    content,
-                    flags=re.MULTILINE
-                )
-                self._write_remote_file(ssh, app_prop_path, new_content)
-                self.log("application.properties 已修改", level="info")
+            with temp_file:
+                temp_file.write(data)
+            sftp.chmod(temp_path, mode)
+            if owner:
+                attrs = sftp.stat(temp_path)
+                if (attrs.st_uid, attrs.st_gid) != owner:
+                    try:
+                        sftp.chown(temp_path, *owner)
+                    except IOError:
+                        sftp.remove(temp_path)
+                        return False
+            sftp.posix_rename(temp_path, remote_path)
+            return True
+        except Exception:
+            try:
+                sftp.remove(temp_path)
+            except IOError:
+                pass
+            raise
+
+    def _plan_config_changes(self, contents: Dict[str, Tuple[str, int, tuple]], env: str) -> Tuple[dict, dict, int]:
+        """
+        根据配置文件当前内容计算切换到env环境需要写入的文件
+
+        Returns:
+            ({路径: (新内容, 权限, 属主)}, {路径: 修改说明}, 已是目标值的文件数)
+        """
+        app_prop_path = self.cloud_datahub_app_prop_path
+        changed, messages = {}, {}
+        already_target_count = 0
+
+        # 处理所有配置文件
+        for i, remote_path in enumerate(self.file_paths):
+            self.log(f"处理远程文件 {i + 1}: {remote_path}", level="info")
+            if remote_path not in contents:
+                self.log(f"文件不存在: {remote_path}", level="error")
+                continue
+            content, mode, owner = contents[remote_path]
+            new_content = self._rewrite_cloud_url_config(remote_path, content, env)
+            if new_content == content:
+                self.log("文件已是目标值，无需修改", level="info")
+                already_target_count += 1
             else:
-                with ssh.open_sftp() as sftp:
-                    with sftp.file(app_prop_path, 'a') as f:
-                        f.write(f"\n{target_line}\n")
-                self.log("application.properties 已添加目标配置", level="info")
-            return True, False
-        except Exception as e:
-            self.log(f"修改配置失败: {str(e)}", level="error")
-            return False, False
+                changed[remote_path] = (new_content, mode, owner)
+                messages[remote_path] = f"文件已修改: {remote_path}"
+
+        # 处理 cloudDatahub application.properties
+        self.log(f"正在处理远程文件: {app_prop_path}", level="info")
+        if app_prop_path not in contents:
+            self.log(f"文件不存在: {app_prop_path}", level="error")
+        else:
+            content, mode, owner = contents[app_prop_path]
+            new_content, message = self._rewrite_cloud_datahub_properties(content, env)
+            if new_content == content:
+                self.log(message, level="info")
+                already_target_count += 1
+            else:
+                changed[app_prop_path] = (new_content, mode, owner)
+                messages[app_prop_path] = message
+        return changed, messages, already_target_count
+
+    def _apply_config_changes(self, ssh: paramiko.SSHClient, host: str, env: str, changed: dict, messages: dict,
+                              already_target_count: int) -> None:
+        """写回_plan_config_changes计算出的文件，前端配置写入失败时抛出IOError"""
+        errors = self._write_remote_files(ssh, changed) if changed else {}
+        for remote_path in changed:
+            if remote_path in errors:
+                self.log(f"修改配置失败: {remote_path}: {errors[remote_path]}", level="error")
+            else:
+                self.log(messages[remote_path], level="info")
+        modified_count = len(changed) - len(errors)
+
+        self.log(f"{host}已修改为{env}环境，修改 {modified_count} 个文件，目标值 {already_target_count} 个。",
+                 level="info")
+        # application.properties 修改失败只记录日志，前端配置写入失败视为整体失败
+        failed = [path for path in errors if path != self.cloud_datahub_app_prop_path]
+        if failed:
+            raise IOError(f"写入失败: {', '.join(failed)}")
 
     def modify_remote_files(self, host: str, username: str, password: str, env: str) -> None:
-        """修改远程服务器上所有目标文件"""
+        """修改远程服务器上所有目标文件：一次读取全部文件，本地计算替换，只把有变化的文件一次写回"""
         try:
             with self._connect_ssh(host, username, password) as ssh:
-                modified_count, already_target_count = 0, 0
-
-                # 处理所有配置文件
-                for i, remote_path in enumerate(self.file_paths):
-                    self.log(f"处理远程文件 {i + 1}: {remote_path}", level="info")
-                    modified, already_target = self._modify_remote_file(ssh, remote_path, env)
-                    modified_count += modified
-                    already_target_count += already_target
-
-                # 处理 cloudDatahub application.properties
-                modified, already_target = self._modify_cloud_datahub_properties(ssh, env)
-                modified_count += modified
-                already_target_count += already_target
-
-                self.log(f"{host}已修改为{env}环境，修改 {modified_count} 个文件，目标值 {already_target_count} 个。",
-                         level="info")
+                contents = self._read_remote_files(ssh, self.file_paths + [self.cloud_datahub_app_prop_path])
+                self._apply_config_changes(ssh, host, env, *self._plan_config_changes(contents, env))
         except Exception as e:
             self.log(f"远程修改出错: {str(e)}", level="error")
             raise
@@ -269,42 +366,73 @@ class LinuxService(Backend):
             self.log(f"重启过程中出错: {str(e)}", level="error")
             raise
 
-    def _upload_file_with_progress(self, sftp, local_path: str, remote_path: str,
-                                   progress_callback: Optional[Callable] = None,
-                                   speed_callback: Optional[Callable] = None,
-                                   progress_range: Tuple[int, int] = (0, 100)) -> None:
-        """带进度显示的文件上传"""
-        file_size = os.path.getsize(local_path)
-        chunk_size = 256 * 1024  # 256KB
-        uploaded = 0
-        low, high = progress_range
-
-        with open(local_path, 'rb') as local_file, sftp.file(remote_path, 'wb') as remote_file:
-            last_time = time.time()
-            last_uploaded = 0
-
-            while chunk := local_file.read(chunk_size):
-                remote_file.write(chunk)
-                uploaded += len(chunk)
-
-                # 更新进度
-                if progress_callback:
-                    current_progress = min(low + int(uploaded / file_size * (high - low)), high)
-                    progress_callback(current_progress)
-
-                # 更新速度
-                current_time = time.time()
-                if speed_callback and (current_time - last_time >= 0.5):
-                    speed = (uploaded - last_uploaded) / (current_time - last_time)
-                    speed_text = f"上传速率：{speed / 1024 / 1024:.2f} MB/s"
-                    speed_callback(speed_text)
-                    last_time = current_time
-                    last_uploaded = uploaded
+    def _upload_and_verify(self, ssh: paramiko.SSHClient, local_path: str, remote_path: str,
+                           progress_callback: Optional[Callable] = None,
+                           speed_callback: Optional[Callable] = None,
+                           progress_range: Tuple[int, int] = (0, 100)) -> str:
+        """
+        断点续传上传文件（见sftp_transfer），上传时同时计算MD5，写完后一次远程md5sum校验，不一致时抛出IOError
+
+        数据先写到暂存文件，校验一致后才替换remote_path；连接中断时自动重连并从断点继续。
+        """
+        md5 = upload_and_verify(ssh, local_path, remote_path, progress_callback, speed_callback, progress_range,
+                                self.log)
+        self.log(f"远程文件MD5校验一致: {md5}", level="success")
+        return md5
+
+    def _upload_war_delta(self, ssh: paramiko.SSHClient, local_path: str, remote_path: str,
+                          progress_callback: Optional[Callable] = None,
+                          speed_callback: Optional[Callable] = None,
+                          progress_range: Tuple[int, int] = (0, 100), output_path: Optional[str] = None) -> bool:
+        """
+        差量上传war包并在远程重建，无法差量或差异过大时返回False，由调用方整包上传
+
+        Args:
+            output_path: 新包写到该路径，remote_path上的旧包保持不变；为空时替换旧包
+        """
+        if not war_delta.is_zip(local_path):
+            return False
+        self.log("计算远程旧war包块签名...")
+        try:
+            signatures = war_delta.remote_signatures(ssh, remote_path)
+        except war_delta.DeltaUnavailable as e:
+            self.log(f"无法差量上传，改为整包上传: {e}", level="warning")
+            return False
+
+        local_size = os.path.getsize(local_path)
+        literal_file = tempfile.NamedTemporaryFile(suffix=".delta", delete=False)
+        try:
+            with literal_file:
+                # 差异超过上限时plan_delta中途停止，不必读完整个新包
+                ops, md5, literal_size = war_delta.plan_delta(local_path, signatures, literal_file,
+                                                              max_literal=int(local_size * self.DELTA_MAX_RATIO))
+            self.log(f"差量上传: 发送 {literal_size / 1024 / 1024:.1f} MB / 共 {local_size / 1024 / 1024:.1f} MB"
+                     f"（{literal_size / max(local_size, 1):.0%}）")
+            remote_literal_path = f"{output_path or remote_path}.delta"
+            upload_and_verify(ssh, literal_file.name, remote_literal_path, progress_callback, speed_callback,
+                              progress_range, self.log)
+        except war_delta.DeltaUnavailable as e:
+            self.log(f"{e}，改为整包上传", level="warning")
+            return False
+        finally:
+            os.unlink(literal_file.name)
+        try:
+            war_delta.apply_delta(ssh, remote_path, remote_literal_path, ops, md5, output_path)
+        except IOError as e:
+            self.log(f"{e}，改为整包上传", level="warning")
+            return False
+        self.log(f"远程war包已重建，MD5校验一致: {md5}", level="success")
+        return True
 
     def replace_war_linux(self, host: str, username: str, password: str, local_war_path: str,
                           progress_callback: Optional[Callable] = None,
-                          speed_callback: Optional[Callable] = None) -> None:
-        """替换远程服务器上的war包"""
+                          speed_callback: Optional[Callable] = None, delta: bool = True) -> None:
+        """
+        替换远程服务器上的war包
+
+        Args:
+            delta: 远程已有旧war包时只上传差异部分（见war_delta），无法差量时自动整包上传
+        """
         try:
             self.log(f"连接到 {host} ...")
             with self._connect_ssh(host, username, password) as ssh:
@@ -314,52 +442,330 @@ class LinuxService(Backend):
                 if not local_war_path or not os.path.isfile(local_war_path):
                     self.log("本地war包路径无效", level="error")
                     raise ValueError("本地war包路径无效")
-
-                # 删除旧war包
-                self._execute_command(ssh, f"rm -f {remote_war}")
-                self.log("旧war包已删除", "warning")
                 if progress_callback:
                     progress_callback(20)
 
-                # 上传新war包
-                self.log("上传新war包...")
-                with ssh.open_sftp() as sftp:
-                    self._upload_file_with_progress(sftp, local_war_path, remote_war,
-                                                    progress_callback, speed_callback, (20, 80))
+                if not (delta and self._upload_war_delta(ssh, local_war_path, remote_war,
+                                                         progress_callback, speed_callback, (20, 80))):
+                    # 上传新war包，校验一致后才替换旧war包
+                    self.log("上传新war包...")
+                    self._upload_and_verify(ssh, local_war_path, remote_war, progress_callback, speed_callback,
+                                            (20, 80))
                 self.log("上传完成", "success")
                 if progress_callback:
                     progress_callback(85)
 
-                # 检查远程文件大小
-                local_size = os.path.getsize(local_war_path)
-                for _ in range(15):
-                    out, _, exit_status = self._execute_command(ssh, f"stat -c %s {remote_war}")
-                    if exit_status == 0 and out.strip().isdigit() and int(out.strip()) == local_size:
-                        self.log(f"远程文件大小一致: {out.strip()} 字节", level="success")
-                        break
-                    time.sleep(1)
-                else:
-                    raise Exception("远程文件未就绪或大小不一致")
-
-                # 删除旧kpos文件夹并解压新war包
-                self._execute_command(ssh, f"rm -rf {remote_kpos}")
-                self._execute_command(ssh, f"mkdir -p {remote_kpos}")
-                self.log("解压新war包...")
-                out, err, exit_status = self._execute_command(ssh, f"unzip -o -DD -q {remote_war} -d {remote_kpos}")
+                # 同步解压目录：有部署清单时只解压变化的条目，否则删除旧kpos文件夹后全量解压
+                err, exit_status = self._sync_webapp(ssh, local_war_path, remote_war, remote_kpos)
                 if progress_callback:
                     progress_callback(100)
-                time.sleep(5)  # 等待解压完成
                 if exit_status == 0:
                     self.log("解压成功", level="success")
                     self.log("如果需要修改配置文件，可在此时操作，再重启POS。如不需要，则可以直接重启", level="warning")
                 else:
-                    real_errors = '\n'.join(
-                        [line for line in err.splitlines() if not line.lower().startswith('warning:')])
+                    real_errors = self._unzip_errors(err)
                     self.log(f"解压失败: {real_errors}" if real_errors else "解压过程中有警告，但无致命错误", "warning")
         except Exception as e:
             self.log(f"替换war包出错: {str(e)}", level="error")
             raise
 
+    def replace_war_multi(self, hosts: List[str], username: str, password: str, local_war_path: str,
+                          progress_callback: Optional[Callable] = None,
+                          result_callback: Optional[Callable] = None) -> Dict[str, dict]:
+        """
+        把同一个war包同时替换到多台POS：本地war包只读一遍，同时上传到所有主机（见war_broadcast），再各自同步解压目录
+
+        Args:
+            progress_callback: 单台主机进度回调，参数为(主机, 百分比)
+            result_callback: 单台主机完成回调，参数为(主机, 结果)
+
+        Returns:
+            {主机: {"success": 是否成功, "error": 错误信息, "seconds": 耗时, ...}}
+        """
+        if not local_war_path or not os.path.isfile(local_war_path):
+            self.log("本地war包路径无效", level="error")
+            raise ValueError("本地war包路径无效")
+        remote_war = f"{self.WEBAPPS_DIR}/kpos.war"
+        remote_kpos = f"{self.WEBAPPS_DIR}/kpos"
+        results = {}
+        sessions = {}
+
+        def finish(host, result):
+            results[host] = result
+            if result["success"]:
+                self.log(f"[{host}] 换包完成，用时 {result['seconds']} 秒", level="success")
+            else:
+                self.log(f"[{host}] 换包失败: {result['error']}", level="error")
+            if result_callback:
+                result_callback(host, result)
+
+        def report(host, percent):
+            if progress_callback:
+                progress_callback(host, percent)
+
+        start = time.monotonic()
+        workers = max(1, min(len(hosts), self.MULTI_HOST_WORKERS))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                self.log(f"连接 {len(hosts)} 台POS ...")
+                futures = {executor.submit(self._connect_ssh, host, username, password): host for host in hosts}
+                for future in concurrent.futures.as_completed(futures):
+                    host = futures[future]
+                    try:
+                        sessions[host] = future.result()
+                    except Exception as e:
+                        finish(host, {"success": False, "error": f"连接失败: {e}", "seconds": 0.0})
+                if not sessions:
+                    return results
+
+                self.log(f"同时上传war包到 {len(sessions)} 台POS ...")
+                uploads = war_broadcast.broadcast_upload(
+                    sessions, local_war_path, remote_war,
+                    lambda host, percent: report(host, percent * 80 // 100), self.log)
+
+                def sync(host):
+                    result = uploads[host]
+                    if not result["success"]:
+                        return result
+                    report(host, 85)
+                    err, exit_status = self._sync_webapp(sessions[host], local_war_path, remote_war, remote_kpos)
+                    report(host, 100)
+                    real_errors = self._unzip_errors(err) if exit_status != 0 else ""
+                    result = dict(result, seconds=round(time.monotonic() - start, 2))
+                    if real_errors:
+                        result.update(success=False, error=f"解压失败: {real_errors}")
+                    return result
+
+                futures = {executor.submit(sync, host): host for host in sessions}
+                for future in concurrent.futures.as_completed(futures):
+                    host = futures[future]
+                    try:
+                        finish(host, future.result())
+                    except Exception as e:
+                        finish(host, {"success": False, "error": str(e), "seconds": round(time.monotonic() - start, 2)})
+            finally:
+                for ssh in sessions.values():
+                    ssh.close()
+
+        succeeded = sum(1 for result in results.values() if result["success"])
+        self.log(f"批量换包结束: 成功 {succeeded} 台, 失败 {len(results) - succeeded} 台, "
+                 f"总用时 {time.monotonic() - start:.1f} 秒", level="success" if succeeded == len(results) else "warning")
+        return results
+
+    def _plan_war_config_changes(self, ssh: paramiko.SSHClient, local_war_path: str,
+                                 env: str) -> Tuple[dict, dict, int]:
+        """
+        预先计算换包后要写入的配置：kpos下的配置取自本地新war包（换包后即为这些内容），
+        cloudDatahub不随war包变化，读取远程当前内容
+        """
+        kpos_prefix = f"{self.WEBAPPS_DIR}/kpos/"
+        contents = {}
+        with zipfile.ZipFile(local_war_path) as zf:
+            for remote_path in self.file_paths:
+                try:
+                    info = zf.getinfo(remote_path[len(kpos_prefix):])
+                except KeyError:
+                    continue
+                # 与unzip一致：有unix权限位时沿用，否则为0644
+                # 换包后的文件由解压它的SSH用户所有，写入时不需要改属主
+                contents[remote_path] = (zf.read(info).decode(), (info.external_attr >> 16) & 0o777 or 0o644, None)
+        contents.update(self._read_remote_files(ssh, [self.cloud_datahub_app_prop_path]))
+        return self._plan_config_changes(contents, env)
+
+    def pipeline_war_upgrade(self, host: str, username: str, password: str, local_war_path: str, env: str,
+                             progress_callback: Optional[Callable] = None,
+                             speed_callback: Optional[Callable] = None,
+                             progress_text_callback: Optional[Callable] = None) -> Dict[str, float]:
+        """
+        一键升级（替换war包、修改配置、重启POS），蓝绿部署（见staged_deploy），按依赖关系调度（见pipeline_scheduler）:
+
+            上传新war包 -> 解压到暂存目录 ─┐
+                                           ├─> 暂存目录中修改配置 -> 停止POS -> 切换目录、写入cloudDatahub配置 -> 启动POS
+            计算配置修改 ──────────────────┘
+
+        停止POS之前的阶段都不改动线上文件，任一阶段失败时POS照常运行；停机时间只包含停止、几次rename、写一个配置文件和启动。
+        切换后上一版本保留在PREV_KPOS/PREV_WAR，可用rollback_war_linux回滚。
+
+        Returns:
+            {"wall_time": 总耗时秒数, "downtime": POS停机秒数}
+        """
+        if not local_war_path or not os.path.isfile(local_war_path):
+            self.log("本地war包路径无效", level="error")
+            raise ValueError("本地war包路径无效")
+        remote_war = f"{self.WEBAPPS_DIR}/kpos.war"
+        remote_kpos = f"{self.WEBAPPS_DIR}/kpos"
+        staged_manifest = f"{self.WEBAPP_MANIFEST}.staged"
+        plan = {}
+
+        def progress(percent):
+            if progress_callback:
+                progress_callback(percent)
+
+        def upload():
+            with self._connect_ssh(host, username, password) as ssh:
+                # 以当前kpos.war为旧包差量重建到STAGED_WAR，kpos.war本身在切换前保持不变
+                if not self._upload_war_delta(ssh, local_war_path, remote_war, progress, speed_callback, (0, 60),
+                                              self.STAGED_WAR):
+                    self.log("上传新war包...")
+                    self._upload_and_verify(ssh, local_war_path, self.STAGED_WAR, progress, speed_callback, (0, 60))
+            if speed_callback:
+                speed_callback("")
+            self.log("上传完成", "success")
+
+        def plan_config():
+            with self._connect_ssh(host, username, password) as ssh:
+                plan["config"] = self._plan_war_config_changes(ssh, local_war_path, env)
+
+        def extract():
+            with self._connect_ssh(host, username, password) as ssh:
+                err, exit_status = staged_deploy.extract(ssh, self.STAGED_WAR, self.STAGING_KPOS)
+                real_errors = self._unzip_errors(err) if exit_status != 0 else ""
+                if real_errors:
+                    self._execute_command(ssh, f"rm -rf {self.STAGING_KPOS}")
+                    raise IOError(f"解压失败: {real_errors}")
+                # 清单先于配置写入，改写过的配置文件下次同步时按war包重新解压（与modify_remote_files一致）
+                webapp_sync.write_manifest(ssh, staged_manifest, webapp_sync.war_manifest(local_war_path))
+            self.log("已解压到暂存目录", level="success")
+
+        def write_config():
+            # kpos下的配置写到暂存目录中对应的文件；cloudDatahub不在war包中，停止POS并切换版本时才写入
+            changed, messages, already_target_count = plan["config"]
+            kpos_prefix = f"{remote_kpos}/"
+            staged = {f"{self.STAGING_KPOS}/{path[len(kpos_prefix):]}": path
+                      for path in changed if path.startswith(kpos_prefix)}
+            with self._connect_ssh(host, username, password) as ssh:
+                self._apply_config_changes(ssh, host, env,
+                                           {staged_path: changed[path] for staged_path, path in staged.items()},
+                                           {staged_path: messages[path] for staged_path, path in staged.items()},
+                                           already_target_count)
+            plan["datahub"] = {path: (item, messages[path]) for path, item in changed.items()
+                               if not path.startswith(kpos_prefix)}
+
+        def swap():
+            with self._connect_ssh(host, username, password) as ssh:
+                staged_deploy.swap_in(ssh, [(self.STAGING_KPOS, remote_kpos, self.PREV_KPOS),
+                                            (self.STAGED_WAR, remote_war, self.PREV_WAR),
+                                            (staged_manifest, self.WEBAPP_MANIFEST, f"{self.WEBAPP_MANIFEST}.prev")],
+                                      self.TOMCAT_HOME)
+                self.log("已切换到新版本，上一版本已保留，可回滚", level="success")
+                # 新版本已生效后再改cloudDatahub，切换失败时两者都保持原环境；写入失败只记录日志（与modify_remote_files一致）
+                datahub = plan["datahub"]
+                errors = self._write_remote_files(ssh, {path: item for path, (item, _) in datahub.items()})
+                for path, (_, message) in datahub.items():
+                    if path in errors:
+                        self.log(f"修改配置失败: {path}: {errors[path]}", level="error")
+                    else:
+                        self.log(message, level="info")
+
+        stages = [
+            PipelineStage("upload", "上传WAR包", upload),
+            PipelineStage("plan", "准备配置文件", plan_config),
+            PipelineStage("extract", "解压到暂存目录", extract, deps=["upload"]),
+            PipelineStage("config", "修改配置文件", write_config, deps=["extract", "plan"]),
+            PipelineStage("stop", "停止POS服务", lambda: self.stop_pos_linux(host, username, password),
+                          deps=["config"]),
+            PipelineStage("swap", "切换版本", swap, deps=["stop"]),
+            PipelineStage("start", "启动POS服务", lambda: self.start_pos_linux(host, username, password),
+                          deps=["swap"]),
+        ]
+        # 上传阶段自己汇报0-60的进度，其余阶段完成时推进到固定进度
+        stage_progress = {"extract": 75, "config": 80, "stop": 85, "swap": 90, "start": 100}
+        return self._run_pipeline(stages, stage_progress, progress, progress_text_callback)
+
+    def rollback_war_linux(self, host: str, username: str, password: str,
+                           progress_callback: Optional[Callable] = None,
+                           progress_text_callback: Optional[Callable] = None) -> Dict[str, float]:
+        """
+        回滚到一键升级前的版本：停止POS，线上版本与保留的上一版本互换，再启动POS；再次回滚即恢复到新版本
+
+        Returns:
+            {"wall_time": 总耗时秒数, "downtime": POS停机秒数}
+        """
+        with self._connect_ssh(host, username, password) as ssh:
+            if not staged_deploy.has_previous(ssh, self.PREV_KPOS):
+                self.log("POS上没有保留的上一版本，无法回滚", level="error")
+                raise ValueError("没有可回滚的上一版本")
+
+        def swap():
+            with self._connect_ssh(host, username, password) as ssh:
+                staged_deploy.exchange(ssh, [(f"{self.WEBAPPS_DIR}/kpos", self.PREV_KPOS, False),
+                                             (f"{self.WEBAPPS_DIR}/kpos.war", self.PREV_WAR, False),
+                                             (self.WEBAPP_MANIFEST, f"{self.WEBAPP_MANIFEST}.prev", True)])
+            self.log("已回滚到上一版本", level="success")
+
+        stages = [
+            PipelineStage("stop", "停止POS服务", lambda: self.stop_pos_linux(host, username, password)),
+            PipelineStage("swap", "回滚版本", swap, deps=["stop"]),
+            PipelineStage("start", "启动POS服务", lambda: self.start_pos_linux(host, username, password),
+                          deps=["swap"]),
+        ]
+        return self._run_pipeline(stages, {"stop": 30, "swap": 60, "start": 100},
+                                  progress_callback or (lambda percent: None), progress_text_callback)
+
+    def _run_pipeline(self, stages: List[PipelineStage], stage_progress: Dict[str, int],
+                      progress_callback: Callable, progress_text_callback: Optional[Callable] = None
+                      ) -> Dict[str, float]:
+        """执行流水线并记录各阶段耗时，结束（包括出错）时分别报告总耗时和POS停机时间"""
+        running = []  # 进度文本显示所有正在并行执行的阶段
+
+        def show_running():
+            if progress_text_callback and running:
+                progress_text_callback(f"正在{'、'.join(running)}...")
+
+        def on_start(stage):
+            self.log(f"开始{stage.label}")
+            running.append(stage.label)
+            show_running()
+
+        def on_done(stage, seconds):
+            self.log(f"{stage.label}完成，用时 {seconds:.1f} 秒")
+            running.remove(stage.label)
+            show_running()
+            if stage.name in stage_progress:
+                progress_callback(stage_progress[stage.name])
+
+        scheduler = PipelineScheduler(stages, on_start, on_done)
+        succeeded = False
+        try:
+            scheduler.run()
+            succeeded = True
+        finally:
+            downtime = scheduler.span("stop", "start")
+            self.log(f"总耗时 {scheduler.wall_time:.1f} 秒，POS停机 {downtime:.1f} 秒",
+                     level="success" if succeeded else "warning")
+        return {"wall_time": scheduler.wall_time, "downtime": downtime}
+
+    @staticmethod
+    def _unzip_errors(err: str) -> str:
+        """过滤掉unzip输出中的警告，只保留真正的错误"""
+        return '\n'.join([line for line in err.splitlines() if not line.lower().startswith('warning:')])
+
+    def _sync_webapp(self, ssh: paramiko.SSHClient, local_war_path: str, remote_war: str,
+                     remote_kpos: str) -> Tuple[str, int]:
+        """按部署清单同步解压目录（见webapp_sync），返回 (unzip错误输出, 退出码)"""
+        target = webapp_sync.war_manifest(local_war_path)
+        state = webapp_sync.read_deployed_state(ssh, remote_kpos, self.WEBAPP_MANIFEST)
+        if state is None:
+            # 先解压到暂存目录再切换，解压期间旧kpos文件夹保持可用，解压失败时不替换
+            self.log("解压新war包...")
+            err, exit_status = staged_deploy.extract(ssh, remote_war, self.STAGING_KPOS)
+            if exit_status == 0 or not self._unzip_errors(err):
+                staged_deploy.swap_in(ssh, [(self.STAGING_KPOS, remote_kpos, None)], self.TOMCAT_HOME)
+            else:
+                self._execute_command(ssh, f"rm -rf {self.STAGING_KPOS}")
+        else:
+            deployed, modified, existing = state
+            extract, remove = webapp_sync.plan_sync(deployed, modified, existing, target)
+            unchanged = sum(1 for name in target if not name.endswith("/")) - len(extract)
+            self.log(f"按条目同步解压: 解压 {len(extract)} 个, 删除 {len(remove)} 个, 未变化 {unchanged} 个")
+            err, exit_status = webapp_sync.apply_sync(ssh, remote_war, remote_kpos, extract, remove)
+        # 解压成功（或只有警告）才记录清单，否则删除清单，下次全量解压
+        if exit_status == 0 or not self._unzip_errors(err):
+            webapp_sync.write_manifest(ssh, self.WEBAPP_MANIFEST, target)
+        else:
+            webapp_sync.remove_manifest(ssh, self.WEBAPP_MANIFEST)
+        return err, exit_status
+
     def scan_upgrade_packages(self, ssh: paramiko.SSHClient, remote_base_path: str) -> List[str]:
         """扫描远程目标路径下符合条件的升级包，并按文件夹修改时间倒序排序"""
         try:
@@ -403,8 +809,8 @@ class LinuxService(Backend):
 
             # 上传升级包
             self.log(f"上传升级包到 {remote_package_path} ...", level="info")
-            with ssh.open_sftp() as sftp:
-                sftp.put(local_package_path, remote_package_path)
+            self._upload_and_verify(ssh, local_package_path, remote_package_path, progress_callback,
+                                    progress_range=(40, 70))
             self.log("上传完成", level="success")
 
             if progress_callback:
@@ -433,11 +839,10 @@ class LinuxService(Backend):
     def get_file_md5(self, ssh: paramiko.SSHClient, remote_path: str) -> Optional[str]:
         """获取远程文件的 MD5 值"""
         try:
-            out, err, _ = self._execute_command(ssh, f"md5sum {remote_path}")
-            if err:
-                self.log(f"获取 MD5 值时出错: {err}", level="error")
-                return None
-            return out.split()[0]  # 返回 MD5 值
+            md5 = remote_md5(ssh, remote_path)
+            if md5 is None:
+                self.log(f"获取 MD5 值时出错: {remote_path}", level="error")
+            return md5
         except Exception as e:
             self.log(f"获取 MD5 值过程中出错: {str(e)}", level="error")
             return None
@@ -477,9 +882,7 @@ class LinuxService(Backend):
 
                 # 上传文件
                 self.log(f"上传文件到 {remote_file} ...", level="info")
-                with ssh.open_sftp() as sftp:
-                    self._upload_file_with_progress(sftp, local_file, remote_file,
-                                                    progress_callback, speed_callback, (20, 80))
+                self._upload_and_verify(ssh, local_file, remote_file, progress_callback, speed_callback, (20, 80))
                 self.log("上传完成", level="success")
                 if progress_callback:
                     progress_callback(85)
@@ -512,10 +915,14 @@ class LinuxService(Backend):
                 err = stderr.read().decode()
                 if err:
                     self.log(f"错误: {err.strip()}", level="error")
+                # 使用pty时错误信息混在标准输出里，以退出码判断是否成功
+                if stdout.channel.recv_exit_status() != 0:
+                    raise RuntimeError(f"systemctl执行失败: {stdout.read().decode(errors='replace').strip()}")
 
                 self.log("Tomcat服务已重启完成。", level="success")
         except Exception as e:
             self.log(f"重启Tomcat服务时出错: {str(e)}", level="error")
+            raise
 
     def list_backup_items(self, host: str, username: str, password: str) -> List[str]:
         """列出/opt/backup下所有.zip和文件夹，按时间倒序"""
@@ -545,8 +952,7 @@ class LinuxService(Backend):
             remote_zip = f"{remote_dir}/{os.path.basename(local_package_path)}"
             # 上传升级包
             self.log(f"上传升级包到 {remote_zip}")
-            with ssh.open_sftp() as sftp:
-                sftp.put(local_package_path, remote_zip)
+            self._upload_and_verify(ssh, local_package_path, remote_zip, progress_callback, progress_range=(0, 20))
             if progress_callback:
                 progress_callback(20)
             # 解压升级包
@@ -576,65 +982,63 @@ class LinuxService(Backend):
         try:
             if log_callback:
                 log_callback(f"开始数据恢复: {host}, 恢复项: {item_name}")
-            ssh = self._connect_ssh(host, username, password)
-            folder_name = item_name
-            progress = 5
-            if progress_callback:
-                progress_callback(progress)
+            with self._connect_ssh(host, username, password) as ssh:
+                folder_name = item_name
+                progress = 5
+                if progress_callback:
+                    progress_callback(progress)
+
+                # 解压zip
+                if is_zip:
+                    if log_callback:
+                        log_callback(f"解压zip文件: /opt/backup/{item_name}")
+                    unzip_cmd = f"sudo unzip /opt/backup/{item_name} -d /opt/backup/"
+                    stdin, stdout, stderr = ssh.exec_command(unzip_cmd)
+                    unzip_progress = progress
+                    while not stdout.channel.exit_status_ready():
+                        time.sleep(0.5)
+                        unzip_progress = min(unzip_progress + 5, 30)
+                        if progress_callback:
+                            progress_callback(unzip_progress)
+                    for line in stdout:
+                        if log_callback:
+                            log_callback(line.strip())
+                    err = stderr.read().decode()
+                    if err:
+                        if log_callback:
+                            log_callback(f"解压错误: {err}", "error")
+                        if error_callback:
+                            error_callback(err)
+                    folder_name = item_name.replace('.zip', '')
+                    progress = 30
+                    if progress_callback:
+                        progress_callback(progress)
+
+                # 修正：文件夹恢复时自动加斜杠
+                if not is_zip and not folder_name.endswith('/'):
+                    folder_name = folder_name + '/'
 
-            # 解压zip
-            if is_zip:
                 if log_callback:
-                    log_callback(f"解压zip文件: /opt/backup/{item_name}")
-                unzip_cmd = f"sudo unzip /opt/backup/{item_name} -d /opt/backup/"
-                stdin, stdout, stderr = ssh.exec_command(unzip_cmd)
-                unzip_progress = progress
+                    log_callback(f"执行dbrestore: cd /opt/backup && dbrestore {folder_name}")
+                restore_cmd = f"cd /opt/backup && dbrestore {folder_name}"
+                stdin, stdout, stderr = ssh.exec_command(restore_cmd)
+                restore_progress = progress
                 while not stdout.channel.exit_status_ready():
                     time.sleep(0.5)
-                    unzip_progress = min(unzip_progress + 5, 30)
+                    restore_progress = min(restore_progress + 5, 95)
                     if progress_callback:
-                        progress_callback(unzip_progress)
+                        progress_callback(restore_progress)
+
                 for line in stdout:
                     if log_callback:
                         log_callback(line.strip())
+
                 err = stderr.read().decode()
                 if err:
                     if log_callback:
-                        log_callback(f"解压错误: {err}", "error")
+                        log_callback(f"恢复错误: {err}", "error")
                     if error_callback:
                         error_callback(err)
-                folder_name = item_name.replace('.zip', '')
-                progress = 30
-                if progress_callback:
-                    progress_callback(progress)
-
-            # 修正：文件夹恢复时自动加斜杠
-            if not is_zip and not folder_name.endswith('/'):
-                folder_name = folder_name + '/'
-
-            if log_callback:
-                log_callback(f"执行dbrestore: cd /opt/backup && dbrestore {folder_name}")
-            restore_cmd = f"cd /opt/backup && dbrestore {folder_name}"
-            stdin, stdout, stderr = ssh.exec_command(restore_cmd)
-            restore_progress = progress
-            while not stdout.channel.exit_status_ready():
-                time.sleep(0.5)
-                restore_progress = min(restore_progress + 5, 95)
-                if progress_callback:
-                    progress_callback(restore_progress)
-
-            for line in stdout:
-                if log_callback:
-                    log_callback(line.strip())
-
-            err = stderr.read().decode()
-            if err:
-                if log_callback:
-                    log_callback(f"恢复错误: {err}", "error")
-                if error_callback:
-                    error_callback(err)
-
-            ssh.close()
             if log_callback:
                 log_callback("数据恢复完成", "success")
             if progress_callback:
@@ -654,35 +1058,33 @@ class LinuxService(Backend):
         try:
             if log_callback:
                 log_callback(f"开始数据备份: {host}")
-            ssh = self._connect_ssh(host, username, password)
-            if log_callback:
-                log_callback("执行备份脚本: cd /opt/backup && sh backup.sh")
-            cmd = "cd /opt/backup && sh backup.sh"
-            stdin, stdout, stderr = ssh.exec_command(cmd)
-            progress = 5
-            if progress_callback:
-                progress_callback(progress)
-
-            # 进度递增模拟
-            while not stdout.channel.exit_status_ready():
-                time.sleep(0.5)
-                progress = min(progress + 3, 90)
+            with self._connect_ssh(host, username, password) as ssh:
+                if log_callback:
+                    log_callback("执行备份脚本: cd /opt/backup && sh backup.sh")
+                cmd = "cd /opt/backup && sh backup.sh"
+                stdin, stdout, stderr = ssh.exec_command(cmd)
+                progress = 5
                 if progress_callback:
                     progress_callback(progress)
 
-            # 命令完成后处理输出
-            for line in stdout:
-                if log_callback:
-                    log_callback(line.strip())
+                # 进度递增模拟
+                while not stdout.channel.exit_status_ready():
+                    time.sleep(0.5)
+                    progress = min(progress + 3, 90)
+                    if progress_callback:
+                        progress_callback(progress)
 
-            err = stderr.read().decode()
-            if err:
-                if log_callback:
-                    log_callback(f"备份脚本错误: {err}", "error")
-                if error_callback:
-                    error_callback(err)
+                # 命令完成后处理输出
+                for line in stdout:
+                    if log_callback:
+                        log_callback(line.strip())
 
-            ssh.close()
+                err = stderr.read().decode()
+                if err:
+                    if log_callback:
+                        log_callback(f"备份脚本错误: {err}", "error")
+                    if error_callback:
+                        error_callback(err)
             if log_callback:
                 log_callback("数据备份完成", "success")
             if progress_callback:
@@ -698,74 +1100,52 @@ class LinuxService(Backend):
                                  speed_callback=None, log_callback=None, progress_text_callback=None):
         """
         一键升级包升级主流程：上传war包、执行升级脚本、修改配置、重启POS。
+
+        升级脚本会自行部署war包，其后的步骤都依赖它的结果，各阶段按顺序执行；
+        POS在上传和升级脚本执行期间保持运行，只在修改配置后停止并立即启动，分别报告总耗时和停机时间。
         """
-        try:
-            def log_and_emit(msg):
-                if log_callback:
-                    log_callback(msg)
-                if progress_text_callback:
-                    progress_text_callback(msg)
+        def log_and_emit(msg):
+            if log_callback:
+                log_callback(msg)
+            if progress_text_callback:
+                progress_text_callback(msg)
 
-            log_and_emit("一键升级包升级开始")
+        def progress(percent):
+            if progress_callback:
+                progress_callback(percent)
 
-            # 上传war包
-            log_and_emit(f"正在上传kpos.war到{selected_dir} ...")
+        def upload():
             with self._connect_ssh(host, username, password) as ssh:
                 remote_war = f"{selected_dir}/kpos.war"
-                with ssh.open_sftp() as sftp, open(war_file, 'rb') as f_src:
-                    file_size = os.path.getsize(war_file)
-                    uploaded, last_uploaded, start_time = 0, 0, time.time()
-                    with sftp.file(remote_war, 'wb') as f_dst:
-                        while True:
-                            data = f_src.read(1024 * 1024)
-                            if not data:
-                                break
-                            f_dst.write(data)
-                            uploaded += len(data)
-                            percent = int(uploaded / file_size * 40)  # 0~40区间
-                            if progress_callback:
-                                progress_callback(percent)
-                            # 速率
-                            elapsed = time.time() - start_time
-                            if elapsed > 0 and speed_callback:
-                                speed = (uploaded - last_uploaded) / elapsed / 1024 / 1024  # MB/s
-                                speed_callback(f"上传速率：{speed:.2f} MB/s")
-                                last_uploaded, start_time = uploaded, time.time()
-
-                if speed_callback:
-                    speed_callback("")  # 清空速率显示
+                self._upload_and_verify(ssh, war_file, remote_war, progress, speed_callback, (0, 40))
+            if speed_callback:
+                speed_callback("")  # 清空速率显示
 
-            if progress_callback:
-                progress_callback(40)
-
-            # 执行升级脚本
-            log_and_emit("正在执行升级脚本 ...")
+        def update():
             with self._connect_ssh(host, username, password) as ssh:
                 self._execute_command(ssh, f"cd {selected_dir} && sh update.sh")
-
-            if progress_callback:
-                progress_callback(60)
-            self.log("等待远程解压完成(5s) ...")
-            time.sleep(5)  # 等待5秒
-            if progress_callback:
-                progress_callback(70)
-
-            # 修改配置文件
-            log_and_emit("正在修改配置文件 ...")
-            self.modify_remote_files(host, username, password, env)
-
-            if progress_callback:
-                progress_callback(85)
-
-            # 重启POS
-            log_and_emit("正在重启POS ...")
-            self.restart_pos_linux(host, username, password)
-
-            if progress_callback:
-                progress_callback(100)
-
+                # 升级脚本可能在后台解压，等解压进程结束（最多UNZIP_WAIT秒）再改配置
+                _, _, exit_status = self._execute_command(
+                    ssh, f"for i in $(seq {self.UNZIP_WAIT}); do pgrep -x unzip >/dev/null || exit 0; sleep 1; done;"
+                         f" exit 1", timeout=self.UNZIP_WAIT + 30)
+                if exit_status != 0:
+                    self.log(f"等待远程解压超过 {self.UNZIP_WAIT} 秒，继续修改配置", level="warning")
+
+        stages = [
+            PipelineStage("upload", f"上传kpos.war到{selected_dir}", upload),
+            PipelineStage("update", "执行升级脚本", update, deps=["upload"]),
+            PipelineStage("config", "修改配置文件", lambda: self.modify_remote_files(host, username, password, env),
+                          deps=["update"]),
+            PipelineStage("stop", "停止POS服务", lambda: self.stop_pos_linux(host, username, password),
+                          deps=["config"]),
+            PipelineStage("start", "启动POS服务", lambda: self.start_pos_linux(host, username, password),
+                          deps=["stop"]),
+        ]
+        try:
+            log_and_emit("一键升级包升级开始")
+            self._run_pipeline(stages, {"upload": 40, "update": 70, "config": 85, "start": 100}, progress,
+                               progress_text_callback)
             log_and_emit("一键升级包升级已完成！")
-
         except Exception as e:
             if log_callback:
                 log_callback(f"升级异常: {str(e)}", "error")
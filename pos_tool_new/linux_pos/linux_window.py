@@ -1,17 +1,22 @@
 import os
 from typing import Optional, Tuple, Callable
 
-from PyQt6.QtCore import QTimer, pyqtSlot
+from PyQt6.QtCore import QTimer, Qt, pyqtSlot
 from PyQt6.QtWidgets import (
     QVBoxLayout, QPushButton, QHBoxLayout, QLabel, QLineEdit, QFileDialog, QGroupBox, QComboBox, QMessageBox,
     QInputDialog, QSizePolicy
 )
 
 from pos_tool_new.backend import Backend
+from pos_tool_new.linux_pos.fleet_dialog import FleetDialog
+from pos_tool_new.linux_pos.fleet_runner import parse_hosts
 from pos_tool_new.linux_pos.linux_service import LinuxService
+from pos_tool_new.linux_pos.sftp_transfer import file_md5
 from pos_tool_new.main import BaseTabWidget, MainWindow
+from pos_tool_new.scan_pos.device_inventory import DeviceInventory
+from pos_tool_new.scan_pos.pos_scanner import SSH_PORT
 from pos_tool_new.work_threads import ReplaceWarThreadLinux, RestartPosThreadLinux, RestartTomcatThread, UpgradeThread, \
-    UploadUpgradePackageThread, SshTestThread
+    UploadUpgradePackageThread, SshTestThread, ReplaceWarMultiThreadLinux, RollbackWarThreadLinux
 
 
 class LinuxTabWidget(BaseTabWidget):
@@ -32,10 +37,12 @@ class LinuxTabWidget(BaseTabWidget):
         self.war_path: Optional[QLineEdit] = None
         self.local_md5_btn: Optional[QPushButton] = None
         self.replace_btn: Optional[QPushButton] = None
+        self.replace_multi_btn: Optional[QPushButton] = None
         self.upload_btn: Optional[QPushButton] = None
         self.upgrade_btn: Optional[QPushButton] = None
         self.restart_tomcat_btn: Optional[QPushButton] = None
         self.restart_btn: Optional[QPushButton] = None
+        self.rollback_btn: Optional[QPushButton] = None
 
         self.parent_window: Optional[MainWindow] = parent
         self.service = LinuxService()
@@ -45,10 +52,12 @@ class LinuxTabWidget(BaseTabWidget):
 
         # 初始化线程变量
         self.replace_thread: Optional[ReplaceWarThreadLinux] = None
+        self.replace_multi_thread: Optional[ReplaceWarMultiThreadLinux] = None
         self.restart_thread: Optional[RestartPosThreadLinux] = None
         self.restart_tomcat_thread: Optional[RestartTomcatThread] = None
         self.upgrade_thread: Optional[UpgradeThread] = None
         self.upload_thread: Optional[UploadUpgradePackageThread] = None
+        self.rollback_thread: Optional[RollbackWarThreadLinux] = None
 
     def _validate_connection_params(self) -> Tuple[bool, str, str, str, str]:
         """
@@ -122,6 +131,9 @@ class LinuxTabWidget(BaseTabWidget):
                 QMessageBox.warning(self, "参数错误", error_msg)
                 return
 
+            if self._ssh_closed_by_scan(host):
+                return
+
             # 如果需要文件验证
             if need_file_validation and file_path:
                 is_file_valid, file_error_msg = self._validate_file_path(file_path, file_type)
@@ -227,6 +239,14 @@ class LinuxTabWidget(BaseTabWidget):
         self.replace_btn.clicked.connect(self.on_replace_war_linux)
         self.replace_btn.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         file_btn_layout.addWidget(self.replace_btn)
+        # 批量替换war包按钮
+        self.replace_multi_btn = QPushButton("批量替换war包")
+        self.replace_multi_btn.clicked.connect(self.on_replace_war_multi)
+        self.replace_multi_btn.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        file_btn_layout.addWidget(self.replace_multi_btn)
+        self.add_help_button(self.replace_multi_btn,
+                             "同一个war包同时替换到多台POS（每行一个IP，默认填入扫描到的设备）。\n"
+                             "war包只读取一次，同时上传到所有主机，总耗时取决于最慢的一台。")
         # 上传升级包按钮
         self.upload_btn = QPushButton("上传升级包")
         self.upload_btn.clicked.connect(self.on_upload_upgrade_package)
@@ -267,15 +287,25 @@ class LinuxTabWidget(BaseTabWidget):
         self.restore_btn = QPushButton("数据恢复")
         self.restore_btn.clicked.connect(self.on_restore_data)
         action_layout.addWidget(self.restore_btn)
+        self.fleet_btn = QPushButton("批量操作")
+        self.fleet_btn.clicked.connect(self.on_fleet_operation)
+        action_layout.addWidget(self.fleet_btn)
+        self.add_help_button(self.fleet_btn, "对多台POS并行执行重启pos、修改文件、重启Tomcat、数据备份或查询远程包MD5，"
+                                             "默认填入扫描到的设备。")
 
         # 新增流水线布局和一键升级按钮
         pipeline_group = QGroupBox("流水线")
         pipeline_layout = QHBoxLayout(pipeline_group)
         pipeline_layout.addStretch()  # 左侧留白，按钮靠右
         self.upgrade_btn = QPushButton("一键升级")
-        self.add_help_button(self.upgrade_btn, "依次执行【替换远程war包】->【修改文件】->【重启pos】")
+        self.add_help_button(self.upgrade_btn, "POS运行时上传war包、解压到暂存目录并修改配置，"
+                                               "再停止POS切换到新版本并启动，停机只需几秒；上一版本保留，可回滚")
         self.upgrade_btn.clicked.connect(self.on_pipeline_upgrade)
         pipeline_layout.addWidget(self.upgrade_btn)
+        self.rollback_btn = QPushButton("回滚上一版本")
+        self.add_help_button(self.rollback_btn, "切换回【一键升级】之前的版本并重启POS，再次回滚即恢复到新版本")
+        self.rollback_btn.clicked.connect(self.on_rollback_war)
+        pipeline_layout.addWidget(self.rollback_btn)
         self.upgrade_package_btn = QPushButton("一键升级包升级")
         self.add_help_button(self.upgrade_package_btn, "依次执行【使用升级包升级】->【修改文件】->【重启pos】")
         self.upgrade_package_btn.clicked.connect(self.on_pipeline_package_upgrade)
@@ -303,11 +333,49 @@ class LinuxTabWidget(BaseTabWidget):
 
 
 
+    def showEvent(self, event):
+        """显示时把扫描到的SSH主机加入主机下拉框"""
+        super().showEvent(event)
+        self._load_scanned_hosts()
+
+    def _load_scanned_hosts(self):
+        try:
+            devices = DeviceInventory.shared().hosts_with_port(SSH_PORT)
+        except Exception:
+            return
+        for device in devices:
+            if self.host_ip.findText(device["ip"]) == -1:
+                self.host_ip.addItem(device["ip"])
+                self.host_ip.setItemData(self.host_ip.count() - 1, device["name"] or "扫描发现",
+                                         Qt.ItemDataRole.ToolTipRole)
+
+    def _ssh_closed_by_scan(self, host: str) -> bool:
+        """
+        最近一次扫描显示SSH端口未开放时先提示，用户取消则返回True，不再等待10秒连接超时；
+        扫描可能因设备响应慢而误判，用户可选择继续连接
+        """
+        try:
+            state = DeviceInventory.shared().port_state(host, SSH_PORT)
+        except Exception:
+            return False
+        if state is not False:
+            return False
+        box = QMessageBox(QMessageBox.Icon.Warning, "SSH端口未开放",
+                          f"最近一次扫描显示 {host} 的SSH端口({SSH_PORT})未开放，设备可能不在线"
+                          f"（也可能是扫描时响应过慢）。\n是否仍然继续连接？", parent=self)
+        continue_btn = box.addButton("继续", QMessageBox.ButtonRole.AcceptRole)
+        box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        box.exec()
+        return box.clickedButton() is not continue_btn
+
     def on_test_ssh(self):
         is_valid, error_msg, host, username, password = self._validate_connection_params()
         if not is_valid:
             QMessageBox.warning(self, "参数错误", error_msg)
             return
+        if self._ssh_closed_by_scan(host):
+            self.status_label.setText("SSH端口未开放")
+            return
 
         self.countdown = 10
         self.ssh_test_finished = False  # 标志位
@@ -415,6 +483,87 @@ class LinuxTabWidget(BaseTabWidget):
         if self.replace_btn:
             self.replace_btn.setEnabled(True)
 
+    def _candidate_hosts(self):
+        """主机下拉框中的完整IP（含扫描到的SSH主机）"""
+        hosts = [self.host_ip.itemText(i) for i in range(self.host_ip.count())]
+        return [host for host in hosts if len(host.split('.')) == 4 and not host.endswith('.')]
+
+    def on_fleet_operation(self):
+        """打开批量操作对话框"""
+        username = self.username.text().strip()
+        password = self.password.text().strip()
+        if not username or not password:
+            QMessageBox.warning(self, "参数错误", "请填写用户名和密码！")
+            return
+        env = self.get_selected_env(self.env_group) if self.env_group else "QA"
+        dialog = FleetDialog(self.service, self._candidate_hosts(), username, password, env, self)
+        dialog.exec()
+
+    def on_replace_war_multi(self):
+        """同一个war包同时替换到多台POS"""
+        war_path = self.war_path.text()
+        is_valid, error_msg = self._validate_file_path(war_path, "kpos.war包")
+        if not is_valid:
+            QMessageBox.warning(self, "提示", error_msg)
+            return
+        username = self.username.text().strip()
+        password = self.password.text().strip()
+        if not username or not password:
+            QMessageBox.warning(self, "参数错误", "请填写用户名和密码！")
+            return
+
+        # 默认填入扫描到的SSH主机
+        text, ok = QInputDialog.getMultiLineText(self, "批量替换war包", "目标POS IP（每行一个）:",
+                                                 "\n".join(self._candidate_hosts()))
+        if not ok:
+            return
+        try:
+            hosts = parse_hosts(text)
+        except ValueError as e:
+            QMessageBox.warning(self, "参数错误", f"无效的IP地址: {e}")
+            return
+        if not hosts:
+            return
+        reply = QMessageBox.warning(
+            self, "确认批量换包",
+            f"将停止以下 {len(hosts)} 台POS服务并替换war包，确定继续吗？\n" + "\n".join(hosts),
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        self.replace_multi_btn.setEnabled(False)
+        host_percent = {host: 0 for host in hosts}
+        if self.parent_window:
+            self.parent_window.progress_bar.setVisible(True)
+            self.parent_window.progress_bar.setRange(0, 100)
+            self.parent_window.progress_bar.setValue(0)
+            self.parent_window.progress_bar.setFormat(f"正在向 {len(hosts)} 台POS换包：%p%，请勿进行其他操作！")
+
+        def on_host_progress(host, percent):
+            # 总进度取最慢的一台
+            host_percent[host] = percent
+            if self.parent_window:
+                self.parent_window.progress_bar.setValue(min(host_percent.values()))
+
+        def on_host_result(host, result):
+            # 失败的主机不再拖住总进度
+            on_host_progress(host, 100)
+
+        self.replace_multi_thread = ReplaceWarMultiThreadLinux(self.service, hosts, username, password, war_path)
+        self.replace_multi_thread.host_progress.connect(on_host_progress)
+        self.replace_multi_thread.host_result.connect(on_host_result)
+        self.replace_multi_thread.error_occurred.connect(lambda msg: QMessageBox.warning(self, "错误", msg))
+        self.replace_multi_thread.finished.connect(self.on_replace_multi_finished)
+        self.replace_multi_thread.start()
+
+    def on_replace_multi_finished(self):
+        """批量换包完成后处理"""
+        if self.parent_window:
+            self.parent_window.progress_bar.setVisible(False)
+        if self.replace_multi_btn:
+            self.replace_multi_btn.setEnabled(True)
+
     def on_restart_pos_linux(self):
         """重启Linux POS"""
 
@@ -617,12 +766,7 @@ class LinuxTabWidget(BaseTabWidget):
             return
 
         try:
-            import hashlib
-            md5_hash = hashlib.md5()
-            with open(war_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    md5_hash.update(chunk)
-            md5_value = md5_hash.hexdigest()
+            md5_value = file_md5(war_path)
             self.service.log(f"{war_path} 的MD5值: {md5_value}", level="info")
         except Exception as e:
             QMessageBox.warning(self, "错误", f"计算MD5值时出错：{str(e)}")
@@ -802,9 +946,9 @@ class LinuxTabWidget(BaseTabWidget):
             self.parent_window.speed_label.setVisible(bool(text))
 
     def on_pipeline_upgrade(self):
-        """一键升级流水线：多线程执行替换war包->修改文件->重启pos"""
+        """一键升级流水线：子线程中蓝绿部署war包并修改配置，停止POS后切换版本再启动"""
         reply = QMessageBox.question(
-            self, "确认操作", "确定要执行一键升级吗？\n此操作将依次替换远程war包、修改配置并重启POS！",
+            self, "确认操作", "确定要执行一键升级吗？\n此操作将替换远程war包、修改配置并重启POS！",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         if reply != QMessageBox.StandardButton.Yes:
@@ -836,6 +980,40 @@ class LinuxTabWidget(BaseTabWidget):
         else:
             QMessageBox.critical(self, "升级失败", msg)
 
+    def on_rollback_war(self):
+        """回滚到一键升级前的版本"""
+
+        def rollback_callback(host, username, password):
+            reply = QMessageBox.question(
+                self, "确认操作", "确定要回滚到上一版本吗？\n此操作将停止POS、切换版本并重新启动POS！",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            self.rollback_btn.setEnabled(False)
+            self.parent_window.progress_bar.setVisible(True)
+            self.parent_window.progress_bar.setRange(0, 100)
+            self.parent_window.progress_bar.setValue(0)
+            self.rollback_thread = RollbackWarThreadLinux(self.service, host, username, password)
+            self.rollback_thread.progress_updated.connect(self.parent_window.progress_bar.setValue)
+            self.rollback_thread.progress_text_updated.connect(self.set_progress_text)
+            self.rollback_thread.finished.connect(self.on_rollback_finished)
+            self.rollback_thread.start()
+
+        if not self.parent_window:
+            QMessageBox.warning(self, "错误", "父窗口未初始化")
+            return
+
+        self._execute_with_connection_validation("回滚上一版本", rollback_callback)
+
+    def on_rollback_finished(self, success, msg):
+        self.rollback_btn.setEnabled(True)
+        self.parent_window.progress_bar.setVisible(False)
+        if success:
+            QMessageBox.information(self, "回滚成功", "已回滚到上一版本")
+        else:
+            QMessageBox.critical(self, "回滚失败", msg)
+
     def on_pipeline_package_upgrade(self):
         """一键升级包升级：选择远程升级包目录，将self.war_path指定的war包上传到该目录，执行升级、修改配置、重启POS（全部在子线程完成）"""
         host = self.host_ip.currentText()
@@ -0,0 +1,107 @@
+"""
+流水线阶段调度：按依赖关系执行各阶段，依赖全部完成的阶段立即开始，互不依赖的阶段并行执行。
+
+一键升级据此把上传、准备配置等不需要停服的阶段放在停止POS之前与其并行完成，
+停止POS只在替换前进行，并分别统计总耗时和POS停机时间。
+"""
+import concurrent.futures
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class PipelineStage:
+    """流水线中的一个阶段：func无参数，阶段间的数据通过调用方的闭包传递"""
+
+    def __init__(self, name: str, label: str, func: Callable[[], None], deps: Iterable[str] = ()):
+        self.name = name
+        self.label = label
+        self.func = func
+        self.deps = tuple(deps)
+
+
+class PipelineScheduler:
+    """
+    用法:
+        scheduler = PipelineScheduler([PipelineStage("upload", "上传", upload),
+                                       PipelineStage("stop", "停止POS", stop, deps=["upload"]), ...])
+        scheduler.run()
+        scheduler.span("stop", "start")  # 停机时间
+    """
+
+    def __init__(self, stages: List[PipelineStage], on_stage_start: Optional[Callable] = None,
+                 on_stage_done: Optional[Callable] = None):
+        """
+        Args:
+            on_stage_start: 阶段开始回调，参数为阶段
+            on_stage_done: 阶段完成回调，参数为(阶段, 耗时秒数)
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("流水线阶段名称重复")
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 依赖不存在的阶段: {', '.join(missing)}")
+        self._check_acyclic()
+        self.on_stage_start = on_stage_start
+        self.on_stage_done = on_stage_done
+        self.timings: Dict[str, Tuple[float, float]] = {}  # 阶段 -> (开始, 结束)，相对流水线开始的秒数
+        self.wall_time = 0.0
+
+    def _check_acyclic(self):
+        remaining = {name: set(stage.deps) for name, stage in self.stages.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"流水线阶段存在循环依赖: {', '.join(sorted(remaining))}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def run(self) -> Dict[str, Tuple[float, float]]:
+        """执行全部阶段；某阶段出错时不再启动新阶段，等正在执行的阶段结束后抛出该错误"""
+        start = time.monotonic()
+        done = set()
+        error = None
+        futures = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.stages) or 1,
+                                                   thread_name_prefix="pipeline") as executor:
+            while True:
+                if error is None:
+                    for name, stage in self.stages.items():
+                        if name not in done and name not in futures.values() and set(stage.deps) <= done:
+                            futures[executor.submit(self._run_stage, stage, start)] = name
+                if not futures:
+                    break
+                finished, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    try:
+                        future.result()
+                        done.add(name)
+                    except Exception as e:
+                        error = error or e
+        self.wall_time = time.monotonic() - start
+        if error is not None:
+            raise error
+        return self.timings
+
+    def _run_stage(self, stage, start):
+        if self.on_stage_start:
+            self.on_stage_start(stage)
+        begin = time.monotonic() - start
+        try:
+            stage.func()
+        finally:
+            end = time.monotonic() - start
+            self.timings[stage.name] = (begin, end)
+        if self.on_stage_done:
+            self.on_stage_done(stage, end - begin)
+
+    def span(self, first: str, last: str) -> float:
+        """从first阶段开始到last阶段结束的秒数（如停止POS到启动POS完成即停机时间）"""
+        if first not in self.timings:
+            return 0.0
+        end = self.timings[last][1] if last in self.timings else self.timings[first][1]
+        return end - self.timings[first][0]
@@ -0,0 +1,142 @@
+"""
+SFTP上传基准测试：对本机SSH服务替身（FakeSshServer）比较旧的逐块同步写、paramiko的sftp.put和流水线传输引擎。
+
+用法:
+    python -m pos_tool_new.linux_pos.sftp_benchmark --size 64 --rtt 0 5 20
+    python -m pos_tool_new.linux_pos.sftp_benchmark --size 217 --rtt 30 --bandwidth 8 --methods sync pipelined
+    python -m pos_tool_new.linux_pos.sftp_benchmark --size 64 --rtt 10 --bandwidth 4 --fanout 8
+
+--fanout N 模拟N台POS，比较逐台上传（upload_and_verify）与广播上传（war_broadcast）的总耗时。
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from pos_tool_new.linux_pos.fake_ssh_server import FakeSshServer
+from pos_tool_new.linux_pos.sftp_transfer import upload_and_verify, upload_file
+from pos_tool_new.linux_pos.war_broadcast import broadcast_upload
+from pos_tool_new.linux_pos.ssh_session_pool import SshSessionPool
+
+PASSWORD = "benchmark"
+
+
+def upload_sync(sftp, local_path, remote_path):
+    """改造前_upload_file_with_progress的写法：256KB一块，每个写请求等待服务端确认"""
+    with open(local_path, 'rb') as local_file, sftp.file(remote_path, 'wb') as remote_file:
+        while chunk := local_file.read(256 * 1024):
+            remote_file.write(chunk)
+
+
+def upload_put(sftp, local_path, remote_path):
+    sftp.put(local_path, remote_path)
+
+
+def upload_pipelined(sftp, local_path, remote_path):
+    upload_file(sftp, local_path, remote_path)
+
+
+METHODS = {"sync": upload_sync, "put": upload_put, "pipelined": upload_pipelined}
+
+
+def _md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def run(size_mb, rtts, bandwidth_mb, methods, rounds):
+    with tempfile.TemporaryDirectory() as workdir:
+        local_path = os.path.join(workdir, "kpos.war")
+        with open(local_path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        local_md5 = _md5(local_path)
+        remote_path = os.path.join(workdir, "remote.war")
+        bandwidth = bandwidth_mb * 1024 * 1024 if bandwidth_mb else None
+        print(f"文件 {size_mb} MB，上行带宽 {f'{bandwidth_mb} MB/s' if bandwidth_mb else '不限'}")
+        for rtt_ms in rtts:
+            with FakeSshServer(password=PASSWORD, rtt=rtt_ms / 1000, bandwidth=bandwidth) as server:
+                pool = SshSessionPool()
+                try:
+                    for method in methods:
+                        timings = []
+                        for _ in range(rounds):
+                            with pool.acquire(server.host, "menu", PASSWORD, port=server.port) as ssh:
+                                with ssh.open_sftp() as sftp:
+                                    start = time.perf_counter()
+                                    METHODS[method](sftp, local_path, remote_path)
+                                    timings.append(time.perf_counter() - start)
+                            if _md5(remote_path) != local_md5:
+                                print(f"[{method}] 远程文件校验失败")
+                                return 1
+                            os.remove(remote_path)
+                        best = min(timings)
+                        print(f"RTT {rtt_ms:>5.1f}ms [{method:>9}] 最快 {best:.2f}s, {size_mb / best:.1f} MB/s "
+                              f"(共 {rounds} 轮, 平均 {sum(timings) / len(timings):.2f}s)")
+                finally:
+                    pool.close_all()
+    return 0
+
+
+def run_fanout(size_mb, hosts, rtt_ms, bandwidth_mb):
+    """N个SSH服务替身（各自一个目录）模拟一家门店的多台POS"""
+    with tempfile.TemporaryDirectory() as workdir:
+        local_path = os.path.join(workdir, "kpos.war")
+        with open(local_path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        local_md5 = _md5(local_path)
+        roots = [tempfile.mkdtemp(dir=workdir) for _ in range(hosts)]
+        bandwidth = bandwidth_mb * 1024 * 1024 if bandwidth_mb else None
+        servers = [FakeSshServer(password=PASSWORD, rtt=rtt_ms / 1000, bandwidth=bandwidth, root=root).start()
+                   for root in roots]
+        pool = SshSessionPool()
+        try:
+            sessions = {f"pos{i + 1}": pool.acquire(server.host, "menu", PASSWORD, port=server.port)
+                        for i, server in enumerate(servers)}
+            print(f"文件 {size_mb} MB，{hosts} 台主机，RTT {rtt_ms}ms，"
+                  f"每台上行带宽 {f'{bandwidth_mb} MB/s' if bandwidth_mb else '不限'}")
+            start = time.perf_counter()
+            for ssh in sessions.values():
+                upload_and_verify(ssh, local_path, "sequential.war")
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            results = broadcast_upload(sessions, local_path, "broadcast.war")
+            broadcast = time.perf_counter() - start
+            for ssh in sessions.values():
+                ssh.close()
+        finally:
+            pool.close_all()
+            for server in servers:
+                server.stop()
+        failed = [host for host, result in results.items() if not result["success"]]
+        if failed or any(_md5(os.path.join(root, name)) != local_md5
+                         for root in roots for name in ("sequential.war", "broadcast.war")):
+            print(f"远程文件校验失败: {failed}")
+            return 1
+        print(f"[逐台上传] {sequential:.2f}s")
+        print(f"[广播上传] {broadcast:.2f}s，本地文件读取1次（逐台上传为{hosts}次），提速 {sequential / broadcast:.1f} 倍")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SFTP上传基准测试（本机SSH服务替身）")
+    parser.add_argument("--size", type=int, default=64, help="测试文件大小（MB）")
+    parser.add_argument("--rtt", type=float, nargs="+", default=[0, 5, 20], help="注入的往返延迟（毫秒）")
+    parser.add_argument("--bandwidth", type=float, help="上行带宽上限（MB/s），不填为不限速")
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--fanout", type=int, help="模拟的POS台数，比较逐台上传与广播上传（只用第一个--rtt）")
+    args = parser.parse_args(argv)
+    if args.fanout:
+        return run_fanout(args.size, args.fanout, args.rtt[0], args.bandwidth)
+    return run(args.size, args.rtt, args.bandwidth, args.methods, args.rounds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
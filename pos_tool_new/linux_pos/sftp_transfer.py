@@ -0,0 +1,280 @@
+"""
+SFTP传输引擎：WAR包、升级包上传统一走这里。
+
+- 写请求流水线发送（set_pipelined），不再每32KB等一次服务端确认，吞吐不再受往返延迟限制；
+- 本地文件由后台线程预读，读盘与网络发送重叠进行；
+- SFTP通道使用更大的接收窗口，下载日志等反方向传输同样受益；
+- 预读线程边读边算MD5，写完后只需一次远程md5sum即可校验整个文件，不必再读一遍本地文件；
+- 断点续传：先写到.part暂存文件，连接中断后重连，核对远程已有部分的大小和MD5后从断点继续，
+  整个文件校验一致后才重命名到目标路径，目标路径上的旧文件在此之前一直完好。
+"""
+import hashlib
+import os
+import queue
+import shlex
+import socket
+import threading
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+import paramiko
+
+# SFTP通道的接收窗口和最大包大小（默认2MB/32KB），影响服务端向本机发送数据的速度
+SFTP_WINDOW_SIZE = 2 ** 24
+SFTP_MAX_PACKET_SIZE = 2 ** 15
+# 单个SFTP写请求的大小，协议要求服务端至少支持32KB
+SFTP_REQUEST_SIZE = 2 ** 15
+
+READ_CHUNK_SIZE = 1024 * 1024
+READ_AHEAD_CHUNKS = 8
+SPEED_INTERVAL = 0.5
+
+# 断点续传：暂存文件后缀、中断后重试次数和间隔（秒）
+PART_SUFFIX = ".part"
+RESUME_RETRIES = 5
+RESUME_DELAY = 3
+# SFTP通道超过该秒数收不到服务端数据视为连接已断（Wi-Fi断开时TCP不会立即报错）
+STALL_TIMEOUT = 60
+
+
+def open_sftp(transport: paramiko.Transport) -> paramiko.SFTPClient:
+    """在已认证的连接上打开使用调优窗口的SFTP会话"""
+    return paramiko.SFTPClient.from_transport(transport, window_size=SFTP_WINDOW_SIZE,
+                                              max_packet_size=SFTP_MAX_PACKET_SIZE)
+
+
+# 本地文件MD5缓存 {(路径, 大小, 修改时间): md5}，上传时顺带算出的MD5供"查询本地包MD5"直接使用
+_md5_cache = {}
+_md5_cache_lock = threading.Lock()
+
+
+def _file_key(local_path: str) -> Tuple[str, int, int]:
+    stat = os.stat(local_path)
+    return os.path.abspath(local_path), stat.st_size, stat.st_mtime_ns
+
+
+def _cache_md5(key: Tuple[str, int, int], md5: str) -> None:
+    with _md5_cache_lock:
+        _md5_cache[key] = md5
+
+
+def read_chunks(local_path: str, chunk_size: int = READ_CHUNK_SIZE, read_ahead: int = READ_AHEAD_CHUNKS,
+                offset: int = 0, digest=None) -> Iterator[bytes]:
+    """
+    后台线程预读本地文件，按块产出；最多预读read_ahead块，调用方提前结束时读线程随之退出
+
+    Args:
+        digest: hashlib对象，在预读线程中用读到的数据更新，与网络发送并行
+    """
+    chunks = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def reader():
+        try:
+            with open(local_path, 'rb') as f:
+                f.seek(offset)
+                while not stop.is_set():
+                    chunk = f.read(chunk_size)
+                    if digest is not None:
+                        digest.update(chunk)
+                    put(chunk)  # 读到空块表示文件结束
+                    if not chunk:
+                        return
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=reader, name="sftp-read-ahead", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class TransferProgress:
+    """把已传输字节数换算成进度区间内的百分比和"上传速率"文本，只在数值变化时回调"""
+
+    def __init__(self, total: int, progress_callback: Optional[Callable] = None,
+                 speed_callback: Optional[Callable] = None, progress_range: Tuple[int, int] = (0, 100),
+                 start: int = 0):
+        self.total = total
+        self.progress_callback = progress_callback
+        self.speed_callback = speed_callback
+        self.low, self.high = progress_range
+        self.done = start
+        self._last_percent = None
+        self._last_time = time.monotonic()
+        self._last_done = start
+
+    def update(self, done: int) -> None:
+        self.done = done
+        if self.progress_callback:
+            percent = self.high if not self.total else min(
+                self.low + int(done / self.total * (self.high - self.low)), self.high)
+            if percent != self._last_percent:
+                self._last_percent = percent
+                self.progress_callback(percent)
+        now = time.monotonic()
+        if self.speed_callback and now - self._last_time >= SPEED_INTERVAL:
+            speed = (done - self._last_done) / (now - self._last_time)
+            self.speed_callback(f"上传速率：{speed / 1024 / 1024:.2f} MB/s")
+            self._last_time, self._last_done = now, done
+
+
+def file_md5(local_path: str) -> str:
+    """本地文件的MD5，文件上传过且之后未改动时直接返回上传时算出的值"""
+    key = _file_key(local_path)
+    with _md5_cache_lock:
+        if key in _md5_cache:
+            return _md5_cache[key]
+    digest = hashlib.md5()
+    for _ in read_chunks(local_path, digest=digest):
+        pass
+    _cache_md5(key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def remote_md5(ssh, remote_path: str, timeout: int = 300) -> Optional[str]:
+    """远程文件的MD5，文件不存在或命令失败时返回None"""
+    _, stdout, _ = ssh.exec_command(f"md5sum -- {shlex.quote(remote_path)}", timeout=timeout)
+    out = stdout.read().decode(errors="replace").split()
+    if stdout.channel.recv_exit_status() != 0 or not out:
+        return None
+    return out[0]
+
+
+def remote_prefix_md5(ssh, remote_path: str, length: int, timeout: int = 300) -> Optional[str]:
+    """远程文件前length字节的MD5，命令失败时返回None"""
+    _, stdout, _ = ssh.exec_command(f"head -c {int(length)} -- {shlex.quote(remote_path)} | md5sum",
+                                    timeout=timeout)
+    out = stdout.read().decode(errors="replace").split()
+    if stdout.channel.recv_exit_status() != 0 or not out:
+        return None
+    return out[0]
+
+
+def _local_prefix_digest(local_path: str, length: int):
+    digest = hashlib.md5()
+    with open(local_path, 'rb') as f:
+        while length > 0:
+            chunk = f.read(min(length, READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            digest.update(chunk)
+            length -= len(chunk)
+    return digest
+
+
+def resume_point(ssh, sftp: paramiko.SFTPClient, local_path: str, part_path: str) -> Tuple[int, object]:
+    """
+    核对远程暂存文件，返回 (续传起点, 已覆盖起点之前数据的hashlib对象)
+
+    暂存文件不存在、比本地文件大或前缀MD5与本地不一致时从0开始。
+    """
+    try:
+        size = sftp.stat(part_path).st_size or 0
+    except IOError:
+        return 0, hashlib.md5()
+    if not 0 < size <= os.path.getsize(local_path):
+        return 0, hashlib.md5()
+    digest = _local_prefix_digest(local_path, size)
+    if remote_prefix_md5(ssh, part_path, size) != digest.hexdigest():
+        return 0, hashlib.md5()
+    return size, digest
+
+
+def upload_file(sftp: paramiko.SFTPClient, local_path: str, remote_path: str,
+                progress_callback: Optional[Callable] = None, speed_callback: Optional[Callable] = None,
+                progress_range: Tuple[int, int] = (0, 100), offset: int = 0, digest=None) -> str:
+    """
+    流水线上传本地文件，返回上传数据的MD5
+
+    写请求连续发出，关闭远程文件时统一等待全部确认，服务端报错（如磁盘已满）在此抛出。
+
+    Args:
+        offset: 从该位置续传，远程文件已有offset之前的数据
+        digest: 已用offset之前的数据更新过的hashlib对象，续传时用于得到整个文件的MD5
+    """
+    key = _file_key(local_path)
+    progress = TransferProgress(key[1], progress_callback, speed_callback, progress_range, offset)
+    digest = hashlib.md5() if digest is None else digest
+    uploaded = offset
+    with sftp.file(remote_path, 'r+b' if offset else 'wb') as remote_file:
+        remote_file.seek(offset)
+        remote_file.set_pipelined(True)
+        remote_file.MAX_REQUEST_SIZE = SFTP_REQUEST_SIZE
+        for chunk in read_chunks(local_path, offset=offset, digest=digest):
+            remote_file.write(chunk)
+            uploaded += len(chunk)
+            progress.update(uploaded)
+    progress.update(uploaded)
+    _cache_md5(key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def commit_part(ssh, part_path: str, remote_path: str, md5: str) -> None:
+    """远程暂存文件MD5与md5一致时重命名为remote_path，否则删除暂存文件并抛出IOError"""
+    actual = remote_md5(ssh, part_path)
+    if actual != md5:
+        ssh.exec_command(f"rm -f -- {shlex.quote(part_path)}")[1].channel.recv_exit_status()
+        raise IOError(f"上传校验失败: 本地MD5 {md5}, 远程MD5 {actual or '无法获取'}")
+    _, stdout, stderr = ssh.exec_command(f"mv -f -- {shlex.quote(part_path)} {shlex.quote(remote_path)}")
+    if stdout.channel.recv_exit_status() != 0:
+        raise IOError(f"重命名 {part_path} 失败: {stderr.read().decode(errors='replace').strip()}")
+
+
+def connection_lost(ssh, error: Exception) -> bool:
+    """区分连接中断与服务端返回的错误（权限不足、磁盘已满等，重试无用）"""
+    if isinstance(error, (EOFError, paramiko.SSHException, socket.timeout)):
+        return True
+    transport = ssh.get_transport()
+    return not (transport and transport.is_active())
+
+
+def upload_and_verify(ssh, local_path: str, remote_path: str, progress_callback: Optional[Callable] = None,
+                      speed_callback: Optional[Callable] = None, progress_range: Tuple[int, int] = (0, 100),
+                      log_callback: Optional[Callable] = None, retries: int = RESUME_RETRIES) -> str:
+    """
+    断点续传上传并用一次远程md5sum校验，返回MD5；不一致时抛出IOError
+
+    数据先写到remote_path.part，校验一致后重命名为remote_path。连接中断时，
+    ssh为连接池租约（有reconnect方法）则重连后从已校验的位置继续，最多重试retries次。
+
+    Args:
+        log_callback: 续传、重连等提示的回调，参数为(消息, 级别)
+    """
+    part_path = remote_path + PART_SUFFIX
+    log = log_callback or (lambda message, level="info": None)
+    reconnect = getattr(ssh, "reconnect", None)
+    for attempt in range(retries + 1):
+        try:
+            if attempt:
+                ssh = reconnect()
+            with ssh.open_sftp() as sftp:
+                sftp.get_channel().settimeout(STALL_TIMEOUT)
+                offset, digest = resume_point(ssh, sftp, local_path, part_path)
+                if offset:
+                    log(f"从 {offset / 1024 / 1024:.1f} MB 处继续上传", "info")
+                md5 = upload_file(sftp, local_path, part_path, progress_callback, speed_callback, progress_range,
+                                  offset, digest)
+            commit_part(ssh, part_path, remote_path, md5)
+            return md5
+        except (OSError, EOFError, paramiko.SSHException) as e:
+            if reconnect is None or attempt == retries or not connection_lost(ssh, e):
+                raise
+            log(f"上传中断（{str(e) or type(e).__name__}），{RESUME_DELAY} 秒后重连续传（{attempt + 1}/{retries}）",
+                "warning")
+            time.sleep(RESUME_DELAY)
@@ -0,0 +1,307 @@
+import atexit
+import logging
+import socket
+import threading
+import time
+import weakref
+
+import paramiko
+
+from pos_tool_new.linux_pos.sftp_transfer import open_sftp
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    """同一主机+用户的已认证SSH连接，可同时被多个租约复用（每次exec_command各开一个通道）"""
+
+    def __init__(self, key):
+        self.key = key
+        self.lock = threading.Lock()  # 建立/重建连接时持有
+        self.client = None
+        self.password = None
+        self.leases = 0
+        self.idle_sftp = []   # 归还的SFTP客户端，下次租用直接复用
+        self.retired = []     # 被替换但仍有租约在用的旧连接，租约全部归还后关闭
+        self.last_used = time.monotonic()
+
+    def is_active(self):
+        transport = self.client.get_transport() if self.client else None
+        return bool(transport and transport.is_active())
+
+    def close_idle(self):
+        for sftp in self.idle_sftp:
+            _quiet_close(sftp)
+        self.idle_sftp = []
+        for client in self.retired:
+            _quiet_close(client)
+        self.retired = []
+
+    def close(self):
+        self.close_idle()
+        if self.client:
+            _quiet_close(self.client)
+            self.client = None
+
+
+def _quiet_close(obj):
+    try:
+        obj.close()
+    except Exception:
+        pass
+
+
+class _PooledSftp:
+    """租约内共享的SFTP客户端，close()/退出with时不关闭，随租约一起归还"""
+
+    def __init__(self, sftp):
+        self._sftp = sftp
+
+    def __getattr__(self, name):
+        return getattr(self._sftp, name)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class PooledSSHClient:
+    """
+    从连接池租用的SSH连接，用法与paramiko.SSHClient相同。
+    close()或退出with时把连接归还连接池而不断开，对象被回收时也会自动归还。
+    """
+
+    def __init__(self, pool, session, client):
+        self._pool = pool
+        self._session = session
+        self._client = client
+        self._state = {"sftp": None}
+        self._finalizer = weakref.finalize(self, pool._release, session, client, self._state)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def open_sftp(self):
+        """返回本次租约的SFTP客户端，连接上已有空闲的SFTP会话时直接复用"""
+        if self._state["sftp"] is None:
+            self._state["sftp"] = self._pool._checkout_sftp(self._session, self._client)
+        return _PooledSftp(self._state["sftp"])
+
+    def reconnect(self):
+        """当前连接不可用时改用新建立的连接（上传中断后续传），租约不变，返回自身"""
+        self._pool._reconnect(self)
+        return self
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SshSessionPool:
+    """
+    SSH连接池：按(主机, 端口, 用户)保存已认证的连接并开启keepalive，
+    多步操作（上传、执行脚本、改配置、重启）复用同一连接，省去每步一次的握手和密码认证。
+    空闲超过idle_timeout的连接由后台线程关闭。
+    """
+
+    KEEPALIVE_INTERVAL = 30
+    IDLE_TIMEOUT = 300
+    # 空闲超过该秒数的连接复用前先开一个通道确认可用，避免拿到网络已断但未察觉的连接
+    VALIDATE_AFTER = 15
+    REAP_INTERVAL = 30
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """进程内共享的连接池，退出时关闭所有连接"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                atexit.register(cls._shared.close_all)
+            return cls._shared
+
+    def __init__(self, idle_timeout=None, keepalive=None, connect_timeout=10):
+        self.idle_timeout = self.IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.keepalive = self.KEEPALIVE_INTERVAL if keepalive is None else keepalive
+        self.connect_timeout = connect_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = None
+
+    def acquire(self, host, username, password, port=22):
+        """租用一个到host的已认证连接，没有可用连接时新建"""
+        key = (host, port, username)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = _Session(key)
+            # 先占用，防止建立连接期间被回收
+            session.leases += 1
+            self._ensure_reaper()
+        try:
+            with session.lock:
+                if not self._usable(session, password):
+                    self._replace(session, self._connect(host, port, username, password), password)
+                else:
+                    logger.debug(f"复用SSH连接 {username}@{host}")
+                client = session.client
+        except Exception:
+            self._release(session, None, {"sftp": None})
+            raise
+        return PooledSSHClient(self, session, client)
+
+    def _reconnect(self, lease):
+        session = lease._session
+        with self._lock:
+            session.leases += 1
+        try:
+            with session.lock:
+                # 其他租约已经换过连接时直接改用，否则确认当前连接确实不可用再重建
+                if session.client is lease._client and not self._probe(session):
+                    host, port, username = session.key
+                    self._replace(session, self._connect(host, port, username, session.password), session.password)
+                    logger.debug(f"重建SSH连接 {username}@{host}")
+                client = session.client
+        except Exception:
+            self._release(session, None, {"sftp": None})
+            raise
+        # 中断的SFTP会话可能还有未完成的请求，不放回连接池
+        if lease._state["sftp"] is not None:
+            _quiet_close(lease._state["sftp"])
+        lease._finalizer()
+        lease._client = client
+        lease._state = {"sftp": None}
+        lease._finalizer = weakref.finalize(lease, self._release, session, client, lease._state)
+
+    def _connect(self, host, port, username, password):
+        # paramiko不设置TCP_NODELAY，小请求（命令、SFTP状态）会被Nagle与延迟确认拖慢约40ms
+        sock = socket.create_connection((host, port), timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(host, port=port, username=username, password=password, timeout=self.connect_timeout,
+                           banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout, sock=sock)
+        except Exception:
+            sock.close()
+            raise
+        client.get_transport().set_keepalive(self.keepalive)
+        logger.debug(f"新建SSH连接 {username}@{host}:{port}")
+        return client
+
+    def _usable(self, session, password):
+        if session.password != password or not session.is_active():
+            return False
+        if time.monotonic() - session.last_used < self.VALIDATE_AFTER:
+            return True
+        return self._probe(session)
+
+    @staticmethod
+    def _probe(session):
+        if not session.is_active():
+            return False
+        try:
+            session.client.get_transport().open_session(timeout=5).close()
+            return True
+        except Exception:
+            return False
+
+    def _replace(self, session, client, password):
+        # 调用方持有session.lock
+        with self._lock:
+            for sftp in session.idle_sftp:
+                _quiet_close(sftp)
+            session.idle_sftp = []
+            if session.client:
+                if session.leases > 1:
+                    session.retired.append(session.client)
+                else:
+                    _quiet_close(session.client)
+            session.client, session.password = client, password
+            session.last_used = time.monotonic()
+
+    def _checkout_sftp(self, session, client):
+        with self._lock:
+            while session.idle_sftp and session.client is client:
+                sftp = session.idle_sftp.pop()
+                if not sftp.get_channel().closed:
+                    return sftp
+                _quiet_close(sftp)
+        return open_sftp(client.get_transport())
+
+    def _release(self, session, client, state):
+        sftp = state["sftp"]
+        with self._lock:
+            session.leases -= 1
+            session.last_used = time.monotonic()
+            if sftp is not None:
+                # 只保留当前连接上仍可用的SFTP会话
+                if client is session.client and session.is_active() and not sftp.get_channel().closed:
+                    session.idle_sftp.append(sftp)
+                else:
+                    _quiet_close(sftp)
+            if session.leases == 0 and session.retired:
+                for old in session.retired:
+                    _quiet_close(old)
+                session.retired = []
+
+    def _ensure_reaper(self):
+        # 调用方持有self._lock
+        if self._reaper is None or not self._reaper.is_alive():
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.REAP_INTERVAL):
+            self.evict_idle()
+
+    def abort(self, host, username, port=22):
+        """强制断开到host的连接，正在该连接上执行的命令和传输立即出错返回（用于超时取消）"""
+        with self._lock:
+            session = self._sessions.get((host, port, username))
+            clients = [session.client] + session.retired if session else []
+        for client in clients:
+            if client is not None:
+                _quiet_close(client)
+        return bool(session)
+
+    def evict_idle(self, max_idle=None):
+        """关闭空闲超过max_idle秒（默认idle_timeout）且无人使用的连接"""
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, session in self._sessions.items()
+                       if session.leases == 0 and (now - session.last_used >= max_idle or not session.is_active())]
+            sessions = [self._sessions.pop(key) for key in expired]
+        for session in sessions:
+            session.close()
+            logger.debug(f"关闭空闲SSH连接 {session.key[2]}@{session.key[0]}")
+        return len(sessions)
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            return {f"{username}@{host}:{port}": {"leases": session.leases, "active": session.is_active(),
+                                                  "idle_sftp": len(session.idle_sftp)}
+                    for (host, port, username), session in self._sessions.items()}
@@ -0,0 +1,88 @@
+"""
+蓝绿部署：新war包先完整解压到暂存目录（旧版本照常运行），改好配置后再在短暂的停止/启动之间用mv切换目录，
+停机时间只包含几次rename，与war包大小无关。
+
+暂存目录和上一版本目录都放在webapps之外（tomcat会把webapps下的每个目录当作一个应用部署），
+与webapps在同一文件系统上，mv只是rename。切换时线上版本移到上一版本路径保留，回滚时两者互换。
+"""
+import posixpath
+import shlex
+from typing import List, Optional, Tuple
+
+
+def extract(ssh, remote_war: str, staging_dir: str, timeout: int = 600) -> Tuple[str, int]:
+    """
+    清空暂存目录后把war包全量解压进去（-DD使Tomcat能察觉文件更新）
+
+    Returns:
+        (unzip的stderr, 退出码)
+    """
+    quoted_dir = shlex.quote(staging_dir)
+    _, stdout, stderr = ssh.exec_command(
+        f"rm -rf {quoted_dir} && mkdir -p {quoted_dir} && "
+        f"unzip -o -DD -q {shlex.quote(remote_war)} -d {quoted_dir}", timeout=timeout)
+    stdout.read()
+    err = stderr.read().decode(errors="replace").strip()
+    return err, stdout.channel.recv_exit_status()
+
+
+def swap_in(ssh, items: List[Tuple[str, str, Optional[str]]], trash_dir: str, timeout: int = 60) -> None:
+    """
+    用暂存的新版本替换线上版本，出错时抛出IOError
+
+    被替换掉的旧目录先改名到trash_dir，命令返回后再在后台删除，切换本身只有rename，耗时与目录大小无关。
+
+    Args:
+        items: [(暂存路径, 线上路径, 上一版本路径)]，按顺序切换；上一版本路径为None时旧版本切换后删除。
+               某一项切换失败时该项恢复原状并停止，之前的项保持已切换
+        trash_dir: 待删除目录的存放位置，必须在webapps之外（否则POS启动时可能把删除到一半的目录部署成应用），
+                   且与线上路径在同一文件系统上
+    """
+    commands, discarded = [], []
+    for staged, live, prev in items:
+        # 同一路径上一次的后台删除可能尚未结束，用shell的PID区分
+        trash = f"{shlex.quote(posixpath.join(trash_dir, posixpath.basename(prev or live) + '.old'))}.$$"
+        staged, live = shlex.quote(staged), shlex.quote(live)
+        if prev:
+            prev = shlex.quote(prev)
+            commands.append(f"{{ [ ! -e {prev} ] || mv -f {prev} {trash}; }} && "
+                            f"{{ [ ! -e {live} ] || mv -f {live} {prev}; }} && "
+                            f"{{ mv -f {staged} {live} || {{ [ ! -e {prev} ] || mv -f {prev} {live}; "
+                            f"[ ! -e {trash} ] || mv -f {trash} {prev}; exit 1; }}; }}")
+        else:
+            commands.append(f"{{ [ ! -e {live} ] || mv -f {live} {trash}; }} && "
+                            f"{{ mv -f {staged} {live} || {{ [ ! -e {trash} ] || mv -f {trash} {live}; exit 1; }}; }}")
+        discarded.append(trash)
+    command = " && ".join(commands) + f" && {{ nohup rm -rf {' '.join(discarded)} >/dev/null 2>&1 & }}"
+    _, stdout, stderr = ssh.exec_command(command, timeout=timeout)
+    err = stderr.read().decode(errors="replace").strip()
+    if stdout.channel.recv_exit_status() != 0:
+        raise IOError(f"切换版本失败: {err}")
+
+
+def has_previous(ssh, prev_dir: str) -> bool:
+    """POS上是否保留了可回滚的上一版本"""
+    _, stdout, _ = ssh.exec_command(f"[ -d {shlex.quote(prev_dir)} ]", timeout=30)
+    return stdout.channel.recv_exit_status() == 0
+
+
+def exchange(ssh, items: List[Tuple[str, str, bool]], timeout: int = 60) -> None:
+    """
+    线上版本与上一版本互换（回滚；再次执行即恢复），出错时抛出IOError
+
+    Args:
+        items: [(线上路径, 上一版本路径, 没有上一版本时是否删除线上路径)]，
+               如部署清单描述的是线上目录，没有对应的上一版本清单时应删除，下次部署全量解压
+    """
+    commands = []
+    for live, prev, remove_without_prev in items:
+        swap = f"{live}.swap"
+        live, prev, swap = shlex.quote(live), shlex.quote(prev), shlex.quote(swap)
+        otherwise = f"rm -rf {live}" if remove_without_prev else "true"
+        commands.append(f"if [ -e {prev} ]; then rm -rf {swap} && {{ [ ! -e {live} ] || mv -f {live} {swap}; }} && "
+                        f"mv -f {prev} {live} && {{ [ ! -e {swap} ] || mv -f {swap} {prev}; }}; "
+                        f"else {otherwise}; fi")
+    _, stdout, stderr = ssh.exec_command(" && ".join(commands), timeout=timeout)
+    err = stderr.read().decode(errors="replace").strip()
+    if stdout.channel.recv_exit_status() != 0:
+        raise IOError(f"回滚失败: {err}")
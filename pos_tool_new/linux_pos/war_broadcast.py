@@ -0,0 +1,131 @@
+"""
+同一个WAR包同时上传到多台POS：本地文件只读一遍，读到的数据块分发到每台主机的有界队列，
+各主机的写入线程在自己的SFTP通道上并行流水线写入，总耗时取决于最慢的一条链路而不是所有链路之和。
+
+队列满时读盘暂停等待（背压），内存占用不超过 主机数 × QUEUE_CHUNKS × 块大小。
+某台主机连接中断时脱离广播，由该主机的线程改用断点续传（sftp_transfer.upload_and_verify）单独补传，不拖住其他主机。
+"""
+import functools
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import paramiko
+
+from pos_tool_new.linux_pos.sftp_transfer import PART_SUFFIX, SFTP_REQUEST_SIZE, STALL_TIMEOUT, TransferProgress, \
+    commit_part, connection_lost, read_chunks, upload_and_verify
+
+QUEUE_CHUNKS = 8
+
+
+class _HostUpload:
+    """单台主机的写入线程：从队列取数据块写入暂存文件，收到整个文件的MD5后校验并重命名"""
+
+    def __init__(self, host: str, ssh, local_path: str, remote_path: str,
+                 progress_callback: Optional[Callable] = None, log: Optional[Callable] = None):
+        self.host = host
+        self.ssh = ssh
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.progress_callback = progress_callback
+        self.log = log
+        self.queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.detached = threading.Event()  # 不再接收广播数据（已完成、出错或改为单独补传）
+        self.result = {"success": False, "md5": None, "error": "", "seconds": 0.0, "resumed": False}
+        self.thread = threading.Thread(target=self._run, name=f"war-broadcast-{host}", daemon=True)
+
+    def feed(self, item) -> None:
+        """把数据块交给写入线程，队列满时等待；主机已脱离广播时直接丢弃"""
+        while not self.detached.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        start = time.monotonic()
+        try:
+            try:
+                md5 = self._write()
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                if not hasattr(self.ssh, "reconnect") or not connection_lost(self.ssh, e):
+                    raise
+                self.detached.set()
+                self.log(f"[{self.host}] 广播上传中断（{str(e) or type(e).__name__}），改为断点续传", "warning")
+                self.result["resumed"] = True
+                md5 = upload_and_verify(self.ssh, self.local_path, self.remote_path, self.progress_callback,
+                                        log_callback=self.log)
+            self.result.update(success=True, md5=md5)
+        except Exception as e:
+            self.result["error"] = str(e) or type(e).__name__
+        finally:
+            self.detached.set()
+            self.result["seconds"] = round(time.monotonic() - start, 2)
+
+    def _write(self) -> str:
+        part_path = self.remote_path + PART_SUFFIX
+        progress = TransferProgress(os.path.getsize(self.local_path), self.progress_callback)
+        with self.ssh.open_sftp() as sftp:
+            sftp.get_channel().settimeout(STALL_TIMEOUT)
+            with sftp.file(part_path, 'wb') as remote_file:
+                remote_file.set_pipelined(True)
+                remote_file.MAX_REQUEST_SIZE = SFTP_REQUEST_SIZE
+                done = 0
+                while True:
+                    item = self.queue.get()
+                    if isinstance(item, Exception):
+                        raise item
+                    if isinstance(item, str):
+                        md5 = item  # 数据已全部发出，最后一项是整个文件的MD5
+                        break
+                    remote_file.write(item)
+                    done += len(item)
+                    progress.update(done)
+        commit_part(self.ssh, part_path, self.remote_path, md5)
+        return md5
+
+
+def broadcast_upload(sessions: Dict[str, object], local_path: str, remote_path: str,
+                     progress_callback: Optional[Callable] = None,
+                     log_callback: Optional[Callable] = None) -> Dict[str, dict]:
+    """
+    把local_path同时上传到多台主机的remote_path（先写暂存文件，MD5校验一致后重命名）
+
+    Args:
+        sessions: {主机: 已连接的ssh}，连接池租约在连接中断时可断点续传
+        progress_callback: 单台主机进度回调，参数为(主机, 百分比)
+        log_callback: 日志回调，参数为(消息, 级别)
+
+    Returns:
+        {主机: {"success", "md5", "error", "seconds", "resumed"}}
+    """
+    log = log_callback or (lambda message, level="info": None)
+    uploads = [_HostUpload(host, ssh, local_path, remote_path,
+                           functools.partial(progress_callback, host) if progress_callback else None, log)
+               for host, ssh in sessions.items()]
+    for upload in uploads:
+        upload.thread.start()
+
+    digest = hashlib.md5()
+    try:
+        for chunk in read_chunks(local_path, digest=digest):
+            if all(upload.detached.is_set() for upload in uploads):
+                break
+            for upload in uploads:
+                upload.feed(chunk)
+        else:
+            md5 = digest.hexdigest()
+            for upload in uploads:
+                upload.feed(md5)
+    except Exception as e:
+        # 本地文件读取失败，通知所有写入线程结束
+        for upload in uploads:
+            upload.feed(IOError(f"读取本地文件失败: {e}"))
+
+    for upload in uploads:
+        upload.thread.join()
+    return {upload.host: upload.result for upload in uploads}
@@ -0,0 +1,209 @@
+"""
+WAR包差量上传：只发送新包中远程旧包没有的数据块，在POS上用旧包+差量数据重建新包并校验MD5。
+
+WAR是zip文件，相邻两次构建的大部分条目压缩数据完全相同，只是位置随前面条目的增删而平移。
+因此块签名按条目对齐：每个条目的压缩数据从起点按固定大小切块，两端各自计算块的MD5，
+本地按MD5查找远程相同的块，找到的复制旧包对应范围，找不到的（以及条目头、中央目录等）作为字面数据上传。
+远程签名计算和重建都由POS上的python3完成，没有python3或旧包不是有效zip时由调用方退回整包上传。
+"""
+import hashlib
+import json
+import shlex
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024
+
+# 远程脚本兼容POS上较老的python3（不使用f-string）
+_SEGMENTS_SOURCE = r'''
+import struct, zipfile
+def segments(path, block):
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in sorted(zf.infolist(), key=lambda i: i.header_offset):
+            f.seek(info.header_offset)
+            header = f.read(30)
+            if len(header) < 30 or header[:4] != b"PK\x03\x04":
+                continue
+            name_len, extra_len = struct.unpack("<HH", header[26:30])
+            start = info.header_offset + 30 + name_len + extra_len
+            end = start + info.compress_size
+            for offset in range(start, end, block):
+                yield offset, min(block, end - offset)
+'''
+
+SIGNATURE_SCRIPT = _SEGMENTS_SOURCE + r'''
+import hashlib, sys
+path, block = sys.argv[1], int(sys.argv[2])
+try:
+    out = []
+    with open(path, "rb") as f:
+        for offset, length in segments(path, block):
+            f.seek(offset)
+            out.append("%d %d %s" % (offset, length, hashlib.md5(f.read(length)).hexdigest()))
+except (IOError, OSError, zipfile.BadZipfile) as e:
+    sys.stderr.write(str(e))
+    sys.exit(3)
+sys.stdout.write("\n".join(out))
+'''
+
+PATCH_SCRIPT = r'''
+import hashlib, json, os, sys
+target, delta, expected = sys.argv[1], sys.argv[2], sys.argv[3]
+output = sys.argv[4] if len(sys.argv) > 4 else target
+ops = json.loads(sys.stdin.read())
+tmp = output + ".new"
+digest = hashlib.md5()
+done = False
+# 无论成功与否都删除差量数据；失败时（包括sys.exit和异常）删除写了一半的新包
+try:
+    with open(target, "rb") as old, open(delta, "rb") as literal, open(tmp, "wb") as out:
+        sources = (old, literal)
+        for src, offset, length in ops:
+            f = sources[src]
+            f.seek(offset)
+            while length:
+                data = f.read(min(length, 1 << 20))
+                if not data:
+                    sys.stderr.write("short read")
+                    sys.exit(2)
+                out.write(data)
+                digest.update(data)
+                length -= len(data)
+        out.flush()
+        os.fsync(out.fileno())
+    if digest.hexdigest() != expected:
+        sys.stderr.write("md5 mismatch: %s != %s" % (digest.hexdigest(), expected))
+        sys.exit(2)
+    os.rename(tmp, output)
+    done = True
+finally:
+    for path in (delta,) if done else (delta, tmp):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+sys.stdout.write(expected)
+'''
+
+
+class DeltaUnavailable(Exception):
+    """无法进行差量上传，应退回整包上传"""
+
+
+# 复制操作的来源：远程旧包 / 上传的字面数据
+SOURCE_OLD, SOURCE_LITERAL = 0, 1
+
+_namespace = {}
+exec(_SEGMENTS_SOURCE, _namespace)
+# 本地与远程使用同一份切块代码，保证块边界一致
+segments = _namespace["segments"]
+
+
+def _run_python(ssh, script: str, args: List[str], stdin_data: bytes = None, timeout: int = 600):
+    command = "command -v python3 >/dev/null 2>&1 || exit 127; python3 -c {} {}".format(
+        shlex.quote(script), " ".join(shlex.quote(str(arg)) for arg in args))
+    stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout)
+    if stdin_data is not None:
+        stdin.write(stdin_data)
+        stdin.channel.shutdown_write()
+    out = stdout.read()
+    err = stderr.read().decode(errors="replace").strip()
+    return out, err, stdout.channel.recv_exit_status()
+
+
+def remote_signatures(ssh, remote_path: str, block_size: int = BLOCK_SIZE) -> Dict[Tuple[int, str], int]:
+    """
+    计算远程旧包的块签名，返回 {(长度, md5): 偏移}
+
+    远程没有python3、旧包不存在或不是有效zip时抛出DeltaUnavailable。
+    """
+    out, err, exit_status = _run_python(ssh, SIGNATURE_SCRIPT, [remote_path, block_size])
+    if exit_status == 127:
+        raise DeltaUnavailable("远程没有python3")
+    if exit_status != 0:
+        raise DeltaUnavailable(f"无法读取远程旧包: {err}")
+    signatures = {}
+    for line in out.decode().splitlines():
+        offset, length, digest = line.split()
+        signatures.setdefault((int(length), digest), int(offset))
+    return signatures
+
+
+def plan_delta(local_path: str, signatures: Dict[Tuple[int, str], int], literal_file,
+               block_size: int = BLOCK_SIZE, max_literal: Optional[int] = None) -> Tuple[List[List[int]], str, int]:
+    """
+    顺序读一遍本地新包，生成重建操作并把字面数据写入literal_file
+
+    Args:
+        max_literal: 字面数据超过该字节数时立即停止并抛出DeltaUnavailable，不再读完整个新包
+
+    Returns:
+        (操作列表[[来源, 偏移, 长度], ...], 新包MD5, 字面数据字节数)
+    """
+    ops = []
+    digest = hashlib.md5()
+    literal_size = 0
+
+    def add(source, offset, length):
+        # 与上一个操作首尾相接时合并
+        if ops and ops[-1][0] == source and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1][2] += length
+        else:
+            ops.append([source, offset, length])
+
+    def add_literal(data):
+        nonlocal literal_size
+        literal_file.write(data)
+        add(SOURCE_LITERAL, literal_size, len(data))
+        literal_size += len(data)
+        if max_literal is not None and literal_size > max_literal:
+            raise DeltaUnavailable(f"新旧war包差异过大（差异数据已超过 {max_literal / 1024 / 1024:.1f} MB）")
+
+    position = 0
+    with open(local_path, 'rb') as f:
+        for offset, length in segments(local_path, block_size):
+            if offset < position:
+                continue  # 与前一条目重叠的异常条目，数据已按字面发送
+            if offset > position:
+                gap = f.read(offset - position)
+                digest.update(gap)
+                add_literal(gap)
+            block = f.read(length)
+            digest.update(block)
+            old_offset = signatures.get((length, hashlib.md5(block).hexdigest()))
+            if old_offset is None:
+                add_literal(block)
+            else:
+                add(SOURCE_OLD, old_offset, length)
+            position = offset + length
+        while tail := f.read(1024 * 1024):
+            digest.update(tail)
+            add_literal(tail)
+    return ops, digest.hexdigest(), literal_size
+
+
+def apply_delta(ssh, remote_path: str, remote_literal_path: str, ops: List[List[int]], md5: str,
+                output_path: str = None) -> None:
+    """
+    在POS上用旧包和已上传的字面数据重建新包，MD5一致后原子替换旧包，否则抛出IOError
+
+    Args:
+        output_path: 新包写到该路径而不替换旧包（服务运行中预先准备新包），为空时替换旧包
+    """
+    output_path = output_path or remote_path
+    _, err, exit_status = _run_python(ssh, PATCH_SCRIPT, [remote_path, remote_literal_path, md5, output_path],
+                                      json.dumps(ops).encode())
+    if exit_status != 0:
+        # 脚本自身会清理；没有python3或脚本未能启动时在这里删除差量数据和临时文件
+        ssh.exec_command(f"rm -f {shlex.quote(remote_literal_path)} {shlex.quote(output_path + '.new')}"
+                         )[1].channel.recv_exit_status()
+        raise IOError(f"远程重建失败: {err}")
+
+
+def is_zip(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == b"PK\x03\x04" and zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
@@ -0,0 +1,115 @@
+"""
+解压目录按条目同步：比较新war包的中央目录（名称、CRC32、大小）与POS上缓存的部署清单，
+只解压新增或变化的条目、删除已移除的条目，代替 rm -rf + 全量解压。
+
+部署清单在每次部署成功后写到POS上；清单写入之后被改动或新建的文件（如改环境时改写的配置文件）
+视为与清单不一致，下次同步时按war包重新解压或删除；清单中有、磁盘上已被删掉的文件重新解压，
+清单外的旧文件删除，结果与全量解压一致。
+"""
+import json
+import posixpath
+import shlex
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+
+Manifest = Dict[str, List[int]]
+
+
+def war_manifest(local_war_path: str) -> Manifest:
+    """从本地war包的中央目录生成清单 {条目名: [CRC32, 大小]}"""
+    with zipfile.ZipFile(local_war_path) as zf:
+        return {info.filename: [info.CRC, info.file_size] for info in zf.infolist()}
+
+
+def read_deployed_state(ssh, webapp_dir: str,
+                        manifest_path: str) -> Optional[Tuple[Manifest, Set[str], Set[str]]]:
+    """
+    一条命令读取部署清单、清单写入后有改动的文件和目录中现有的全部文件
+
+    Returns:
+        (清单, 改动过的条目名集合, 现有文件的条目名集合)；没有清单或解压目录不存在时返回None
+    """
+    quoted_manifest = shlex.quote(manifest_path)
+    # 两次find的输出之间用单独的"/"分隔，find输出的路径都以./开头，不会与之混淆
+    command = (f"[ -f {quoted_manifest} ] && [ -d {shlex.quote(webapp_dir)} ] || exit 3; "
+               f"cat {quoted_manifest} && printf '\\0' && cd {shlex.quote(webapp_dir)} && "
+               f"find . -newer {quoted_manifest} -type f -print0 && printf '/\\0' && find . -type f -print0")
+    _, stdout, _ = ssh.exec_command(command, timeout=60)
+    data = stdout.read()
+    if stdout.channel.recv_exit_status() != 0:
+        return None
+    manifest_data, _, file_data = data.partition(b"\0")
+    modified_data, _, existing_data = file_data.partition(b"/\0")
+    try:
+        manifest = json.loads(manifest_data.decode())
+    except ValueError:
+        return None
+    modified = {name.decode(errors="surrogateescape")[2:] for name in modified_data.split(b"\0") if name}
+    existing = {name.decode(errors="surrogateescape")[2:] for name in existing_data.split(b"\0") if name}
+    return manifest, modified, existing
+
+
+def plan_sync(deployed: Manifest, modified: Set[str], existing: Set[str],
+              target: Manifest) -> Tuple[List[str], List[str]]:
+    """返回 (需要解压的条目, 需要删除的路径)，目录条目以/结尾"""
+    extract = [name for name, entry in target.items()
+               if not name.endswith("/") and (deployed.get(name) != entry or name in modified or name not in existing)]
+    removed_files = [name for name in deployed if name not in target and not name.endswith("/")]
+    # 清单之外、war包中也没有的文件（全量解压时会被rm -rf清掉）
+    removed_files += [name for name in existing if name not in target and name not in deployed]
+    # 目录最后删除，深的在前，非空目录会保留
+    removed_dirs = sorted((name for name in deployed if name not in target and name.endswith("/")),
+                          key=len, reverse=True)
+    return extract, removed_files + removed_dirs
+
+
+def _unzip_pattern(name: str) -> str:
+    # unzip把条目名当作通配符，转义其中的通配字符
+    return "".join(f"[{c}]" if c in "*?[" else c for c in name)
+
+
+def apply_sync(ssh, remote_war: str, webapp_dir: str, extract: List[str], remove: List[str],
+               timeout: int = 600) -> Tuple[str, int]:
+    """
+    在POS上执行同步：删除已移除的条目，再用unzip只解压指定条目（-DD使Tomcat能察觉文件更新）
+
+    Returns:
+        (unzip的stderr, 退出码)，没有需要解压的条目时退出码为0
+    """
+    quoted_dir = shlex.quote(webapp_dir)
+    if remove:
+        files = b"".join(name.encode() + b"\0" for name in remove if not name.endswith("/"))
+        dirs = " ".join(shlex.quote(posixpath.join(webapp_dir, name)) for name in remove if name.endswith("/"))
+        command = f"cd {quoted_dir} && xargs -0 -r rm -f --"
+        if dirs:
+            command += f"; rmdir {dirs} 2>/dev/null; true"
+        stdin, stdout, _ = ssh.exec_command(command, timeout=timeout)
+        stdin.write(files)
+        stdin.channel.shutdown_write()
+        stdout.channel.recv_exit_status()
+    if not extract:
+        return "", 0
+    # 条目名从标准输入传给xargs，数量很多时自动分批调用unzip
+    stdin, stdout, stderr = ssh.exec_command(
+        f"xargs -0 unzip -o -DD -q {shlex.quote(remote_war)} -d {quoted_dir}", timeout=timeout)
+    stdin.write(b"".join(_unzip_pattern(name).encode() + b"\0" for name in extract))
+    stdin.channel.shutdown_write()
+    stdout.read()
+    err = stderr.read().decode(errors="replace").strip()
+    exit_status = stdout.channel.recv_exit_status()
+    # xargs在unzip返回1~125时返回123，unzip返回1表示只有警告
+    return err, 1 if exit_status == 123 else exit_status
+
+
+def write_manifest(ssh, manifest_path: str, manifest: Manifest) -> None:
+    """部署成功后写入清单（先写临时文件再重命名）"""
+    with ssh.open_sftp() as sftp:
+        temp_path = f"{manifest_path}.tmp"
+        with sftp.file(temp_path, 'wb') as f:
+            f.write(json.dumps(manifest, separators=(",", ":")).encode())
+        sftp.posix_rename(temp_path, manifest_path)
+
+
+def remove_manifest(ssh, manifest_path: str) -> None:
+    """解压失败时删除清单，下次部署全量解压"""
+    ssh.exec_command(f"rm -f {shlex.quote(manifest_path)}")[1].channel.recv_exit_status()
@@ -0,0 +1,137 @@
+"""
+命令行扫描POS（不加载PyQt6），每发现一台设备立即输出一行NDJSON或CSV，适合定时任务。
+
+用法:
+    python -m pos_tool_new.scan_pos 192.168.0.0/23
+    python -m pos_tool_new.scan_pos 10.0.0.0/16 --engine asyncio --concurrency 1000 --format csv -o pos.csv
+    python -m pos_tool_new.scan_pos 192.168.0.0/23 --extra-ports 22,22108
+    python -m pos_tool_new.scan_pos --local-ip 192.168.1.10 --inventory ~/.pos_tool/scan_inventory.db
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+import threading
+
+from pos_tool_new.scan_pos.device_inventory import DeviceInventory
+from pos_tool_new.scan_pos.pos_scanner import LICENSE_DB_PORT, SSH_PORT, PosScanner
+from pos_tool_new.scan_pos.scan_engine import SCAN_ENGINES
+from pos_tool_new.scan_pos.scan_targets import ScanTargets
+
+CSV_FIELDS = ["ip", "type", "merchantId", "name", "version", "status", "error", "open_ports"]
+
+
+class ResultWriter:
+    """线程安全的结果输出：每条结果写完立即flush，下游可以边扫边读"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self.count = 0
+        self._lock = threading.Lock()
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+            stream.flush()
+
+    def write(self, result):
+        with self._lock:
+            if self.fmt == "csv":
+                # CSV中只列出开放的端口，分号分隔
+                open_ports = ";".join(str(port) for port, is_open in result.get("open_ports", {}).items() if is_open)
+                self._csv.writerow({**result, "open_ports": open_ports})
+            else:
+                self.stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.stream.flush()
+            self.count += 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pos_tool_new.scan_pos", description="扫描局域网内的POS设备")
+    parser.add_argument("targets", nargs="?", help="扫描目标，支持CIDR、IP范围和单个IP，逗号分隔；默认本机所在/23网段")
+    parser.add_argument("--local-ip", help="未指定targets时，以该IP所在/23网段为目标")
+    parser.add_argument("--port", type=int, default=22080, help="kpos端口，默认22080")
+    parser.add_argument("--extra-ports", default="",
+                        help=f"同一轮一起探测的其它端口，逗号分隔，如 {SSH_PORT},{LICENSE_DB_PORT}")
+    parser.add_argument("--engine", choices=sorted(SCAN_ENGINES), default="thread", help="扫描引擎")
+    parser.add_argument("--concurrency", type=int, help="并发上限（自适应模式下为窗口上限）")
+    parser.add_argument("--no-adaptive", action="store_true", help="关闭自适应并发/超时，使用固定并发")
+    parser.add_argument("--neighbors", action="store_true", help="先探测ARP邻居表中的在线地址")
+    parser.add_argument("--udp-touch", action="store_true", help="先分批发UDP报文填充邻居表（隐含--neighbors，目标最多/22）")
+    parser.add_argument("--inventory", help="设备清单数据库路径，已知设备优先探测并记录本次结果")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="输出格式，默认ndjson")
+    parser.add_argument("-o", "--output", help="输出文件，默认标准输出")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不在标准错误输出进度和日志")
+    args = parser.parse_args(argv)
+    try:
+        args.extra_ports = [int(port) for port in args.extra_ports.split(",") if port.strip()]
+    except ValueError:
+        parser.error(f"无效的端口列表: {args.extra_ports}")
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency 必须大于0")
+    if args.targets:
+        try:
+            args.targets = ScanTargets.parse(args.targets)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    show_progress = not args.quiet and sys.stderr.isatty()
+    last_percent = -1
+
+    def on_progress(percent, ip):
+        nonlocal last_percent
+        if show_progress and percent != last_percent:
+            last_percent = percent
+            sys.stderr.write(f"\r扫描进度 {percent}% {ip:<15}")
+            sys.stderr.flush()
+
+    inventory = DeviceInventory(args.inventory) if args.inventory else None
+    scanner = PosScanner(local_ip=args.local_ip, engine=args.engine, targets=args.targets, inventory=inventory,
+                         adaptive=not args.no_adaptive, neighbor_prefilter=args.neighbors,
+                         udp_touch=args.udp_touch, concurrency=args.concurrency, extra_ports=args.extra_ports)
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = ResultWriter(output, args.format)
+    stop_event = threading.Event()
+    errors = []
+
+    def run_scan():
+        try:
+            scanner.scan(args.port, on_progress=on_progress, on_result=writer.write,
+                         is_running=lambda: not stop_event.is_set())
+        except Exception as e:
+            logging.exception("扫描失败")
+            errors.append(e)
+
+    # 扫描放在后台线程，主线程等待Ctrl+C后通知扫描尽快停止
+    scan_thread = threading.Thread(target=run_scan, name="pos-scan")
+    scan_thread.start()
+    interrupted = False
+    try:
+        while scan_thread.is_alive():
+            scan_thread.join(0.2)
+    except KeyboardInterrupt:
+        interrupted = True
+        stop_event.set()
+        scan_thread.join()
+    finally:
+        if show_progress:
+            sys.stderr.write("\n")
+        if output is not sys.stdout:
+            output.close()
+        scanner.http.close()
+        if inventory:
+            inventory.close()
+    if interrupted:
+        return 130
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import errno
+import threading
+import time
+
+# 本机资源不足或网络拥塞时connect返回的错误码（主机不存在导致的不可达不算）
+CONGESTION_ERRNOS = {
+    errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL, errno.EAGAIN,
+    getattr(errno, "WSAENOBUFS", errno.ENOBUFS), getattr(errno, "WSAEMFILE", errno.EMFILE),
+}
+
+
+class AimdController:
+    """
+    扫描并发/超时自适应控制器（AIMD：加性增、乘性减）。
+
+    每完成一批探测评估一次：本机错误率过高或RTT明显膨胀时并发数乘以decrease_factor
+    （两次减小之间至少间隔一个窗口的探测量），否则并发数加increase_step；
+    单次探测超时按TCP RTO算法(srtt + 4*rttvar)跟随实测RTT调整。
+    """
+
+    HISTORY_LIMIT = 50
+
+    def __init__(self, initial_window=200, min_window=16, max_window=2000, increase_step=16,
+                 decrease_factor=0.5, epoch_size=64, error_threshold=0.05, rtt_inflation_limit=4.0,
+                 initial_timeout=1.0, min_timeout=0.3, max_timeout=3.0):
+        self.min_window = min_window
+        self.max_window = max(max_window, min_window)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.epoch_size = epoch_size
+        self.error_threshold = error_threshold
+        self.rtt_inflation_limit = rtt_inflation_limit
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._initial = (min(max(initial_window, min_window), self.max_window), initial_timeout)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """开始新一轮扫描前重置状态"""
+        with self._lock:
+            self.window, self.timeout = self._initial
+            self._srtt = self._rttvar = self._min_rtt = None
+            self._epoch = {"samples": 0, "errors": 0}
+            self._counts = {"open": 0, "refused": 0, "timeout": 0, "unreachable": 0, "error": 0}
+            self._increases = self._decreases = 0
+            self._since_decrease = 0
+            self._peak_window = self.window
+            self._history = []
+            self._started = time.monotonic()
+
+    def limit_window(self, limit):
+        """把窗口上限收紧到扫描引擎实际能支持的并发数，超出部分的增长不会带来更多并发，只会让统计失真"""
+        with self._lock:
+            self.max_window = max(1, min(self.max_window, limit))
+            self.min_window = min(self.min_window, self.max_window)
+            self._initial = (min(self._initial[0], self.max_window), self._initial[1])
+            self.window = min(self.window, self.max_window)
+            self._peak_window = min(self._peak_window, self.max_window)
+
+    @property
+    def srtt(self):
+        return self._srtt
+
+    def record(self, outcome, rtt=None, err_no=None):
+        """
+        记录一次探测结果
+
+        Args:
+            outcome: "open" 端口开放, "refused" 连接被拒绝, "timeout" 超时, "error" 其它错误
+            rtt: 连接建立/被拒绝的耗时（秒），仅open/refused有效
+            err_no: outcome为error时的错误码，用于区分拥塞与主机不可达
+        """
+        with self._lock:
+            if outcome == "error" and err_no not in CONGESTION_ERRNOS:
+                outcome = "unreachable"
+            self._counts[outcome] += 1
+            self._epoch["samples"] += 1
+            self._since_decrease += 1
+            if outcome == "error":
+                self._epoch["errors"] += 1
+            if rtt is not None:
+                self._update_rtt(rtt)
+            if self._epoch["samples"] >= self.epoch_size:
+                self._adjust()
+
+    def _update_rtt(self, rtt):
+        # RFC 6298 平滑RTT估计
+        if self._srtt is None:
+            self._srtt, self._rttvar = rtt, rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self._min_rtt = rtt if self._min_rtt is None else min(self._min_rtt, rtt)
+        rto = self._srtt + 4 * self._rttvar
+        self.timeout = min(max(rto, self.min_timeout), self.max_timeout)
+
+    def _adjust(self):
+        error_rate = self._epoch["errors"] / self._epoch["samples"]
+        inflated = (self._srtt is not None and self._min_rtt
+                    and self._srtt > self._min_rtt * self.rtt_inflation_limit
+                    and self._srtt > self.min_timeout / 4)
+        congested = error_rate > self.error_threshold or inflated
+        if congested and self._since_decrease < self.window:
+            # 上次减小后的探测还未完成一轮，等待效果显现
+            self._epoch = {"samples": 0, "errors": 0}
+            return
+        if congested:
+            new_window = max(self.min_window, int(self.window * self.decrease_factor))
+            reason = f"本机错误率 {error_rate:.0%}" if error_rate > self.error_threshold else \
+                f"RTT膨胀 {self._srtt * 1000:.0f}ms/{self._min_rtt * 1000:.0f}ms"
+            self._decreases += 1
+            self._since_decrease = 0
+        else:
+            new_window = min(self.max_window, self.window + self.increase_step)
+            reason = "增长"
+            self._increases += 1
+        # 只记录减小以及减小后恢复增长的决策点，避免历史被连续的增长刷满
+        last_reason = self._history[-1]["reason"] if self._history else None
+        if new_window != self.window and (congested or last_reason not in (None, "增长")):
+            self._history.append({
+                "t": round(time.monotonic() - self._started, 3),
+                "window": new_window,
+                "timeout": round(self.timeout, 3),
+                "reason": reason,
+            })
+            del self._history[:-self.HISTORY_LIMIT]
+        self.window = new_window
+        self._peak_window = max(self._peak_window, new_window)
+        self._epoch = {"samples": 0, "errors": 0}
+
+    def stats(self):
+        """返回控制器统计信息，用于解释扫描耗时"""
+        with self._lock:
+            return {
+                "window": self.window,
+                "peak_window": self._peak_window,
+                "timeout": round(self.timeout, 3),
+                "srtt_ms": round(self._srtt * 1000, 2) if self._srtt is not None else None,
+                "min_rtt_ms": round(self._min_rtt * 1000, 2) if self._min_rtt is not None else None,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "outcomes": dict(self._counts),
+                "history": list(self._history),
+            }
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DeviceInventory:
+    """本地POS设备清单（SQLite），记录扫描到的每台设备及最后在线时间，供增量扫描优先探测"""
+
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".pos_tool", "scan_inventory.db")
+    FIELDS = ("merchantId", "name", "version", "type")
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """进程内共享的默认清单，扫描页与Linux/License页读写同一个实例"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, path=None):
+        self.path = path or self.DEFAULT_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 扫描时多个线程同时写入，统一用一个连接加锁访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS devices (
+                    ip TEXT PRIMARY KEY,
+                    merchantId TEXT,
+                    name TEXT,
+                    version TEXT,
+                    type TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                )
+            """)
+            # 旧版本数据库没有端口列，按需补充
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(devices)")}
+            if "open_ports" not in columns:
+                self._conn.execute("ALTER TABLE devices ADD COLUMN open_ports TEXT")
+                self._conn.execute("ALTER TABLE devices ADD COLUMN ports_checked REAL")
+
+    def record(self, result, seen_at=None):
+        """
+        记录一次扫描结果
+
+        Returns:
+            str: "new" 新设备, "changed" 信息有变化, "unchanged" 仅更新时间戳
+        """
+        seen_at = seen_at or time.time()
+        ip = str(result.get("ip", ""))
+        values = tuple(str(result.get(key) or "") for key in self.FIELDS)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT merchantId, name, version, type FROM devices WHERE ip = ?", (ip,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO devices (ip, merchantId, name, version, type, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", (ip, *values, seen_at, seen_at))
+                status = "new"
+            elif tuple(row) == values:
+                self._conn.execute("UPDATE devices SET last_seen = ? WHERE ip = ?", (seen_at, ip))
+                status = "unchanged"
+            else:
+                self._conn.execute(
+                    "UPDATE devices SET merchantId = ?, name = ?, version = ?, type = ?, last_seen = ? WHERE ip = ?",
+                    (*values, seen_at, ip))
+                status = "changed"
+            if result.get("open_ports"):
+                self._merge_ports(ip, result["open_ports"], seen_at)
+            return status
+
+    def record_ports(self, ip, open_ports, seen_at=None):
+        """
+        只记录端口探测结果（kpos未响应但其它端口开放的主机），不覆盖已有的商家信息
+
+        Args:
+            open_ports: {端口: 是否开放}
+        """
+        seen_at = seen_at or time.time()
+        ip = str(ip)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO devices (ip, merchantId, name, version, type, first_seen, last_seen) "
+                "VALUES (?, '', '', '', '', ?, ?)", (ip, seen_at, seen_at))
+            self._conn.execute("UPDATE devices SET last_seen = ? WHERE ip = ?", (seen_at, ip))
+            self._merge_ports(ip, open_ports, seen_at)
+
+    def _merge_ports(self, ip, open_ports, checked_at):
+        # 本次未探测的端口保留上次的结果；调用方需持有锁并处于事务中
+        row = self._conn.execute("SELECT open_ports FROM devices WHERE ip = ?", (ip,)).fetchone()
+        ports = json.loads(row["open_ports"]) if row and row["open_ports"] else {}
+        ports.update({str(port): bool(is_open) for port, is_open in open_ports.items()})
+        self._conn.execute("UPDATE devices SET open_ports = ?, ports_checked = ? WHERE ip = ?",
+                           (json.dumps(ports, sort_keys=True), checked_at, ip))
+
+    def port_state(self, ip, port, max_age=600):
+        """
+        查询最近一次扫描得到的端口状态
+
+        Returns:
+            True 开放, False 未开放, None 未探测过或结果已超过max_age秒
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT open_ports, ports_checked FROM devices WHERE ip = ?", (str(ip),)).fetchone()
+        if not row or not row["open_ports"] or time.time() - (row["ports_checked"] or 0) > max_age:
+            return None
+        return json.loads(row["open_ports"]).get(str(port))
+
+    def hosts_with_port(self, port):
+        """返回最近一次扫描中port开放的设备（最近在线的在前）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM devices WHERE open_ports IS NOT NULL ORDER BY last_seen DESC").fetchall()
+        return [dict(row) for row in rows if json.loads(row["open_ports"]).get(str(port))]
+
+    def known_ips(self, targets=None):
+        """返回已知设备IP（最近在线的在前），传入targets时只返回目标范围内的IP"""
+        with self._lock:
+            rows = self._conn.execute("SELECT ip FROM devices ORDER BY last_seen DESC").fetchall()
+        ips = [row["ip"] for row in rows]
+        if targets is not None:
+            ips = [ip for ip in ips if ip in targets]
+        return ips
+
+    def get(self, ip):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM devices WHERE ip = ?", (str(ip),)).fetchone()
+        return dict(row) if row else None
+
+    def all_devices(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM devices ORDER BY ip").fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,161 @@
+"""
+回环地址上的假kpos HTTP服务，供扫描基准测试使用。
+
+所有假设备共用一个后台事件循环线程，每台设备只是一个监听socket，几百上千台也只占很少资源。
+可注入响应延迟，并按比例让部分设备断开连接（不返回响应）或返回损坏的JSON。
+"""
+import asyncio
+import ipaddress
+import json
+import random
+import socket
+import threading
+
+PROFILE_PATH = "/kpos/webapp/store/fetchCompanyProfile"
+OS_TYPE_PATH = "/kpos/webapp/os/getOSType"
+
+MODE_OK = "ok"                # 正常响应
+MODE_DROP = "drop"            # 读到请求后直接断开
+MODE_MALFORMED = "malformed"  # 返回截断的JSON
+
+
+def pick_loopback_ips(network, count, port, seed=0):
+    """在回环网段内随机挑选count个可绑定port的地址"""
+    network = ipaddress.IPv4Network(network, strict=False)
+    candidates = [str(ip) for ip in network.hosts()]
+    random.Random(seed).shuffle(candidates)
+    ips = []
+    for ip in candidates:
+        if len(ips) >= count:
+            break
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((ip, port))
+            except OSError:
+                continue
+        ips.append(ip)
+    return ips
+
+
+class FakePosFleet:
+    """一组假kpos设备，用法: with FakePosFleet(ips, latency=0.05, drop_rate=0.1) as fleet: ..."""
+
+    def __init__(self, ips, port=22080, latency=0.0, latency_jitter=0.0, drop_rate=0.0, malformed_rate=0.0,
+                 version="2.5.0", os_type="Linux", seed=0):
+        """
+        Args:
+            latency: 每个响应的固定延迟（秒）
+            latency_jitter: 在固定延迟上再叠加0~latency_jitter秒的随机延迟
+            drop_rate: 断开连接的设备比例
+            malformed_rate: 返回损坏JSON的设备比例
+            seed: 故障分配的随机种子，相同种子得到相同的故障设备
+        """
+        self.port = port
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.version = version
+        self.os_type = os_type
+        self._rng = random.Random(seed)
+        # 按比例为每台设备分配固定的行为，便于核对扫描结果
+        self.modes = {}
+        for ip in ips:
+            roll = self._rng.random()
+            if roll < drop_rate:
+                self.modes[ip] = MODE_DROP
+            elif roll < drop_rate + malformed_rate:
+                self.modes[ip] = MODE_MALFORMED
+            else:
+                self.modes[ip] = MODE_OK
+        self.stats = {"connections": 0, "requests": 0, "dropped": 0, "malformed": 0}
+        self._loop = None
+        self._thread = None
+        self._servers = []
+        self._writers = set()
+
+    @property
+    def ips(self):
+        return list(self.modes)
+
+    def ips_with_mode(self, mode):
+        return [ip for ip, ip_mode in self.modes.items() if ip_mode == mode]
+
+    def _body(self, ip, path, mode):
+        if mode == MODE_MALFORMED:
+            self.stats["malformed"] += 1
+            return b'{"company": {"merchantId": "'
+        if path.startswith(PROFILE_PATH):
+            merchant_id = str(int(ipaddress.IPv4Address(ip)) % 1000000)
+            data = {"company": {"merchantId": merchant_id, "name": f"Fake POS {ip}",
+                                "appInfo": {"version": self.version}}}
+        elif path.startswith(OS_TYPE_PATH):
+            data = {"os": self.os_type}
+        else:
+            return None
+        return json.dumps(data).encode()
+
+    async def _handle(self, reader, writer):
+        ip = writer.get_extra_info("sockname")[0]
+        mode = self.modes.get(ip, MODE_OK)
+        self.stats["connections"] += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                self.stats["requests"] += 1
+                if mode == MODE_DROP:
+                    self.stats["dropped"] += 1
+                    break
+                delay = self.latency + (self._rng.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+                if delay:
+                    await asyncio.sleep(delay)
+                path = request.split(b" ", 2)[1].decode("ascii", errors="ignore")
+                body = self._body(ip, path, mode)
+                if body is None:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                else:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                                 b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, IndexError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _start_servers(self):
+        for ip in self.modes:
+            server = await asyncio.start_server(self._handle, ip, self.port, reuse_address=True, backlog=64)
+            self._servers.append(server)
+
+    async def _close_servers(self):
+        for server in self._servers:
+            server.close()
+        # 扫描端的keep-alive连接可能还开着，先关闭，否则wait_closed会一直等待
+        for writer in list(self._writers):
+            writer.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-pos-fleet", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_servers(), self._loop).result()
+        return self
+
+    def stop(self):
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_servers(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,213 @@
+import concurrent.futures
+import heapq
+import logging
+import random
+import threading
+import time
+
+from pos_tool_new.scan_pos.pos_http_client import PosHttpClient
+from pos_tool_new.scan_pos.pos_scanner import PosScanner
+
+logger = logging.getLogger(__name__)
+
+EVENT_APPEARED = "appeared"                # 设备重新上线
+EVENT_OFFLINE = "offline"                  # 设备离线
+EVENT_VERSION_CHANGED = "version_changed"  # 版本变化
+
+
+def _default_log(msg, level="info"):
+    logger.log(getattr(logging, level.upper(), logging.INFO), msg)
+
+
+class FleetMonitor:
+    """
+    POS设备后台巡检（不依赖Qt）：对已知设备按各自带抖动的周期复查在线状态和版本，
+    全局请求速率受rate_limit限制，只通过on_event输出变化（上线、离线、版本变化）。
+
+    每次复查只请求一次fetchCompanyProfile，几百台设备的巡检只产生少量请求，不再重复扫描整个网段。
+    """
+
+    # 调度循环检查停止标志的间隔（秒）
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, inventory=None, http_client=None, port=22080, interval=60, jitter=0.2, rate_limit=5.0,
+                 max_in_flight=8, offline_after=2, timeout=3, on_event=None, log=None):
+        """
+        Args:
+            inventory: 设备清单（DeviceInventory），启动时载入已知设备，复查成功后更新
+            interval: 每台设备的复查周期（秒）
+            jitter: 周期抖动比例，0.2表示在0.8~1.2倍周期之间随机，避免所有设备同时复查
+            rate_limit: 全局每秒最多发起的复查次数
+            max_in_flight: 同时进行的复查数
+            offline_after: 连续失败多少次判定为离线
+            timeout: 单次请求的连接/读取超时（秒）
+            on_event: 变化事件回调 on_event(事件字典)
+        """
+        self.inventory = inventory
+        self.http = http_client or PosHttpClient(pool_maxsize=1, connect_timeout=timeout, read_timeout=timeout)
+        self.port = port
+        self.interval = interval
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.max_in_flight = max_in_flight
+        self.offline_after = offline_after
+        self.timeout = timeout
+        self.on_event = on_event or (lambda event: None)
+        self.log = log or _default_log
+        self._devices = {}   # ip -> {"result", "online", "failures"}
+        self._schedule = []  # (到期时间, 序号, ip)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._next_slot = 0.0
+        if inventory:
+            self._load_inventory()
+
+    def _load_inventory(self):
+        try:
+            devices = self.inventory.all_devices()
+        except Exception as e:
+            self.log(f"读取设备清单失败: {e}", level="warning")
+            return
+        for device in devices:
+            # 只有端口记录、从未获取到商家信息的主机不在巡检范围内
+            if device.get("merchantId") or device.get("name"):
+                self.watch(device, checked=False)
+
+    def _next_delay(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, ip, due):
+        # 调用方需持有self._cond
+        self._seq += 1
+        heapq.heappush(self._schedule, (due, self._seq, ip))
+        self._cond.notify()
+
+    def watch(self, result, checked=True):
+        """
+        加入或刷新一台设备（扫描结果或清单记录），视为最后一次看到时在线
+
+        Args:
+            checked: True表示刚刚确认在线（如扫描结果），下一次复查排在一个周期之后；
+                     False时在一个周期内随机安排首次复查，避免启动时集中请求
+        """
+        ip = str(result.get("ip", ""))
+        info = {key: result.get(key) or "" for key in ("ip", "merchantId", "name", "version", "type")}
+        with self._cond:
+            state = self._devices.get(ip)
+            if state:
+                state["result"].update({k: v for k, v in info.items() if v})
+                was_offline = state["online"] is False
+                state["online"], state["failures"] = True, 0
+            else:
+                self._devices[ip] = {"result": info, "online": True, "failures": 0}
+                was_offline = False
+                delay = self._next_delay() if checked else random.uniform(0, self.interval)
+                self._push(ip, time.monotonic() + delay)
+        if was_offline:
+            self._emit(EVENT_APPEARED, ip, info)
+
+    def unwatch(self, ip):
+        with self._cond:
+            self._devices.pop(str(ip), None)
+
+    def snapshot(self):
+        """返回所有被巡检设备的当前状态"""
+        with self._cond:
+            return [{**state["result"], "online": state["online"]} for state in self._devices.values()]
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self):
+        """调度循环，阻塞直到stop()被调用"""
+        self._stop.clear()
+        self.log(f"后台巡检已启动: {len(self._devices)} 台设备, 周期 {self.interval}s, 限速 {self.rate_limit} 次/秒")
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            while not self._stop.is_set():
+                ip = self._next_due()
+                if ip is None or not self._wait_for_rate_slot():
+                    continue
+                while not slots.acquire(timeout=self.POLL_INTERVAL):
+                    if self._stop.is_set():
+                        return
+                executor.submit(self._check, ip, slots)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.log("后台巡检已停止")
+
+    def _next_due(self):
+        with self._cond:
+            while self._schedule:
+                due, _, ip = self._schedule[0]
+                if ip not in self._devices:
+                    heapq.heappop(self._schedule)  # 已取消巡检的设备
+                    continue
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(min(delay, self.POLL_INTERVAL))
+                    return None
+                heapq.heappop(self._schedule)
+                return ip
+            self._cond.wait(self.POLL_INTERVAL)
+            return None
+
+    def _wait_for_rate_slot(self):
+        # 全局限速：相邻两次复查至少间隔1/rate_limit秒
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1.0 / self.rate_limit
+        return not self._stop.wait(slot - now) if slot > now else True
+
+    def _check(self, ip, slots):
+        try:
+            profile, alive = self.http.probe_company_profile(ip, self.port, self.timeout)
+        except Exception as e:
+            profile, alive = {"error": f"Request error: {e}"}, False
+        finally:
+            slots.release()
+        # 连接失败才算离线（alive为False）；kpos能响应但返回错误说明设备仍在线
+        info = PosScanner._extract_required_info(profile) if alive and isinstance(profile, dict) else {}
+        info.pop("error", None)
+        self._apply(ip, alive, info)
+
+    def _apply(self, ip, alive, info):
+        events, old_version = [], None
+        with self._cond:
+            state = self._devices.get(ip)
+            if state is None:
+                return
+            result = state["result"]
+            if alive:
+                if state["online"] is False:
+                    events.append(EVENT_APPEARED)
+                if result.get("version") and info.get("version") and result["version"] != info["version"]:
+                    old_version = result["version"]
+                    events.append(EVENT_VERSION_CHANGED)
+                state["online"], state["failures"] = True, 0
+                result.update({k: v for k, v in info.items() if v})
+            else:
+                state["failures"] += 1
+                if state["online"] and state["failures"] >= self.offline_after:
+                    state["online"] = False
+                    events.append(EVENT_OFFLINE)
+            snapshot = dict(result)
+            self._push(ip, time.monotonic() + self._next_delay())
+        if alive and info and self.inventory:
+            try:
+                self.inventory.record(snapshot)
+            except Exception as e:
+                self.log(f"写入设备清单失败: {e}", level="warning")
+        for event in events:
+            self._emit(event, ip, snapshot, old_version if event == EVENT_VERSION_CHANGED else None)
+
+    def _emit(self, event, ip, result, old_version=None):
+        payload = {"event": event, "ip": ip, "time": time.time(), "online": event != EVENT_OFFLINE,
+                   "result": dict(result)}
+        if old_version:
+            payload["old_version"] = old_version
+        self.on_event(payload)
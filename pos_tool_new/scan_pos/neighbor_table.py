@@ -0,0 +1,119 @@
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+
+class NeighborTableProvider:
+    """系统邻居表(ARP表)读取接口，返回已解析出MAC地址的IPv4地址集合"""
+
+    def read(self):
+        raise NotImplementedError("子类必须实现 read 方法")
+
+
+class ProcNetArpProvider(NeighborTableProvider):
+    """Linux: 读取 /proc/net/arp"""
+    PATH = "/proc/net/arp"
+    # ATF_COM：条目已完成解析
+    ATF_COM = 0x2
+
+    def read(self):
+        ips = set()
+        with open(self.PATH, encoding="ascii", errors="ignore") as f:
+            next(f, None)  # 跳过表头
+            for line in f:
+                parts = line.split()
+                if len(parts) < 4:
+                    continue
+                ip, flags, mac = parts[0], parts[2], parts[3]
+                if int(flags, 16) & self.ATF_COM and mac != "00:00:00:00:00:00":
+                    ips.add(ip)
+        return ips
+
+
+class ArpCommandProvider(NeighborTableProvider):
+    """Windows/macOS: 解析 arp -a 的输出"""
+    LINE_PATTERN = re.compile(
+        r"(\d{1,3}(?:\.\d{1,3}){3})\)?\s+(?:at\s+)?([0-9a-fA-F]{1,2}(?:[:-][0-9a-fA-F]{1,2}){5})")
+    BROADCAST_MACS = {"ff-ff-ff-ff-ff-ff", "ff:ff:ff:ff:ff:ff"}
+
+    def read(self):
+        kwargs = {}
+        if sys.platform == "win32":
+            # 打包后的GUI程序调用命令行时不弹出控制台窗口
+            kwargs["creationflags"] = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        output = subprocess.run(["arp", "-a"], capture_output=True, timeout=5, **kwargs).stdout
+        ips = set()
+        for ip, mac in self.LINE_PATTERN.findall(output.decode("ascii", errors="ignore")):
+            first_octet = int(ip.split(".")[0])
+            # 排除广播和组播地址
+            if mac.lower() in self.BROADCAST_MACS or 224 <= first_octet <= 239:
+                continue
+            ips.add(ip)
+        return ips
+
+
+def default_neighbor_provider():
+    """按当前系统选择邻居表读取方式"""
+    if os.path.exists(ProcNetArpProvider.PATH):
+        return ProcNetArpProvider()
+    return ArpCommandProvider()
+
+
+# Linux邻居表默认上限（gc_thresh3）为1024条，超过后新解析的条目会挤掉旧条目；
+# UDP预热按批发送，每批之后立即读取邻居表，批次大小留有余量
+TOUCH_BATCH = 256
+# 目标超过该地址数（/22）时不做UDP预热：批次太多，预热本身的耗时超过优先探测节省的时间
+MAX_TOUCH_HOSTS = 1024
+
+
+def udp_touch(hosts, port=9, settle=0.5, is_running=None):
+    """
+    向每个地址发送一个空UDP报文（默认discard端口），促使系统对其发起ARP解析，
+    从而在TCP扫描前填充邻居表。settle为发送完成后等待ARP应答的时间（秒）。
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for idx, ip in enumerate(hosts):
+            if is_running and idx % 256 == 0 and not is_running():
+                return
+            try:
+                sock.sendto(b"", (str(ip), port))
+            except OSError:
+                # 发送缓冲区满或地址不可达时忽略，仅影响优先级不影响完整性
+                continue
+    time.sleep(settle)
+
+
+def read_live_neighbors(targets, provider=None):
+    """读取邻居表中位于扫描目标范围内的地址，读取失败时返回空列表"""
+    provider = provider or default_neighbor_provider()
+    try:
+        ips = provider.read()
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return []
+    return sorted((ip for ip in ips if ip in targets), key=lambda ip: socket.inet_aton(ip))
+
+
+def touch_and_read_neighbors(targets, provider=None, batch_size=TOUCH_BATCH, settle=0.3, is_running=None):
+    """
+    分批UDP预热并在每批之后读取邻居表，避免一次发送过多地址使条目在读取前被淘汰；
+    返回邻居表中位于扫描目标范围内的地址（同read_live_neighbors）
+    """
+    found = set()
+    batch = []
+    for ip in targets:
+        batch.append(ip)
+        if len(batch) < batch_size:
+            continue
+        udp_touch(batch, settle=settle, is_running=is_running)
+        found.update(read_live_neighbors(targets, provider))
+        batch = []
+        if is_running and not is_running():
+            return sorted(found, key=socket.inet_aton)
+    if batch:
+        udp_touch(batch, settle=settle, is_running=is_running)
+    found.update(read_live_neighbors(targets, provider))
+    return sorted(found, key=socket.inet_aton)
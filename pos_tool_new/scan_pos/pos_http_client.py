@@ -0,0 +1,93 @@
+import json
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PosHttpClient:
+    """
+    扫描用的kpos HTTP客户端。
+    requests.Session不保证线程安全，每个线程使用自己的Session；各Session挂载同一个HTTPAdapter，
+    共用按主机维护的keep-alive连接池（urllib3连接池是线程安全的），同一设备的多个接口请求复用同一条TCP连接。
+    """
+
+    PROFILE_PATH = "/kpos/webapp/store/fetchCompanyProfile"
+    OS_TYPE_PATH = "/kpos/webapp/os/getOSType"
+
+    def __init__(self, pool_connections=256, pool_maxsize=2, connect_timeout=3, read_timeout=5):
+        """
+        Args:
+            pool_connections: 缓存的主机连接池数量（按主机LRU淘汰）
+            pool_maxsize: 每个主机保留的keep-alive连接数
+            connect_timeout: 建立连接超时（秒）
+            read_timeout: 读取响应超时（秒）
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self._local = threading.local()
+        # 线程结束后其Session随threading.local释放，这里只保留弱引用供close使用
+        self._sessions = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """当前线程的Session"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.add(session)
+        return session
+
+    def _get_json(self, ip, port, path, timeout=None):
+        response = self.session.get(f"http://{ip}:{port}{path}", timeout=timeout or self.timeout)
+        if response.status_code != 200:
+            response.close()
+            return None, f"HTTP {response.status_code}"
+        return response.json(), None
+
+    def probe_company_profile(self, ip, port=22080, timeout=None):
+        """
+        请求公司信息，同时返回kpos是否可达
+
+        Returns:
+            (公司信息或{"error": ...}, 是否可达)；连接失败或超时为不可达，kpos返回错误响应仍算可达
+        """
+        try:
+            data, error = self._get_json(ip, port, self.PROFILE_PATH, timeout)
+            return ({"error": error} if error else data), True
+        except json.JSONDecodeError as e:
+            return {"error": f"JSON decode error: {str(e)}"}, True
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            return {"error": f"Request error: {str(e)}"}, False
+        except requests.exceptions.RequestException as e:
+            return {"error": f"Request error: {str(e)}"}, True
+
+    def fetch_company_profile(self, ip, port=22080, timeout=None):
+        return self.probe_company_profile(ip, port, timeout)[0]
+
+    def get_os_type(self, ip, port=22080, timeout=None):
+        try:
+            data, error = self._get_json(ip, port, self.OS_TYPE_PATH, timeout)
+            return data.get("os", "Unknown") if not error and isinstance(data, dict) else "Unknown"
+        except Exception:
+            return "Unknown"
+
+    def fetch_device_info(self, ip, port=22080):
+        """在同一条keep-alive连接上依次请求公司信息和系统类型，返回(公司信息, 系统类型)"""
+        profile, reachable = self.probe_company_profile(ip, port)
+        # 连接失败时不再请求第二个接口，避免再等一次超时
+        if not reachable:
+            return profile, "Unknown"
+        return profile, self.get_os_type(ip, port)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions), weakref.WeakSet()
+        for session in sessions:
+            session.close()
+        self.adapter.close()
@@ -0,0 +1,235 @@
+import concurrent.futures
+import ipaddress
+import logging
+import socket
+import time
+
+from pos_tool_new.scan_pos.adaptive_controller import AimdController
+from pos_tool_new.scan_pos.neighbor_table import MAX_TOUCH_HOSTS, read_live_neighbors, touch_and_read_neighbors
+from pos_tool_new.scan_pos.pos_http_client import PosHttpClient
+from pos_tool_new.scan_pos.scan_engine import CANCEL_CHECK_INTERVAL, create_scan_engine
+from pos_tool_new.scan_pos.scan_targets import ScanTargets
+
+logger = logging.getLogger(__name__)
+
+SSH_PORT = 22
+LICENSE_DB_PORT = 22108
+# 只用于标注的端口：几乎所有Linux主机都开放SSH，单独开放不作为发现设备的依据
+ANNOTATE_ONLY_PORTS = {SSH_PORT}
+
+
+def _default_log(msg, level="info"):
+    # 'success' 不是标准日志级别，映射为 INFO
+    logger.log(getattr(logging, level.upper(), logging.INFO), msg)
+
+
+class PosScanner:
+    """
+    POS扫描核心（不依赖Qt）：端口扫描 + 设备信息获取。
+    进度和结果通过回调函数输出，界面由ScanPosService转成Qt信号，命令行直接写标准输出。
+    """
+
+    # 各引擎表示并发上限的参数名
+    ENGINE_CONCURRENCY_ARGS = {"thread": "max_workers", "asyncio": "max_in_flight"}
+    # 获取设备信息的并发数
+    FETCH_WORKERS = 20
+
+    def __init__(self, local_ip=None, engine="thread", targets=None, inventory=None, http_client=None,
+                 adaptive=True, neighbor_prefilter=False, udp_touch=False, neighbor_provider=None,
+                 concurrency=None, extra_ports=(), log=None):
+        """
+        Args:
+            local_ip: 本机IP，targets为空时扫描其所在/23网段
+            engine: 扫描引擎名称，见scan_engine.SCAN_ENGINES
+            targets: 扫描目标，ScanTargets或目标字符串
+            inventory: 设备清单（DeviceInventory），为空时不做增量扫描
+            http_client: 共享的PosHttpClient
+            adaptive: 是否启用AIMD自适应并发/超时
+            neighbor_prefilter: 是否先探测邻居表中的在线地址
+            udp_touch: 是否先发UDP报文填充邻居表（隐含neighbor_prefilter）
+            neighbor_provider: 邻居表读取方式，为空时按系统选择
+            concurrency: 并发上限，为空时使用引擎/控制器默认值
+            extra_ports: 与kpos端口在同一轮调度中一起探测的端口，如SSH_PORT、LICENSE_DB_PORT
+            log: 日志函数 log(msg, level)，为空时写入标准logging
+        """
+        self.local_ip = local_ip
+        self.targets = ScanTargets.parse(targets) if isinstance(targets, str) else targets
+        self.inventory = inventory
+        # 共享的keep-alive HTTP客户端，所有设备探测复用连接池
+        self.http = http_client or PosHttpClient()
+        # 自适应并发/超时控制器，adaptive=False时使用固定并发和1秒超时
+        self.controller = None
+        engine_kwargs = {}
+        if adaptive:
+            controller_kwargs = {}
+            if concurrency:
+                controller_kwargs = {"initial_window": min(200, concurrency),
+                                     "min_window": min(16, concurrency), "max_window": concurrency}
+            self.controller = AimdController(**controller_kwargs)
+        elif concurrency and engine in self.ENGINE_CONCURRENCY_ARGS:
+            engine_kwargs[self.ENGINE_CONCURRENCY_ARGS[engine]] = concurrency
+        self.engine = create_scan_engine(engine, controller=self.controller, **engine_kwargs)
+        # 邻居表预扫：先探测ARP表中的在线地址；udp_touch为True时先发UDP报文填充邻居表
+        self.neighbor_prefilter = neighbor_prefilter or udp_touch
+        self.udp_touch = udp_touch
+        self.neighbor_provider = neighbor_provider
+        self.extra_ports = tuple(extra_ports)
+        self.log = log or _default_log
+        self.scan_stats = {}
+
+    def scan(self, port=22080, on_progress=None, on_result=None, is_running=None):
+        """
+        扫描目标网段并获取每台设备的信息
+
+        Args:
+            port: kpos端口
+            on_progress: 进度回调 on_progress(百分比, 当前IP)
+            on_result: 结果回调 on_result(结果字典)，在获取线程中调用，每台设备一次
+            is_running: 返回False时尽快停止扫描
+
+        Returns:
+            全部结果列表
+        """
+        on_progress = on_progress or (lambda percent, ip: None)
+        on_result = on_result or (lambda result: None)
+        is_running = is_running or (lambda: True)
+        targets = self._get_scan_targets()
+        total = len(targets)
+        results = []
+        started = time.perf_counter()
+        if self.controller:
+            self.controller.reset()
+        # 先探测清单中的已知设备和邻居表中的在线地址，尽快展示结果
+        priority_ips = self._get_priority_ips(targets, on_progress, is_running)
+        ports = list(dict.fromkeys((port, *self.extra_ports)))
+        if priority_ips:
+            results += self._scan_and_fetch(priority_ips, ports, port, on_progress, on_result, is_running,
+                                            progress_total=total)
+        # 再在后台扫描网段内其余地址
+        priority_set = set(priority_ips)
+        remaining = (ip for ip in targets if str(ip) not in priority_set)
+        if is_running() and total > len(priority_ips):
+            results += self._scan_and_fetch(remaining, ports, port, on_progress, on_result, is_running,
+                                            total=total - len(priority_ips),
+                                            progress_offset=len(priority_ips), progress_total=total)
+        self._update_scan_stats(total, len(results), time.perf_counter() - started)
+        return results
+
+    def _get_priority_ips(self, targets, on_progress, is_running):
+        known_ips = self.inventory.known_ips(targets) if self.inventory else []
+        neighbor_ips = []
+        if self.neighbor_prefilter:
+            if self.udp_touch and len(targets) <= MAX_TOUCH_HOSTS:
+                on_progress(0, "正在预热邻居表...")
+                neighbor_ips = touch_and_read_neighbors(targets, self.neighbor_provider, is_running=is_running)
+            else:
+                if self.udp_touch:
+                    self.log(f"扫描目标超过 {MAX_TOUCH_HOSTS} 个地址，跳过UDP预热", level="warning")
+                neighbor_ips = read_live_neighbors(targets, self.neighbor_provider)
+            self.log(f"邻居表中发现 {len(neighbor_ips)} 个在线地址，优先探测")
+        return list(dict.fromkeys(known_ips + neighbor_ips))
+
+    def _update_scan_stats(self, total, devices, elapsed):
+        self.scan_stats = {
+            "engine": self.engine.name,
+            "hosts": total,
+            "devices": devices,
+            "elapsed": round(elapsed, 3),
+            "controller": self.controller.stats() if self.controller else None,
+        }
+        summary = f"扫描统计: {self.engine.name}引擎, {total} 个地址, {devices} 台设备, 耗时 {elapsed:.1f}s"
+        if self.controller:
+            c = self.scan_stats["controller"]
+            summary += (f", 并发 {c['window']}(峰值 {c['peak_window']}, 增 {c['increases']}/减 {c['decreases']}), "
+                        f"单次超时 {c['timeout'] * 1000:.0f}ms, 平滑RTT {c['srtt_ms']}ms, "
+                        f"探测超时 {c['outcomes']['timeout']} 次 / 本机错误 {c['outcomes']['error']} 次")
+        self.log(summary)
+
+    def _get_local_network(self):
+        local_ip = self.local_ip if self.local_ip else socket.gethostbyname(socket.gethostname())
+        return ipaddress.IPv4Network(f"{local_ip}/23", strict=False)
+
+    def _get_scan_targets(self):
+        if self.targets:
+            return self.targets
+        return ScanTargets.parse(str(self._get_local_network()))
+
+    @staticmethod
+    def _extract_required_info(api_response):
+        try:
+            company = api_response.get("company", {})
+            result = {
+                "merchantId": company.get("merchantId"),
+                "name": company.get("name"),
+                "version": company.get("appInfo", {}).get("version"),
+            }
+            return {k: v for k, v in result.items() if v is not None} or {"error": "No required fields"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _scan_and_fetch(self, hosts, ports, port, on_progress, on_result, is_running, total=None,
+                        progress_offset=0, progress_total=None):
+        """端口扫描与获取设备信息重叠进行：某主机的端口探测完成即提交到获取线程池，结果随即通过on_result输出"""
+        total = len(hosts) if total is None else total
+        progress_total = progress_total or total
+
+        def on_sweep_progress(done, _, ip):
+            # done按探测次数计数，换算成主机进度
+            on_progress((progress_offset * len(ports) + done) * 100 // (progress_total * len(ports)), ip)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.FETCH_WORKERS)
+        pending = set()
+
+        def on_host(ip, open_ports):
+            if set(open_ports) <= ANNOTATE_ONLY_PORTS or not is_running():
+                return
+            pending.add(executor.submit(self._fetch_device, ip, open_ports, ports, port, on_result, is_running))
+
+        results = []
+        try:
+            self.engine.sweep_ports(hosts, ports, total, on_sweep_progress, is_running, on_host)
+            while pending and is_running():
+                done, _ = concurrent.futures.wait(pending, timeout=CANCEL_CHECK_INTERVAL,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    res = future.result()
+                    if res:
+                        results.append(res)
+        finally:
+            # 停止扫描时不等待进行中的HTTP请求，其结果在_fetch_device中被丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def _fetch_device(self, ip, open_ports, ports, port, on_result, is_running):
+        if not is_running():
+            return None
+        if port in open_ports:
+            full_data, device_type = self.http.fetch_device_info(ip, port)
+            simple_data = self._extract_required_info(full_data)
+        else:
+            # kpos未响应但其它服务端口开放（如只剩数据库），不再发HTTP请求
+            device_type, simple_data = "Unknown", {"error": f"kpos端口{port}未开放"}
+        result = {
+            "ip": ip,
+            "merchantId": simple_data.get("merchantId", ""),
+            "name": simple_data.get("name", ""),
+            "version": simple_data.get("version", ""),
+            "type": device_type,
+            "status": "success" if "error" not in simple_data else "error",
+            "error": simple_data.get("error", ""),
+            # 本轮探测的每个端口是否开放
+            "open_ports": {p: p in open_ports for p in ports},
+        }
+        if self.inventory:
+            try:
+                if result["status"] == "success":
+                    self.inventory.record(result)
+                else:
+                    self.inventory.record_ports(ip, result["open_ports"])
+            except Exception as e:
+                self.log(f"写入设备清单失败: {e}", level="warning")
+        if not is_running():
+            return None
+        on_result(result)
+        return result
@@ -0,0 +1,53 @@
+"""
+扫描引擎基准测试：在回环网段上启动若干假设备（fake_pos_server），对比线程池引擎与asyncio引擎的端口扫描耗时。
+只测TCP连接扫描本身；包含HTTP探测的整体扫描基准见scan_service_benchmark。
+
+用法（Linux下整个127.0.0.0/8都指向回环，可绑定任意127.x地址）:
+    python -m pos_tool_new.scan_pos.scan_benchmark --network 127.0.0.0/22 --listeners 50
+"""
+import argparse
+import ipaddress
+import time
+
+from pos_tool_new.scan_pos.fake_pos_server import FakePosFleet, pick_loopback_ips
+from pos_tool_new.scan_pos.scan_engine import SCAN_ENGINES, create_scan_engine
+
+
+def run_engine(name, network, port, **engine_kwargs):
+    """使用指定引擎扫描一次，返回(开放IP列表, 耗时秒)"""
+    engine = create_scan_engine(name, **engine_kwargs)
+    hosts = network.hosts()
+    total = network.num_addresses - 2 if network.prefixlen < 31 else network.num_addresses
+    start = time.perf_counter()
+    open_ips = engine.sweep(hosts, port, total)
+    return open_ips, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POS扫描引擎基准测试（回环监听）")
+    parser.add_argument("--network", default="127.0.0.0/22", help="扫描的回环网段")
+    parser.add_argument("--listeners", type=int, default=50, help="监听端口的地址数量")
+    parser.add_argument("--port", type=int, default=22080)
+    parser.add_argument("--engines", nargs="+", default=list(SCAN_ENGINES), choices=list(SCAN_ENGINES))
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    network = ipaddress.IPv4Network(args.network, strict=False)
+    ips = pick_loopback_ips(network, args.listeners, args.port)
+    if not ips:
+        print(f"无法在 {network} 上绑定监听端口 {args.port}")
+        return 1
+    expected = set(ips)
+    print(f"网段 {network}，共 {network.num_addresses} 个地址，监听 {len(ips)} 个")
+    with FakePosFleet(ips, port=args.port):
+        for name in args.engines:
+            for round_no in range(1, args.rounds + 1):
+                open_ips, elapsed = run_engine(name, network, args.port)
+                missed = len(expected - set(open_ips))
+                print(f"[{name:>7}] 第{round_no}轮: {elapsed:.3f}s, "
+                      f"{network.num_addresses / elapsed:.0f} 主机/秒, 发现 {len(open_ips)} 个, 漏扫 {missed} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,313 @@
+import asyncio
+import concurrent.futures
+import socket
+import threading
+import time
+
+
+def _fd_limit(default=1024):
+    """获取当前进程可打开的文件描述符上限，无法获取时返回默认值"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        return soft if soft > 0 else default
+    except (ImportError, ValueError, OSError):
+        return default
+
+
+# 取消扫描后最长多久停止提交并返回（秒）
+CANCEL_CHECK_INTERVAL = 0.1
+
+
+def bounded_submit(executor, fn, items, max_pending, is_running=None, poll_interval=CANCEL_CHECK_INTERVAL):
+    """
+    滑动窗口提交任务：队列中和执行中的任务不超过max_pending个，完成一个再从items惰性取下一个，
+    大网段扫描时内存占用恒定。逐个产出(item, future)。
+
+    is_running返回False时停止提交并取消所有尚未开始的任务，最长poll_interval秒内返回；
+    已在执行的任务无法中断，调用方应以executor.shutdown(wait=False)结束而不是等待它们。
+    """
+    items = iter(items)
+    pending = {}
+
+    def fill():
+        for item in items:
+            pending[executor.submit(fn, item)] = item
+            if len(pending) >= max_pending:
+                return
+
+    fill()
+    while pending:
+        done, _ = concurrent.futures.wait(pending, timeout=poll_interval,
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+        if is_running and not is_running():
+            for future in pending:
+                future.cancel()
+            return
+        for future in done:
+            yield pending.pop(future), future
+        fill()
+
+
+class _HostTracker:
+    """统计每台主机已完成的端口探测，全部完成时把开放端口交给on_host回调"""
+
+    def __init__(self, port_count, on_host=None):
+        self.port_count = port_count
+        self.on_host = on_host
+        self._probed = {}  # IP -> [已完成探测数, [开放端口]]，只保存探测未完成的主机
+
+    def probed(self, ip, port, is_open):
+        if not self.on_host:
+            return
+        state = self._probed.setdefault(ip, [0, []])
+        state[0] += 1
+        if is_open:
+            state[1].append(port)
+        if state[0] == self.port_count:
+            del self._probed[ip]
+            if state[1]:
+                self.on_host(ip, sorted(state[1]))
+
+
+class ThreadPoolScanEngine:
+    """线程池扫描引擎：每个主机占用一个线程执行阻塞connect"""
+    name = "thread"
+
+    # 有控制器时线程数随窗口上限放大，但不超过该值
+    MAX_THREADS = 512
+
+    # 已提交（排队+执行中）的探测数与线程数之比
+    PENDING_FACTOR = 2
+
+    def __init__(self, max_workers=200, timeout=1, controller=None):
+        self.controller = controller
+        if controller:
+            # 并发受线程数限制，控制器窗口不超过线程数
+            controller.limit_window(self.MAX_THREADS)
+            max_workers = controller.max_window
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._cancelled = threading.Event()
+
+    def _acquire(self):
+        # 有控制器时，在途探测数受控制器窗口限制；取消扫描时立即放行
+        if not self.controller:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._active < self.controller.window or self._cancelled.is_set())
+            self._active += 1
+
+    def _release(self):
+        if not self.controller:
+            return
+        with self._cond:
+            self._active -= 1
+            self._cond.notify(max(1, self.controller.window - self._active))
+
+    def _cancel(self):
+        self._cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _scan_port(self, ip, port):
+        if self._cancelled.is_set():
+            return None
+        self._acquire()
+        if self._cancelled.is_set():
+            self._release()
+            return None
+        timeout = self.controller.timeout if self.controller else self.timeout
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((str(ip), port), timeout):
+                outcome, rtt, err_no = "open", time.perf_counter() - start, None
+        except ConnectionRefusedError:
+            outcome, rtt, err_no = "refused", time.perf_counter() - start, None
+        except socket.timeout:
+            outcome, rtt, err_no = "timeout", None, None
+        except OSError as e:
+            outcome, rtt, err_no = "error", None, e.errno
+        finally:
+            self._release()
+        if self.controller:
+            self.controller.record(outcome, rtt, err_no)
+        return ip if outcome == "open" else None
+
+    def sweep_ports(self, hosts, ports, total, on_progress=None, is_running=None, on_host=None):
+        """
+        一次调度中探测hosts的多个端口，所有(IP, 端口)共用同一个并发预算
+
+        Args:
+            total: 主机数；进度按探测次数(total * len(ports))计算
+            on_host: 某主机的所有端口探测完成且有开放端口时立即调用 on_host(IP, [开放端口])，
+                     调用方可以不等整个网段扫完就开始获取设备信息；回调应尽快返回
+
+        Returns:
+            {IP: [开放端口]}，按发现顺序
+        """
+        ports = list(ports)
+        total_probes = total * len(ports)
+        open_ports = {}
+        tracker = _HostTracker(len(ports), on_host)
+        self._cancelled.clear()
+        probes = ((str(ip), port) for ip in hosts for port in ports)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            completed = bounded_submit(executor, lambda probe: self._scan_port(*probe), probes,
+                                       self.max_workers * self.PENDING_FACTOR, is_running)
+            for idx, ((ip, port), future) in enumerate(completed):
+                if on_progress:
+                    on_progress(idx + 1, total_probes, ip)
+                is_open = bool(future.result())
+                if is_open:
+                    open_ports.setdefault(ip, []).append(port)
+                tracker.probed(ip, port, is_open)
+        finally:
+            # 取消时不等待执行中的connect，它们在单次超时内自行结束
+            self._cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return {ip: sorted(found) for ip, found in open_ports.items()}
+
+    def sweep(self, hosts, port, total, on_progress=None, is_running=None):
+        """扫描hosts中开放port的主机，返回开放的IP列表"""
+        return list(self.sweep_ports(hosts, [port], total, on_progress, is_running))
+
+
+class _AsyncWindowGate:
+    """可随控制器窗口动态伸缩的异步并发闸门"""
+
+    def __init__(self, controller, hard_limit):
+        self.controller = controller
+        self.hard_limit = hard_limit
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    def _limit(self):
+        return min(self.controller.window, self.hard_limit)
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self._limit())
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify(max(1, self._limit() - self.active))
+
+
+class AsyncioScanEngine:
+    """asyncio扫描引擎：非阻塞connect，固定数量的协程共享同一个主机迭代器，在途探测数有上限"""
+    name = "asyncio"
+
+    # 为日志、数据库连接等保留的文件描述符
+    RESERVED_FDS = 64
+
+    def __init__(self, max_in_flight=2000, timeout=1, controller=None):
+        self.controller = controller
+        if controller:
+            max_in_flight = controller.max_window
+        self.max_in_flight = max(1, min(max_in_flight, _fd_limit() - self.RESERVED_FDS))
+        if controller:
+            controller.limit_window(self.max_in_flight)
+        self.timeout = timeout
+
+    @staticmethod
+    async def _timed_connect(loop, sock, address):
+        """
+        connect并返回(结果, RTT)；结果为open或refused，其余错误照常抛出
+
+        在connect协程内部计时：wait_for把协程包装成任务，任务要等事件循环调度到才开始connect，
+        在外面计时会把排队时间算进RTT，并发高时远大于真实RTT，使控制器误判拥塞而缩小窗口
+        """
+        start = time.perf_counter()
+        try:
+            await loop.sock_connect(sock, address)
+        except ConnectionRefusedError:
+            return "refused", time.perf_counter() - start
+        return "open", time.perf_counter() - start
+
+    async def _probe(self, ip, port):
+        loop = asyncio.get_running_loop()
+        timeout = self.controller.timeout if self.controller else self.timeout
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            outcome, rtt = await asyncio.wait_for(self._timed_connect(loop, sock, (ip, port)), timeout)
+            err_no = None
+        except asyncio.TimeoutError:
+            outcome, rtt, err_no = "timeout", None, None
+        except OSError as e:
+            outcome, rtt, err_no = "error", None, e.errno
+        finally:
+            sock.close()
+        if self.controller:
+            self.controller.record(outcome, rtt, err_no)
+        return outcome == "open"
+
+    async def _sweep(self, hosts, ports, total, on_progress, is_running, on_host):
+        open_ports = {}
+        tracker = _HostTracker(len(ports), on_host)
+        probe_iter = ((str(ip), port) for ip in hosts for port in ports)
+        total_probes = total * len(ports)
+        done_count = 0
+        gate = _AsyncWindowGate(self.controller, self.max_in_flight) if self.controller else None
+
+        async def probe_worker():
+            nonlocal done_count
+            for ip, port in probe_iter:
+                if gate:
+                    async with gate:
+                        is_open = await self._probe(ip, port)
+                else:
+                    is_open = await self._probe(ip, port)
+                if is_open:
+                    open_ports.setdefault(ip, []).append(port)
+                tracker.probed(ip, port, is_open)
+                done_count += 1
+                if on_progress:
+                    on_progress(done_count, total_probes, ip)
+
+        workers = [asyncio.ensure_future(probe_worker())
+                   for _ in range(min(self.max_in_flight, max(total_probes, 1)))]
+        pending = set(workers)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=CANCEL_CHECK_INTERVAL)
+            if pending and is_running and not is_running():
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+        for task in workers:
+            if not task.cancelled() and task.exception():
+                raise task.exception()
+        return {ip: sorted(found) for ip, found in open_ports.items()}
+
+    def sweep_ports(self, hosts, ports, total, on_progress=None, is_running=None, on_host=None):
+        """
+        一次调度中探测hosts的多个端口，返回{IP: [开放端口]}（在当前线程中运行独立事件循环）
+
+        on_host见ThreadPoolScanEngine.sweep_ports，在事件循环中调用，不能阻塞
+        """
+        return asyncio.run(self._sweep(hosts, list(ports), total, on_progress, is_running, on_host))
+
+    def sweep(self, hosts, port, total, on_progress=None, is_running=None):
+        """扫描hosts中开放port的主机，返回开放的IP列表"""
+        return list(self.sweep_ports(hosts, [port], total, on_progress, is_running))
+
+
+SCAN_ENGINES = {
+    ThreadPoolScanEngine.name: ThreadPoolScanEngine,
+    AsyncioScanEngine.name: AsyncioScanEngine,
+}
+
+
+def create_scan_engine(name="thread", **kwargs):
+    """按名称创建扫描引擎"""
+    try:
+        return SCAN_ENGINES[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"未知的扫描引擎: {name}")
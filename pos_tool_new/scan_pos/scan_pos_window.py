@@ -1,10 +1,20 @@
 from PyQt6.QtCore import Qt, QUrl, QTimer
-from PyQt6.QtGui import QColor, QBrush, QDesktopServices
-from PyQt6.QtWidgets import (QTableWidget, QTableWidgetItem, QPushButton, QVBoxLayout,
-                             QLabel, QProgressBar, QLineEdit, QHBoxLayout, QHeaderView, QWidget, QInputDialog)
+from PyQt6.QtGui import QColor, QDesktopServices, QPalette
+from PyQt6.QtWidgets import (QTableView, QAbstractItemView, QPushButton, QVBoxLayout,
+                             QLabel, QProgressBar, QLineEdit, QHBoxLayout, QHeaderView, QInputDialog, QComboBox,
+                             QMessageBox, QCheckBox, QApplication)
 
 from pos_tool_new.main import BaseTabWidget
 from .scan_pos_service import ScanPosService
+from .scan_targets import ScanTargets
+from .device_inventory import DeviceInventory
+from .pos_scanner import SSH_PORT, LICENSE_DB_PORT
+from .scan_signal_batcher import ScanSignalBatcher
+from .pos_http_client import PosHttpClient
+from .fleet_monitor import FleetMonitor, EVENT_APPEARED, EVENT_OFFLINE, EVENT_VERSION_CHANGED
+from pos_tool_new.work_threads import FleetMonitorThread
+from .scan_result_model import ScanResultTableModel, ScanResultFilterProxyModel, ActionButtonDelegate
+import ipaddress
 import socket
 
 
@@ -12,15 +22,30 @@ class ScanPosTabWidget(BaseTabWidget):
     def __init__(self, backend, parent=None):
         super().__init__('扫描POS', parent)
         self.backend = backend
-        self.local_ip = None
+        self.scan_targets = None
+        self._last_targets_text = ''
         self.service = None
         self._results, self._displayed_results = [], []
         self._total_scan_count = self._scanned_count = self._loaded_count = 0
         self._scan_finished = False
         self.row_colors = [QColor(255, 255, 255), QColor(240, 240, 240)]
+        self.inventory = self._open_inventory()
+        self._batcher = None
+        self._monitor_thread = None
+        # 详情查询不依赖扫描服务：后台巡检加入的设备在首次扫描之前也能查看详情
+        self._http = PosHttpClient(pool_maxsize=1)
         self._init_ui()
 
-    def _select_local_ip(self):
+    def _open_inventory(self):
+        # 打开本地设备清单，失败时退化为全量扫描
+        try:
+            return DeviceInventory.shared()
+        except Exception as e:
+            self.backend.log(f"设备清单不可用，将进行全量扫描: {e}", level="warning")
+            return None
+
+    @staticmethod
+    def _get_local_ips():
         # 获取所有本地IPv4地址
         ips = set()
         hostname = socket.gethostname()
@@ -28,15 +53,30 @@ class ScanPosTabWidget(BaseTabWidget):
             ip = info[4][0]
             if "." in ip and not ip.startswith("127."):
                 ips.add(ip)
-        ips = list(ips)
-        if len(ips) == 1:
-            return ips[0]
-        # 多IP弹窗选择
-        ip, ok = QInputDialog.getItem(self, "选择IP网段", "检测到本机多个IP网段，请选择:", ips, 0, False)
-        if ok and ip:
-            return ip
+        return sorted(ips)
+
+    def _select_scan_targets(self):
+        # 候选项：上次使用的目标、每个本地IP所在的/23网段、全部本地网段
+        local_networks = [str(ipaddress.IPv4Network(f"{ip}/23", strict=False)) for ip in self._get_local_ips()]
+        items = list(dict.fromkeys(local_networks))
+        if len(items) > 1:
+            items.append(", ".join(items))
+        if self._last_targets_text and self._last_targets_text not in items:
+            items.insert(0, self._last_targets_text)
+        text, ok = QInputDialog.getItem(
+            self, "选择扫描目标",
+            "请选择或输入扫描目标（支持网段/区间/单个IP，逗号分隔）:\n例如: 10.24.0.0/20, 192.168.252.0/23, 10.0.10.5-80",
+            items, 0, True)
         # 用户取消时返回None，阻止刷新
-        return None
+        if not ok or not text.strip():
+            return None
+        try:
+            targets = ScanTargets.parse(text)
+        except ValueError as e:
+            QMessageBox.warning(self, "参数错误", str(e))
+            return None
+        self._last_targets_text = text.strip()
+        return targets
 
     def _init_ui(self):
         self._create_ui()
@@ -44,12 +84,36 @@ class ScanPosTabWidget(BaseTabWidget):
         self._setup_layouts()
 
     def _create_ui(self):
-        self.table = QTableWidget(0, 6)
-        self.table.setHorizontalHeaderLabels(['IP', '设备类型', '商家ID', '名称', '版本', '操作'])
+        # 结果保存在模型中，过滤/排序由代理完成，操作按钮由委托绘制
+        self.model = ScanResultTableModel(self)
+        self.proxy = ScanResultFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.action_delegate = ActionButtonDelegate(self)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setItemDelegateForColumn(ScanResultTableModel.ACTION_COLUMN, self.action_delegate)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setAlternatingRowColors(False)  # 关闭自动隔行色
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setMouseTracking(True)
+        # 隔行色由视图按显示顺序绘制，排序/过滤后无需重新着色
+        palette = self.table.palette()
+        palette.setColor(QPalette.ColorRole.Base, self.row_colors[0])
+        palette.setColor(QPalette.ColorRole.AlternateBase, self.row_colors[1])
+        self.table.setPalette(palette)
+        self.table.setAlternatingRowColors(True)
 
         self.refresh_btn = QPushButton('扫描/刷新')
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItem('线程池', 'thread')
+        self.engine_combo.addItem('异步(大网段)', 'asyncio')
+        self.engine_combo.setToolTip('扫描引擎：大网段(/20~/16)建议使用异步引擎')
+        self.neighbor_check = QCheckBox('ARP优先')
+        self.neighbor_check.setToolTip('先探测系统邻居表(ARP表)中的在线地址，再扫描其余地址')
+        self.udp_touch_check = QCheckBox('UDP预热')
+        self.udp_touch_check.setToolTip('扫描前分批向各地址发送UDP报文以填充邻居表，适合首次扫描的网段（最多/22）')
+        self.monitor_check = QCheckBox('后台监控')
+        self.monitor_check.setToolTip('定期复查已知设备的在线状态和版本，只提示上线/离线/版本变化，不重复扫描网段')
         self.progress_bar = QProgressBar()
         self.progress_bar.setMinimum(0)
         self.progress_bar.setMaximum(100)
@@ -71,6 +135,8 @@ class ScanPosTabWidget(BaseTabWidget):
 
     def _bind_signals(self):
         self.refresh_btn.clicked.connect(self.start_scan)
+        self.monitor_check.toggled.connect(self.toggle_monitor)
+        QApplication.instance().aboutToQuit.connect(self.stop_monitor)
         self.search_btn.clicked.connect(self.on_search)
         self.clear_search_btn.clicked.connect(self.clear_search)
         # 支持回车触发搜索
@@ -78,8 +144,13 @@ class ScanPosTabWidget(BaseTabWidget):
         self.search_name_edit.returnPressed.connect(self.on_search)
         self.search_ip_edit.returnPressed.connect(self.on_search)
         self.search_version_edit.returnPressed.connect(self.on_search)  # 新增
+        # 索引查询足够快，输入时即时过滤
+        for edit in (self.search_id_edit, self.search_name_edit, self.search_ip_edit, self.search_version_edit):
+            edit.textChanged.connect(self.on_search)
 
-        self.table.horizontalHeader().sectionClicked.connect(self.on_section_clicked)
+        self.action_delegate.open_clicked.connect(self.open_pos_page)
+        self.action_delegate.detail_clicked.connect(self.show_detail_dialog_by_result)
+        self.table.entered.connect(self.on_table_entered)
 
     def _setup_layouts(self):
         search_layout = QHBoxLayout()
@@ -92,6 +163,11 @@ class ScanPosTabWidget(BaseTabWidget):
 
         control_layout = QHBoxLayout()
         control_layout.addWidget(self.refresh_btn)
+        control_layout.addWidget(QLabel('引擎:'))
+        control_layout.addWidget(self.engine_combo)
+        control_layout.addWidget(self.neighbor_check)
+        control_layout.addWidget(self.udp_touch_check)
+        control_layout.addWidget(self.monitor_check)
         control_layout.addLayout(search_layout)
 
         progress_layout = QHBoxLayout()
@@ -105,13 +181,21 @@ class ScanPosTabWidget(BaseTabWidget):
         self.layout.addLayout(main_layout)
 
     def start_scan(self):
-        self.local_ip = self._select_local_ip()  # 点击扫描时选择IP
-        if not self.local_ip:
+        self.scan_targets = self._select_scan_targets()  # 点击扫描时选择扫描目标
+        if not self.scan_targets:
             return  # 用户取消则不刷新
-        self.service = ScanPosService(local_ip=self.local_ip)  # 用选中的IP初始化Service
+        # 用选中的扫描目标和扫描引擎初始化Service
+        self.service = ScanPosService(targets=self.scan_targets, engine=self.engine_combo.currentData(),
+                                      inventory=self.inventory,
+                                      neighbor_prefilter=self.neighbor_check.isChecked(),
+                                      udp_touch=self.udp_touch_check.isChecked(),
+                                      # 同一轮探测SSH和License数据库端口，供Linux/License页直接使用
+                                      extra_ports=(SSH_PORT, LICENSE_DB_PORT))
+        self.backend.log(f"开始扫描: {self.scan_targets}（共 {len(self.scan_targets)} 个地址）")
         self.refresh_btn.setEnabled(False)
         self.table.setSortingEnabled(False)
-        self.table.setRowCount(0)
+        self.proxy.sort(-1)
+        self.model.set_results([])
         self._results, self._displayed_results = [], []
         self._total_scan_count = self._scanned_count = self._loaded_count = 0
         self._scan_finished = False
@@ -123,11 +207,14 @@ class ScanPosTabWidget(BaseTabWidget):
 
         worker = self.service.start_scan()
         if worker:
-            worker.scan_progress.connect(self.on_scan_progress)
-            worker.scan_result.connect(self.on_scan_result)
+            # 进度和结果按50ms时间片合批投递，避免大网段扫描时逐条刷新界面
+            self._batcher = ScanSignalBatcher(worker, parent=self)
+            self._batcher.progress_batched.connect(self.on_scan_progress)
+            self._batcher.results_batched.connect(self.on_scan_results)
             worker.scan_finished.connect(self.on_scan_finished)
+            worker.scan_stats.connect(self.on_scan_stats)
+            worker.finished.connect(self.on_scan_worker_finished)
             worker.start()
-        self.update_row_colors()
 
     def on_scan_progress(self, percent, ip):
         if not self._scan_finished:
@@ -135,18 +222,27 @@ class ScanPosTabWidget(BaseTabWidget):
             self.progress_bar.setValue(int(percent))
             self.progress_label.setText(f'正在扫描: {ip} ({percent}%)')
 
-    def on_scan_result(self, result):
-        self._results.append(result)
-        self._scanned_count += 1
-        self._loaded_count += 1
-        self._add_row_to_table(result)
-        if len(self._results) > 0:
-            load_percent = min(100, int((self._loaded_count / len(self._results)) * 100))
-            self.progress_bar.setValue(load_percent)
+    def on_scan_results(self, results):
+        self._results.extend(results)
+        self._scanned_count += len(results)
+        self._loaded_count += len(results)
+        self.model.append_results(results)
+        if self._monitor_thread:
+            for result in results:
+                if result.get('status') == 'success':
+                    self._monitor_thread.monitor.watch(result)
+        self.table.scrollToBottom()
         self.progress_label.setText(f'正在加载第 {self._loaded_count} 条...')
-        self.update_row_colors()
+
+    def _stop_batcher(self):
+        # 先投递合批缓冲区中剩余的结果，再停止定时器
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher.deleteLater()
+            self._batcher = None
 
     def on_scan_finished(self, results):
+        self._stop_batcher()
         self._scan_finished = True
         self._results = results
         # 设置进度条为100%
@@ -155,86 +251,77 @@ class ScanPosTabWidget(BaseTabWidget):
         QTimer.singleShot(2000, self.progress_bar.hide)
         self.refresh_btn.setEnabled(True)  # 扫描结束后恢复按钮可用
         self.table.setSortingEnabled(True)
-        self.update_row_colors()
-
-    def _add_row_to_table(self, result):
-        self.table.insertRow(self.table.rowCount())
-        row = self.table.rowCount() - 1
-        bg_color = self.row_colors[row % 2]
-        self._set_table_row_items(row, result, bg_color)
-        if all(self.table.item(row, i).text() == '——' for i in [2, 3, 4]):
-            unavailable_label = QLabel('POS已离线')
-            unavailable_label.setStyleSheet('color: red; font-weight: bold;')
-            unavailable_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setCellWidget(row, 5, unavailable_label)
-        else:
-            self._create_row_buttons(row, result)
-        self.table.scrollToBottom()
-        self.update_row_colors()
-
-    def _set_table_row_items(self, row, result, bg_color):
-        def get_value(key):
-            return result.get(key, '')
-        for col, key in enumerate(['ip', 'type', 'merchantId', 'name', 'version']):
-            value = get_value(key)
-            if key == 'merchantId':
-                name_val = get_value('name')
-                version_val = get_value('version')
-                if not value and name_val and version_val:
-                    value = 'Free Trials'
-            if not value:
-                value = '——'
-            item = QTableWidgetItem(str(value))
-            item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            item.setBackground(QBrush(bg_color))
-            self.table.setItem(row, col, item)
-
-    def _create_row_buttons(self, row, result):
-        def get_value(key):
-            return result.get(key, '')
-        btn_open = QPushButton('打开')
-        btn_open.setFixedWidth(48)
-        btn_open.setFixedHeight(22)
-        btn_open.setStyleSheet(
-            'QPushButton { background-color: #2196F3; color: white; border: none; border-radius: 3px; padding: 2px 8px; font-size: 11px; } '
-            'QPushButton:hover { background-color: #0b7dda; }'
-        )
-        btn_open.clicked.connect(lambda _, ip=get_value('ip'): QDesktopServices.openUrl(QUrl(f'http://{ip}:22080')))
-
-        btn_detail = QPushButton('详情')
-        btn_detail.setFixedWidth(48)
-        btn_detail.setFixedHeight(22)
-        btn_detail.setStyleSheet(
-            'QPushButton { background-color: #4CAF50; color: white; border: none; border-radius: 3px; padding: 2px 8px; font-size: 11px; } '
-            'QPushButton:hover { background-color: #357a38; }'
-        )
-        btn_detail.clicked.connect(lambda _, btn=btn_detail: self.show_detail_dialog_by_widget(btn))
-
-        btn_widget = QWidget()
-        btn_layout = QHBoxLayout(btn_widget)
-        btn_layout.addWidget(btn_open)
-        btn_layout.addWidget(btn_detail)
-        btn_layout.setContentsMargins(0, 0, 0, 0)
-        btn_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.table.setCellWidget(row, 5, btn_widget)
-
-    def show_detail_dialog_by_widget(self, widget):
-        # 获取按钮所在的行号
-        index = self.table.indexAt(widget.parent().pos())
-        row = index.row()
-        if row < 0:
+
+    def on_scan_worker_finished(self, success, message):
+        # 扫描出错时不会发出scan_finished，这里停止合批并恢复界面
+        if success or self._scan_finished:
+            return
+        self._stop_batcher()
+        self._scan_finished = True
+        self.backend.log(f"扫描{message}", level="error")
+        self.progress_label.setText(f'扫描失败，已加载 {self._loaded_count} 台设备')
+        QTimer.singleShot(2000, self.progress_bar.hide)
+        self.refresh_btn.setEnabled(True)
+        self.table.setSortingEnabled(True)
+
+    def on_scan_stats(self, stats):
+        # 在进度标签的提示中展示扫描统计，便于解释耗时
+        lines = [f"引擎: {stats['engine']}", f"地址数: {stats['hosts']}", f"设备数: {stats['devices']}",
+                 f"耗时: {stats['elapsed']}s"]
+        controller = stats.get('controller')
+        if controller:
+            lines += [f"最终并发: {controller['window']} (峰值 {controller['peak_window']})",
+                      f"单次超时: {controller['timeout'] * 1000:.0f}ms",
+                      f"平滑RTT: {controller['srtt_ms']}ms / 最小RTT: {controller['min_rtt_ms']}ms",
+                      f"探测结果: {controller['outcomes']}"]
+            lines += [f"  {h['t']}s 并发→{h['window']} 超时→{h['timeout']}s ({h['reason']})"
+                      for h in controller['history'][-10:]]
+        self.progress_label.setToolTip('\n'.join(lines))
+
+    def toggle_monitor(self, checked):
+        if not checked:
+            self.stop_monitor()
             return
-        ip = self.table.item(row, 0).text()
-        # 在self._results中查找对应ip的数据
-        for result in self._results:
-            if str(result.get('ip', '')) == ip:
-                self.show_detail_dialog_by_result(result)
-                return
+        monitor = FleetMonitor(inventory=self.inventory, log=self.backend.log)
+        # 当前表格中的设备也加入巡检
+        for result in self.model.results():
+            if result.get('status') == 'success':
+                monitor.watch(result)
+        self._monitor_thread = FleetMonitorThread(monitor)
+        self._monitor_thread.device_event.connect(self.on_device_event)
+        self._monitor_thread.start()
+
+    def stop_monitor(self):
+        if self._monitor_thread:
+            self._monitor_thread.stop()
+            self._monitor_thread.wait(1000)
+            self._monitor_thread = None
+
+    def on_device_event(self, event):
+        result = event['result']
+        name = result.get('name') or result.get('merchantId') or ''
+        if event['event'] == EVENT_OFFLINE:
+            self.backend.log(f"设备离线: {event['ip']} {name}", level="warning")
+        elif event['event'] == EVENT_APPEARED:
+            self.backend.log(f"设备上线: {event['ip']} {name}", level="success")
+        elif event['event'] == EVENT_VERSION_CHANGED:
+            self.backend.log(f"版本变化: {event['ip']} {name} {event.get('old_version')} → {result.get('version')}")
+        self.model.update_result({**result, 'status': 'success' if event['online'] else 'offline'})
+
+    @staticmethod
+    def open_pos_page(result):
+        QDesktopServices.openUrl(QUrl(f"http://{result.get('ip', '')}:22080"))
+
+    def on_table_entered(self, index):
+        # 鼠标离开操作列时清除按钮悬停效果
+        if index.column() != ScanResultTableModel.ACTION_COLUMN:
+            self.action_delegate.clear_hover()
+            self.table.viewport().update()
 
     def show_detail_dialog_by_result(self, result):
         from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QScrollArea, QWidget
         ip = result.get('ip', '')
-        full_data = self.service.fetch_company_profile(ip)
+        full_data = self._http.fetch_company_profile(ip, timeout=5)
         detail_data = self._filter_none_and_exclude(full_data)
         dialog = QDialog(self)
         dialog.setWindowTitle(f"详情 - {ip}")
@@ -308,46 +395,19 @@ class ScanPosTabWidget(BaseTabWidget):
             layout.addWidget(value_label)
 
     def on_search(self):
-        ip_text = self.search_ip_edit.text().strip().lower()
-        id_text = self.search_id_edit.text().strip().lower()
-        name_text = self.search_name_edit.text().strip().lower()
-        version_text = self.search_version_edit.text().strip().lower()  # 新增
-
-        def get_field(r, key):
-            return str(r.get(key, '')).lower()
-
-        filtered = [r for r in self._results if
-                    ip_text in get_field(r, 'ip') and id_text in get_field(r, 'merchantId') and name_text in get_field(
-                        r, 'name') and version_text in get_field(r, 'version')]
-        self._refresh_table(filtered)
+        self.proxy.set_filters({
+            'ip': self.search_ip_edit.text().strip().lower(),
+            'merchantId': self.search_id_edit.text().strip().lower(),
+            'name': self.search_name_edit.text().strip().lower(),
+            'version': self.search_version_edit.text().strip().lower(),
+        })
 
     def clear_search(self):
         self.search_ip_edit.clear()
         self.search_id_edit.clear()
         self.search_name_edit.clear()
         self.search_version_edit.clear()  # 新增
-        self._refresh_table(self._results)
-
-    def _refresh_table(self, results):
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(0)
-        for result in results:
-            self._add_row_to_table(result)
-        self.table.setSortingEnabled(True)
-        self.update_row_colors()
-
-    def update_row_colors(self):
-        # 按当前显示顺序重新分配隔行色
-        for row in range(self.table.rowCount()):
-            bg_color = self.row_colors[row % 2]
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    item.setBackground(QBrush(bg_color))
-
-    def on_section_clicked(self, _):
-        # 排序后刷新隔行色
-        QTimer.singleShot(0, self.update_row_colors)
+        self.proxy.set_filters({})
 
     def showEvent(self, event):
         """显示事件处理"""
@@ -0,0 +1,125 @@
+import threading
+
+
+class ScanResultIndex:
+    """
+    扫描结果的增量子串索引。
+
+    对每个字段的小写值建立trigram倒排表（trigram -> 行号集合，不足3个字符的值整体作为一项）：
+    3个字符及以上的关键字先对其全部trigram求交集得到候选行，再逐行校验子串；
+    更短的关键字合并所有包含它的索引项。结果按行号返回，供代理模型过滤使用。
+    """
+    FIELDS = ('ip', 'merchantId', 'name', 'version')
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 每次清空加1，使用方据此判断缓存的查询结果是否失效
+        self.generation = 0
+        # 每次update加1，并记录各行最后一次更新时的值，使用方据此只重新校验缓存之后更新过的行
+        self.revision = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._values = {field: [] for field in self.FIELDS}
+            self._grams = {field: {} for field in self.FIELDS}
+            self._row_revisions = {}
+
+    def __len__(self):
+        return len(self._values[self.FIELDS[0]])
+
+    @classmethod
+    def _normalize(cls, result, field):
+        return str(result.get(field, '') or '').lower()
+
+    @classmethod
+    def _iter_grams(cls, text):
+        if len(text) < cls.GRAM_SIZE:
+            return {text} if text else set()
+        return {text[start:start + cls.GRAM_SIZE] for start in range(len(text) - cls.GRAM_SIZE + 1)}
+
+    def add(self, result):
+        """追加一条结果，返回其行号（与模型中的行号一致）"""
+        with self._lock:
+            row_id = len(self)
+            for field in self.FIELDS:
+                value = self._normalize(result, field)
+                self._values[field].append(value)
+                grams = self._grams[field]
+                for gram in self._iter_grams(value):
+                    grams.setdefault(gram, set()).add(row_id)
+            return row_id
+
+    def update(self, row_id, result):
+        """更新已有行的索引（如巡检发现版本变化）"""
+        with self._lock:
+            self.revision += 1
+            self._row_revisions[row_id] = self.revision
+            for field in self.FIELDS:
+                old_value, value = self._values[field][row_id], self._normalize(result, field)
+                if old_value == value:
+                    continue
+                grams = self._grams[field]
+                for gram in self._iter_grams(old_value):
+                    grams[gram].discard(row_id)
+                for gram in self._iter_grams(value):
+                    grams.setdefault(gram, set()).add(row_id)
+                self._values[field][row_id] = value
+
+    def updated_since(self, row_id, revision):
+        """该行在revision之后是否被update过"""
+        return self._row_revisions.get(row_id, 0) > revision
+
+    def extend(self, results):
+        for result in results:
+            self.add(result)
+
+    def _search_field(self, field, text):
+        grams = self._grams[field]
+        if len(text) < self.GRAM_SIZE:
+            rows = set()
+            for gram, posting in grams.items():
+                if text in gram:
+                    rows |= posting
+            return rows
+        # 从最小的trigram集合开始求交集
+        postings = sorted((grams.get(text[i:i + self.GRAM_SIZE], set())
+                           for i in range(len(text) - self.GRAM_SIZE + 1)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        values = self._values[field]
+        return {row_id for row_id in candidates if text in values[row_id]}
+
+    def search(self, filters):
+        """
+        按字段做包含匹配（各字段之间为"且"）
+
+        Args:
+            filters: {字段名: 关键字}，空关键字不参与过滤
+
+        Returns:
+            匹配的行号集合；没有有效过滤条件时返回None表示全部匹配
+        """
+        filters = {field: text.lower() for field, text in filters.items() if text}
+        if not filters:
+            return None
+        with self._lock:
+            matched = None
+            # 先查关键字最长的字段，候选集最小
+            for field, text in sorted(filters.items(), key=lambda item: -len(item[1])):
+                rows = self._search_field(field, text)
+                matched = rows if matched is None else matched & rows
+                if not matched:
+                    return set()
+            return matched
+
+    def row_matches(self, row_id, filters):
+        """校验单行是否满足过滤条件"""
+        with self._lock:
+            return all(text.lower() in self._values[field][row_id]
+                       for field, text in filters.items() if text)
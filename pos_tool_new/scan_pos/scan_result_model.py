@@ -0,0 +1,239 @@
+import ipaddress
+
+from PyQt6.QtCore import QAbstractTableModel, QEvent, QModelIndex, QRect, QSortFilterProxyModel, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QFont
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyle
+
+from .scan_result_index import ScanResultIndex
+
+# 排序键使用的数据角色
+SORT_ROLE = Qt.ItemDataRole.UserRole
+# 取整条扫描结果的数据角色
+RESULT_ROLE = Qt.ItemDataRole.UserRole + 1
+
+
+class ScanResultTableModel(QAbstractTableModel):
+    """扫描结果表格模型，按行保存扫描结果字典"""
+    HEADERS = ['IP', '设备类型', '商家ID', '名称', '版本', '操作']
+    KEYS = ['ip', 'type', 'merchantId', 'name', 'version']
+    ACTION_COLUMN = 5
+    EMPTY_TEXT = '——'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._ip_rows = {}
+        # 搜索索引，行号与模型行号一致
+        self.search_index = ScanResultIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    @classmethod
+    def display_value(cls, result, key):
+        value = result.get(key, '')
+        if key == 'merchantId' and not value and result.get('name') and result.get('version'):
+            value = 'Free Trials'
+        return str(value) if value else cls.EMPTY_TEXT
+
+    @classmethod
+    def is_offline(cls, result):
+        if result.get('status') == 'offline':
+            return True
+        return all(cls.display_value(result, key) == cls.EMPTY_TEXT for key in ('merchantId', 'name', 'version'))
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        result = self._rows[index.row()]
+        column = index.column()
+        if role == RESULT_ROLE:
+            return result
+        if column == self.ACTION_COLUMN:
+            return None
+        key = self.KEYS[column]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.display_value(result, key)
+        if role == Qt.ItemDataRole.ToolTipRole and key == 'ip' and result.get('open_ports'):
+            return '  '.join(f"{port}:{'开放' if is_open else '关闭'}"
+                             for port, is_open in result['open_ports'].items())
+        if role == SORT_ROLE:
+            if key == 'ip':
+                try:
+                    return int(ipaddress.IPv4Address(str(result.get('ip', ''))))
+                except ValueError:
+                    return 0
+            return self.display_value(result, key).lower()
+        return None
+
+    def append_results(self, results):
+        """批量追加结果，只触发一次行插入通知"""
+        if not results:
+            return
+        first = len(self._rows)
+        # 先更新索引，插入通知触发代理过滤时索引已包含新行
+        self.search_index.extend(results)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        self._rows.extend(results)
+        for row, result in enumerate(results, first):
+            self._ip_rows[result.get('ip')] = row
+        self.endInsertRows()
+
+    def update_result(self, result):
+        """按IP合并更新一行（巡检事件），IP不在表中时追加"""
+        row = self._ip_rows.get(result.get('ip'))
+        if row is None:
+            self.append_results([result])
+            return
+        self._rows[row] = result = {**self._rows[row], **result}
+        self.search_index.update(row, result)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self._rows = list(results)
+        self._ip_rows = {result.get('ip'): row for row, result in enumerate(self._rows)}
+        self.search_index.clear()
+        self.search_index.extend(self._rows)
+        self.endResetModel()
+
+    def result_at(self, row):
+        return self._rows[row]
+
+    def results(self):
+        return list(self._rows)
+
+
+class ScanResultFilterProxyModel(QSortFilterProxyModel):
+    """按IP/商家ID/名称/版本做包含匹配的过滤排序代理，匹配行由模型的搜索索引给出"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filters = {}
+        self._matched_rows = None
+        self._matched_count = 0
+        self._matched_generation = None
+        self._matched_revision = 0
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+
+    def set_filters(self, filters):
+        """filters: {字段名: 小写关键字}，空关键字不参与过滤"""
+        self._filters = {key: text for key, text in filters.items() if text}
+        self._update_matches()
+        self.invalidateFilter()
+
+    def _update_matches(self):
+        index = self.sourceModel().search_index
+        self._matched_rows = index.search(self._filters)
+        self._matched_count = len(index)
+        self._matched_generation = index.generation
+        self._matched_revision = index.revision
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._filters:
+            return True
+        if self._matched_generation != self.sourceModel().search_index.generation:
+            # 模型已重置，重新查询
+            self._update_matches()
+        index = self.sourceModel().search_index
+        if source_row < self._matched_count and not index.updated_since(source_row, self._matched_revision):
+            return source_row in self._matched_rows
+        # 设置过滤条件之后新到达或被更新（如巡检发现版本变化）的行，直接校验该行
+        return index.row_matches(source_row, self._filters)
+
+
+class ActionButtonDelegate(QStyledItemDelegate):
+    """在操作列直接绘制"打开"、"详情"按钮，不为每行创建控件"""
+    open_clicked = pyqtSignal(dict)
+    detail_clicked = pyqtSignal(dict)
+
+    BUTTONS = [
+        ('open', '打开', QColor('#2196F3'), QColor('#0b7dda')),
+        ('detail', '详情', QColor('#4CAF50'), QColor('#357a38')),
+    ]
+    BUTTON_WIDTH, BUTTON_HEIGHT, SPACING = 48, 22, 6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hover = None  # (行, 按钮名)
+
+    def _button_rects(self, cell_rect):
+        total_width = len(self.BUTTONS) * self.BUTTON_WIDTH + (len(self.BUTTONS) - 1) * self.SPACING
+        x = cell_rect.x() + (cell_rect.width() - total_width) // 2
+        y = cell_rect.y() + (cell_rect.height() - self.BUTTON_HEIGHT) // 2
+        rects = []
+        for name, *_ in self.BUTTONS:
+            rects.append((name, QRect(x, y, self.BUTTON_WIDTH, self.BUTTON_HEIGHT)))
+            x += self.BUTTON_WIDTH + self.SPACING
+        return rects
+
+    def paint(self, painter, option, index):
+        # 先绘制背景（含隔行色和选中色）
+        self.initStyleOption(option, index)
+        option.widget.style().drawPrimitive(QStyle.PrimitiveElement.PE_PanelItemViewItem, option, painter,
+                                            option.widget)
+        result = index.data(RESULT_ROLE)
+        painter.save()
+        if ScanResultTableModel.is_offline(result):
+            font = QFont(painter.font())
+            font.setBold(True)
+            painter.setFont(font)
+            painter.setPen(QColor('red'))
+            painter.drawText(option.rect, Qt.AlignmentFlag.AlignCenter, 'POS已离线')
+        else:
+            font = QFont(painter.font())
+            font.setPixelSize(11)
+            painter.setFont(font)
+            painter.setRenderHint(painter.RenderHint.Antialiasing)
+            rects = dict(self._button_rects(option.rect))
+            for name, text, color, hover_color in self.BUTTONS:
+                hovered = self._hover == (index.row(), name)
+                painter.setPen(Qt.PenStyle.NoPen)
+                painter.setBrush(hover_color if hovered else color)
+                painter.drawRoundedRect(rects[name], 3, 3)
+                painter.setPen(QColor('white'))
+                painter.drawText(rects[name], Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+    def _button_at(self, option, pos):
+        for name, rect in self._button_rects(option.rect):
+            if rect.contains(pos):
+                return name
+        return None
+
+    def editorEvent(self, event, model, option, index):
+        result = index.data(RESULT_ROLE)
+        if result is None or ScanResultTableModel.is_offline(result):
+            return False
+        if event.type() == QEvent.Type.MouseMove:
+            name = self._button_at(option, event.position().toPoint())
+            hover = (index.row(), name) if name else None
+            if hover != self._hover:
+                self._hover = hover
+                if option.widget:
+                    option.widget.viewport().update()
+            return False
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            name = self._button_at(option, event.position().toPoint())
+            if name == 'open':
+                self.open_clicked.emit(result)
+                return True
+            if name == 'detail':
+                self.detail_clicked.emit(result)
+                return True
+        return False
+
+    def clear_hover(self):
+        self._hover = None
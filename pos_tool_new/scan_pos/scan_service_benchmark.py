@@ -0,0 +1,219 @@
+"""
+扫描服务端到端基准测试：在回环网段上启动假kpos设备，用与界面/命令行相同的扫描流程（PosScanner）扫描，
+统计吞吐量（主机/秒）、首个结果耗时和探测延迟分位数，并把每次结果追加到JSONL文件，便于比较不同引擎和参数。
+
+用法（Linux下整个127.0.0.0/8都指向回环，可绑定任意127.x地址）:
+    python -m pos_tool_new.scan_pos.scan_service_benchmark --network 127.0.0.0/22 --devices 100
+    python -m pos_tool_new.scan_pos.scan_service_benchmark --latency 50 --jitter 100 --drop-rate 0.1 \\
+        --malformed-rate 0.05 --engines thread asyncio --rounds 3 --label "slow-lan"
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from pos_tool_new.scan_pos.adaptive_controller import AimdController
+from pos_tool_new.scan_pos.fake_pos_server import FakePosFleet, MODE_OK, pick_loopback_ips
+from pos_tool_new.scan_pos.pos_http_client import PosHttpClient
+from pos_tool_new.scan_pos.pos_scanner import PosScanner
+from pos_tool_new.scan_pos.scan_engine import SCAN_ENGINES
+from pos_tool_new.scan_pos.scan_targets import ScanTargets
+
+DEFAULT_RECORD_PATH = os.path.join(os.path.expanduser("~"), ".pos_tool", "scan_benchmark.jsonl")
+
+
+class TimedPosHttpClient(PosHttpClient):
+    """记录每台设备信息获取（HTTP探测）耗时的客户端"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def fetch_device_info(self, ip, port=22080):
+        start = time.perf_counter()
+        try:
+            return super().fetch_device_info(ip, port)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+class RecordingController(AimdController):
+    """记录每次TCP连接RTT的控制器"""
+
+    def reset(self):
+        super().reset()
+        self.rtts = []
+
+    def record(self, outcome, rtt=None, err_no=None):
+        if rtt is not None:
+            self.rtts.append(rtt)
+        super().record(outcome, rtt, err_no)
+
+
+def percentile(values, pct):
+    """最近秩法百分位数，values为空时返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _ms(value):
+    return round(value * 1000, 2) if value is not None else None
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.stdout.decode().strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_scan(engine, targets, fleet, port, adaptive=True, concurrency=None):
+    """用指定引擎扫描一轮，返回统计指标"""
+    http = TimedPosHttpClient()
+    scanner = PosScanner(engine=engine, targets=targets, http_client=http, adaptive=adaptive,
+                         concurrency=concurrency)
+    if adaptive:
+        # 换成记录RTT的控制器，参数与PosScanner创建的保持一致
+        controller = RecordingController(initial_window=scanner.controller.window,
+                                         min_window=scanner.controller.min_window,
+                                         max_window=scanner.controller.max_window)
+        scanner.controller = scanner.engine.controller = controller
+    first_result = []
+    start = time.perf_counter()
+
+    def on_result(_):
+        if not first_result:
+            first_result.append(time.perf_counter() - start)
+
+    results = scanner.scan(port, on_result=on_result)
+    elapsed = time.perf_counter() - start
+    http.close()
+    found = {result["ip"] for result in results}
+    expected_ok = set(fleet.ips_with_mode(MODE_OK))
+    rtts = scanner.controller.rtts if adaptive else []
+    return {
+        "hosts": len(targets),
+        "elapsed_s": round(elapsed, 3),
+        "hosts_per_sec": round(len(targets) / elapsed, 1),
+        "time_to_first_result_ms": _ms(first_result[0]) if first_result else None,
+        "devices_found": len(found),
+        "devices_missed": len(set(fleet.ips) - found),
+        "success": sum(1 for result in results if result["status"] == "success"),
+        "success_expected": len(expected_ok),
+        "errors": sum(1 for result in results if result["status"] != "success"),
+        "probe_latency_ms": {f"p{p}": _ms(percentile(http.latencies, p)) for p in (50, 95, 99)},
+        "connect_rtt_ms": {f"p{p}": _ms(percentile(rtts, p)) for p in (50, 95, 99)},
+        "final_window": scanner.controller.window if adaptive else None,
+    }
+
+
+def append_record(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_history(path, scenario):
+    """读取相同场景的历史记录"""
+    if not os.path.exists(path):
+        return []
+    history = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("scenario") == scenario:
+                history.append(record)
+    return history
+
+
+def format_metrics(metrics):
+    lat, rtt = metrics["probe_latency_ms"], metrics["connect_rtt_ms"]
+    return (f"{metrics['elapsed_s']:.3f}s, {metrics['hosts_per_sec']:.0f} 主机/秒, "
+            f"首个结果 {metrics['time_to_first_result_ms']}ms, "
+            f"设备 {metrics['devices_found']}(成功 {metrics['success']}/{metrics['success_expected']}, "
+            f"漏扫 {metrics['devices_missed']}), "
+            f"探测延迟 p50/p95/p99 {lat['p50']}/{lat['p95']}/{lat['p99']}ms, "
+            f"连接RTT p50/p99 {rtt['p50']}/{rtt['p99']}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POS扫描服务端到端基准测试（回环假设备）")
+    parser.add_argument("--network", default="127.0.0.0/22", help="扫描的回环网段")
+    parser.add_argument("--devices", type=int, default=100, help="假设备数量")
+    parser.add_argument("--port", type=int, default=22080)
+    parser.add_argument("--latency", type=float, default=0, help="假设备响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="响应延迟的随机抖动上限（毫秒）")
+    parser.add_argument("--drop-rate", type=float, default=0, help="断开连接的设备比例")
+    parser.add_argument("--malformed-rate", type=float, default=0, help="返回损坏JSON的设备比例")
+    parser.add_argument("--engines", nargs="+", default=list(SCAN_ENGINES), choices=list(SCAN_ENGINES))
+    parser.add_argument("--concurrency", type=int, help="并发上限")
+    parser.add_argument("--no-adaptive", action="store_true", help="关闭自适应并发/超时")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0, help="设备地址和故障分配的随机种子")
+    parser.add_argument("--label", default="", help="记录中的备注，如改动说明")
+    parser.add_argument("--record", default=DEFAULT_RECORD_PATH, help="结果追加写入的JSONL文件")
+    parser.add_argument("--no-record", action="store_true", help="不写入结果文件")
+    args = parser.parse_args(argv)
+
+    targets = ScanTargets.parse(args.network)
+    ips = pick_loopback_ips(args.network, args.devices, args.port, args.seed)
+    if not ips:
+        print(f"无法在 {args.network} 上绑定端口 {args.port}")
+        return 1
+    scenario = {
+        "network": args.network, "devices": len(ips), "latency_ms": args.latency, "jitter_ms": args.jitter,
+        "drop_rate": args.drop_rate, "malformed_rate": args.malformed_rate,
+    }
+    print(f"网段 {args.network}，共 {len(targets)} 个地址，假设备 {len(ips)} 台，"
+          f"延迟 {args.latency}+{args.jitter}ms，断连 {args.drop_rate:.0%}，损坏JSON {args.malformed_rate:.0%}")
+    fleet = FakePosFleet(ips, port=args.port, latency=args.latency / 1000, latency_jitter=args.jitter / 1000,
+                         drop_rate=args.drop_rate, malformed_rate=args.malformed_rate, seed=args.seed)
+    with fleet:
+        for engine in args.engines:
+            for round_no in range(1, args.rounds + 1):
+                metrics = run_scan(engine, targets, fleet, args.port, adaptive=not args.no_adaptive,
+                                   concurrency=args.concurrency)
+                print(f"[{engine:>7}] 第{round_no}轮: {format_metrics(metrics)}")
+                if args.no_record:
+                    continue
+                append_record(args.record, {
+                    "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "commit": _git_commit(),
+                    "label": args.label,
+                    "platform": f"{platform.system()} {platform.release()}",
+                    "python": platform.python_version(),
+                    "scenario": scenario,
+                    "settings": {"engine": engine, "adaptive": not args.no_adaptive,
+                                 "concurrency": args.concurrency, "round": round_no},
+                    "metrics": metrics,
+                })
+    if not args.no_record:
+        # 与同一场景的历史记录对比
+        history = load_history(args.record, scenario)
+        print(f"\n结果已追加到 {args.record}，同场景最近记录:")
+        for record in history[-10:]:
+            settings, metrics = record["settings"], record["metrics"]
+            print(f"  {record['time']} {record.get('commit') or '-':>8} {settings['engine']:>7} "
+                  f"{metrics['hosts_per_sec']:>8.0f} 主机/秒  首个结果 {metrics['time_to_first_result_ms']}ms  "
+                  f"p95 {metrics['probe_latency_ms']['p95']}ms  {record.get('label', '')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
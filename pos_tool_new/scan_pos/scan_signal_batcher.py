@@ -0,0 +1,48 @@
+import threading
+
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+
+class ScanSignalBatcher(QObject):
+    """
+    扫描信号合批：扫描线程逐条发出的进度/结果先写入缓冲区（直接连接，不经过事件队列），
+    由界面线程的定时器按固定时间片批量投递，界面每批只做一次插入和一次重绘。
+    """
+    progress_batched = pyqtSignal(int, str)  # 本时间片内的最新进度和IP
+    results_batched = pyqtSignal(list)       # 本时间片内收到的全部结果
+
+    def __init__(self, worker, interval_ms=50, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._progress = None
+        self._results = []
+        worker.scan_progress.connect(self._on_progress, Qt.ConnectionType.DirectConnection)
+        worker.scan_result.connect(self._on_result, Qt.ConnectionType.DirectConnection)
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def _on_progress(self, percent, ip):
+        # 运行在扫描线程中，只记录最新值
+        with self._lock:
+            self._progress = (percent, ip)
+
+    def _on_result(self, result):
+        # 运行在扫描线程中，只追加到缓冲区
+        with self._lock:
+            self._results.append(result)
+
+    def flush(self):
+        with self._lock:
+            progress, self._progress = self._progress, None
+            results, self._results = self._results, []
+        if progress:
+            self.progress_batched.emit(*progress)
+        if results:
+            self.results_batched.emit(results)
+
+    def stop(self):
+        """停止定时器并投递剩余数据，扫描结束时在处理完成信号前调用"""
+        self._timer.stop()
+        self.flush()
@@ -0,0 +1,83 @@
+import ipaddress
+import re
+
+
+class ScanTargets:
+    """
+    扫描目标集合：支持CIDR网段、IP区间和单个IP的任意组合。
+    内部以合并后的整数区间保存，迭代时逐个生成地址，不会一次性展开整个网段。
+    """
+
+    def __init__(self, intervals=()):
+        self._intervals = self._merge(intervals)
+
+    @staticmethod
+    def _merge(intervals):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [(start, end) for start, end in merged]
+
+    @staticmethod
+    def _parse_token(token):
+        """解析单个目标，返回(起始整数, 结束整数)"""
+        if "/" in token:
+            network = ipaddress.IPv4Network(token, strict=False)
+            first, last = int(network.network_address), int(network.broadcast_address)
+            # 与network.hosts()一致：/31、/32以外排除网络地址和广播地址
+            return (first + 1, last - 1) if network.prefixlen < 31 else (first, last)
+        if "-" in token:
+            start_text, end_text = (part.strip() for part in token.split("-", 1))
+            start = ipaddress.IPv4Address(start_text)
+            if "." not in end_text:
+                # 10.0.0.10-50 简写，只替换最后一段
+                end_text = start_text.rsplit(".", 1)[0] + "." + end_text
+            end = ipaddress.IPv4Address(end_text)
+            if end < start:
+                raise ValueError(f"IP区间起止顺序错误: {token}")
+            return int(start), int(end)
+        address = int(ipaddress.IPv4Address(token))
+        return address, address
+
+    @classmethod
+    def parse(cls, text):
+        """解析逗号、分号、空白或换行分隔的目标列表，例如 "10.24.0.0/20, 192.168.252.0/23" """
+        tokens = [t for t in re.split(r"[,;\s]+", text.strip()) if t]
+        if not tokens:
+            raise ValueError("扫描目标不能为空")
+        intervals = []
+        for token in tokens:
+            try:
+                intervals.append(cls._parse_token(token))
+            except ValueError as e:
+                raise ValueError(f"无效的扫描目标 '{token}': {e}")
+        return cls(intervals)
+
+    @classmethod
+    def from_local_ip(cls, local_ip, prefixlen=23):
+        """以本机IP所在网段作为扫描目标"""
+        return cls.parse(f"{local_ip}/{prefixlen}")
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self._intervals)
+
+    def __iter__(self):
+        for start, end in self._intervals:
+            for address in range(start, end + 1):
+                yield ipaddress.IPv4Address(address)
+
+    def __contains__(self, ip):
+        address = int(ipaddress.IPv4Address(str(ip)))
+        return any(start <= address <= end for start, end in self._intervals)
+
+    def __str__(self):
+        parts = []
+        for start, end in self._intervals:
+            if start == end:
+                parts.append(str(ipaddress.IPv4Address(start)))
+            else:
+                parts.append(f"{ipaddress.IPv4Address(start)}-{ipaddress.IPv4Address(end)}")
+        return ", ".join(parts)
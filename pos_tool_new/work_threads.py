@@ -1,4 +1,4 @@
-import time
+import concurrent.futures
 
 from PyQt6.QtCore import QThread, pyqtSignal
 
@@ -100,6 +100,75 @@ class ReplaceWarThreadLinux(BaseWorkerThread):
         self.progress_text_updated.emit("Linux WAR包替换完成")
 
 
+class ReplaceWarMultiThreadLinux(BaseWorkerThread):
+    host_progress = pyqtSignal(str, int)  # 主机, 进度百分比
+    host_result = pyqtSignal(str, dict)   # 主机, 换包结果
+
+    def __init__(self, service: LinuxService, hosts: list, username: str, password: str, war_path: str):
+        super().__init__()
+        self.service = service
+        self.hosts = hosts
+        self.username = username
+        self.password = password
+        self.war_path = war_path
+
+    def _run_impl(self):
+        self.progress_text_updated.emit(f"正在向 {len(self.hosts)} 台POS替换WAR包...")
+        self.service.log("换包需停止pos服务,请在结束后自行重启", level="warning")
+
+        # 并行停止各台POS服务，停止失败的主机不再换包
+        def stop(host):
+            self.service.stop_pos_linux(host, self.username, self.password)
+
+        hosts = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=LinuxService.MULTI_HOST_WORKERS) as executor:
+            futures = {executor.submit(stop, host): host for host in self.hosts}
+            for future in concurrent.futures.as_completed(futures):
+                host = futures[future]
+                try:
+                    future.result()
+                    hosts.append(host)
+                except Exception as e:
+                    self.host_result.emit(host, {"success": False, "error": f"停止POS失败: {e}", "seconds": 0.0})
+
+        results = self.run_with_error_handling(
+            self.service.replace_war_multi,
+            hosts, self.username, self.password, self.war_path,
+            progress_callback=self.host_progress.emit,
+            result_callback=self.host_result.emit
+        )
+        failed = len(self.hosts) - sum(1 for result in results.values() if result["success"])
+        if failed:
+            raise Exception(f"{failed} 台POS换包失败，详见日志")
+        self.progress_text_updated.emit("批量替换WAR包完成")
+
+
+class FleetRunnerThread(BaseWorkerThread):
+    host_updated = pyqtSignal(str, dict)  # 主机, 当前结果
+
+    def __init__(self, runner, action: str, hosts: list, username: str, password: str, kwargs: dict):
+        super().__init__()
+        self.runner = runner
+        self.runner.on_update = self.host_updated.emit
+        self.action = action
+        self.hosts = hosts
+        self.username = username
+        self.password = password
+        self.kwargs = kwargs
+        self.results = {}
+
+    def _run_impl(self):
+        self.results = self.runner.run(self.action, self.hosts, self.username, self.password, **self.kwargs)
+
+    def stop(self):
+        self._is_running = False
+        self.runner.stop()
+
+    def abort(self):
+        self._is_running = False
+        self.runner.abort()
+
+
 class RestartPosThreadWindows(BaseWorkerThread):
     def __init__(self, service: WindowsService, base_path: str, selected_version: str):
         super().__init__()
@@ -303,41 +372,20 @@ class PipelineUpgradeThread(BaseWorkerThread):
         self.ui_ref = ui_ref
 
     def _run_impl(self):
-        try:
-            self._stop_pos()
-            self._upload_and_extract_war()
-            self._modify_config_files()
-            self._start_pos()
-        except Exception as e:
-            self._handle_exception(e)
-
-    def _upload_and_extract_war(self):
-        self.progress_text_updated.emit("正在上传/解压WAR包...")
-
         def progress_callback(percent):
             self.progress_updated.emit(percent, None, None, None)
 
         def speed_callback(speed):
             self.speed_updated.emit(speed)
 
-        self.service.replace_war_linux(
-            self.host, self.username, self.password, self.local_war_path,
-            progress_callback, speed_callback
-        )
-        time.sleep(2)
-        self.speed_updated.emit("")
-
-    def _modify_config_files(self):
-        self.progress_text_updated.emit("正在修改配置文件...")
-        self.service.modify_remote_files(self.host, self.username, self.password, self.env)
-
-    def _start_pos(self):
-        self.progress_text_updated.emit("正在启动POS服务...")
-        self.service.start_pos_linux(self.host, self.username, self.password)
-
-    def _stop_pos(self):
-        self.progress_text_updated.emit("正在停止POS服务...")
-        self.service.stop_pos_linux(self.host, self.username, self.password)
+        try:
+            # 上传与准备配置在POS运行时进行，停止POS后才替换war包（见LinuxService.pipeline_war_upgrade）
+            self.service.pipeline_war_upgrade(
+                self.host, self.username, self.password, self.local_war_path, self.env,
+                progress_callback, speed_callback, self.progress_text_updated.emit
+            )
+        except Exception as e:
+            self._handle_exception(e)
 
     def _handle_exception(self, exception):
         self.speed_updated.emit("")
@@ -346,6 +394,25 @@ class PipelineUpgradeThread(BaseWorkerThread):
         raise Exception(error_msg)
 
 
+class RollbackWarThreadLinux(BaseWorkerThread):
+    def __init__(self, service: LinuxService, host: str, username: str, password: str):
+        super().__init__()
+        self.service = service
+        self.host = host
+        self.username = username
+        self.password = password
+
+    def _run_impl(self):
+        def progress_callback(percent):
+            self.progress_updated.emit(percent, None, None, None)
+
+        self.run_with_error_handling(
+            self.service.rollback_war_linux,
+            self.host, self.username, self.password, progress_callback, self.progress_text_updated.emit
+        )
+        self.progress_text_updated.emit("回滚完成")
+
+
 class PipelinePackageUpgradeThread(BaseWorkerThread):
     def __init__(self, service, host, username, password, selected_dir, war_file, env, ui_ref=None):
         super().__init__()
@@ -448,6 +515,7 @@ class ScanPosWorkerThread(BaseWorkerThread):
     scan_progress = pyqtSignal(int, str)  # 扫描进度百分比和当前IP
     scan_result = pyqtSignal(dict)        # 单个扫描结果
     scan_finished = pyqtSignal(list)      # 扫描完成后的结果列表
+    scan_stats = pyqtSignal(dict)         # 扫描统计（并发/超时控制器的决策）
 
     def __init__(self, service, port=22080):
         super().__init__()
@@ -459,6 +527,22 @@ class ScanPosWorkerThread(BaseWorkerThread):
         self.service.scan_network(self, self.port)
 
 
+class FleetMonitorThread(BaseWorkerThread):
+    device_event = pyqtSignal(dict)  # 设备变化事件（上线/离线/版本变化）
+
+    def __init__(self, monitor):
+        super().__init__()
+        self.monitor = monitor
+        self.monitor.on_event = self.device_event.emit
+
+    def _run_impl(self):
+        self.monitor.run()
+
+    def stop(self):
+        self._is_running = False
+        self.monitor.stop()
+
+
 class RandomMailLoadThread(BaseWorkerThread):
     mails_loaded = pyqtSignal(list)
 